@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Reglas de alerta declarativas, evaluadas sobre todos los tickers a la vez
+con operaciones vectorizadas sobre el estado de intraday.IndicatorState.
+
+Cada regla es un dict (o un objeto en el JSON de ALERT_RULES_FILE):
+
+    {"name": "macd_cruce_bajista", "side": "sell",
+     "when": [["macd", "crosses_below", "macd_signal"], ["atr_pct", "<", 0.03]]}
+
+Las condiciones de "when" se combinan con AND. Cada lado es un campo del
+estado (ver FIELDS) o un número; los operadores son <, <=, >, >=,
+crosses_above y crosses_below (comparan la vela anterior con la actual).
+
+Una alerta sale solo cuando la regla pasa de falsa a verdadera para un
+ticker y no disparó para ese mismo ticker en ALERT_COOLDOWN_MINUTES; así
+un RSI que queda varios minutos sobre 70 avisa una sola vez.
+"""
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timezone
+
+###############################################
+# CONFIGURACIÓN DE ALERTAS
+###############################################
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE")
+ALERT_COOLDOWN_MINUTES = float(os.getenv("ALERT_COOLDOWN_MINUTES", "60"))
+# Destinos separados por coma: stdout, jsonl, webhook
+ALERT_SINKS = os.getenv("ALERT_SINKS", "stdout,jsonl")
+ALERTS_FILE = os.getenv("ALERTS_FILE", "alerts.jsonl")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+
+FIELDS = ("open", "high", "low", "close", "volume", "ema12", "ema26", "macd", "macd_signal", "macd_hist",
+          "rsi", "sma50", "atr", "atr_pct")
+COMPARISONS = {"<": "less", "<=": "less_equal", ">": "greater", ">=": "greater_equal"}
+CROSSINGS = ("crosses_above", "crosses_below")
+
+# Las estrategias heurísticas de la Fase 3 del roadmap
+DEFAULT_ALERT_RULES = [
+    {"name": "rsi_sobreventa_cruce_sma50", "side": "buy",
+     "when": [["rsi", "<", 30], ["close", "crosses_above", "sma50"], ["atr_pct", "<", 0.03]]},
+    {"name": "rsi_sobrecompra", "side": "sell", "when": [["rsi", ">", 70]]},
+    {"name": "macd_cruce_bajista", "side": "sell", "when": [["macd", "crosses_below", "macd_signal"]]},
+]
+
+AlertRule = namedtuple("AlertRule", ["name", "side", "conditions"])
+Alert = namedtuple("Alert", ["time", "ticker", "rule", "side", "price", "values"])
+
+###############################################
+# DEFINICIÓN DE REGLAS
+###############################################
+def _operand(value, rule_name):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if value not in FIELDS:
+        raise ValueError(f"Regla {rule_name}: campo desconocido {value!r} (campos: {', '.join(FIELDS)})")
+    return value
+
+def parse_rules(raw_rules):
+    rules = []
+    for raw in raw_rules:
+        name = raw.get("name")
+        if not name or not raw.get("when"):
+            raise ValueError(f"Regla sin nombre o sin condiciones: {raw}")
+        conditions = []
+        for condition in raw["when"]:
+            left, op, right = condition
+            if op not in COMPARISONS and op not in CROSSINGS:
+                raise ValueError(f"Regla {name}: operador desconocido {op!r}")
+            if op in CROSSINGS and not (isinstance(left, str) and isinstance(right, (str, int, float))):
+                raise ValueError(f"Regla {name}: {op} necesita un campo a la izquierda")
+            conditions.append((_operand(left, name), op, _operand(right, name)))
+        rules.append(AlertRule(name, raw.get("side", "info"), tuple(conditions)))
+    return rules
+
+def load_rules(path=ALERT_RULES_FILE):
+    if not path:
+        return parse_rules(DEFAULT_ALERT_RULES)
+    with open(path, encoding="utf-8") as f:
+        return parse_rules(json.load(f))
+
+###############################################
+# EVALUACIÓN VECTORIZADA
+###############################################
+class AlertEngine:
+    """
+    Evalúa las reglas sobre los arrays (un valor por ticker) del estado de
+    indicadores y recuerda, por regla y ticker, si la regla estaba activa y
+    cuándo disparó por última vez.
+    """
+
+    def __init__(self, rules, tickers, cooldown_seconds=ALERT_COOLDOWN_MINUTES * 60):
+        import numpy as np
+
+        self.rules = rules
+        self.tickers = list(tickers)
+        self.cooldown = cooldown_seconds
+        self._active = {rule.name: np.zeros(len(self.tickers), dtype=bool) for rule in rules}
+        self._last_fired = {rule.name: np.full(len(self.tickers), -np.inf) for rule in rules}
+
+    @staticmethod
+    def _value(operand, fields):
+        return fields[operand] if isinstance(operand, str) else operand
+
+    def _matches(self, rule, current, previous):
+        import numpy as np
+
+        hits = None
+        for left, op, right in rule.conditions:
+            now_left, now_right = self._value(left, current), self._value(right, current)
+            if op in COMPARISONS:
+                result = getattr(np, COMPARISONS[op])(now_left, now_right)
+            else:
+                before_left, before_right = self._value(left, previous), self._value(right, previous)
+                if op == "crosses_above":
+                    result = (before_left <= before_right) & (now_left > now_right)
+                else:
+                    result = (before_left >= before_right) & (now_left < now_right)
+            hits = result if hits is None else hits & result
+        return hits
+
+    def evaluate(self, state, positions, bar_time):
+        """
+        Alertas de la vela `bar_time` (segundos epoch) para los tickers en
+        `positions` (los que acaban de recibir esa vela y ya tienen historia
+        suficiente). Las comparaciones con NaN dan falso.
+        """
+        import numpy as np
+
+        positions = positions[state.ready[positions]]
+        if not len(positions):
+            return []
+        current = {field: values[positions] for field, values in state.current.items()}
+        previous = {field: values[positions] for field, values in state.previous.items()}
+        alerts = []
+        with np.errstate(invalid="ignore"):
+            for rule in self.rules:
+                hits = self._matches(rule, current, previous)
+                active = self._active[rule.name]
+                last_fired = self._last_fired[rule.name]
+                rising = hits & ~active[positions]
+                active[positions] = hits
+                due = rising & (bar_time - last_fired[positions] >= self.cooldown)
+                if not due.any():
+                    continue
+                fired = positions[due]
+                last_fired[fired] = bar_time
+                used = [operand for left, _, right in rule.conditions for operand in (left, right)
+                        if isinstance(operand, str)]
+                for i in np.flatnonzero(due):
+                    values = {field: round(float(current[field][i]), 4) for field in dict.fromkeys(used)}
+                    alerts.append(Alert(bar_time, self.tickers[positions[i]], rule.name, rule.side,
+                                        float(current["close"][i]), values))
+        return alerts
+
+###############################################
+# ENVÍO
+###############################################
+def alert_to_dict(alert):
+    return {
+        "time": datetime.fromtimestamp(alert.time, timezone.utc).isoformat(),
+        "ticker": alert.ticker,
+        "rule": alert.rule,
+        "side": alert.side,
+        "price": round(alert.price, 4),
+        "values": alert.values,
+    }
+
+def dispatch_alerts(alerts, sinks=ALERT_SINKS):
+    """Manda un lote de alertas a los destinos de ALERT_SINKS; un destino caído no frena a los demás."""
+    if not alerts:
+        return 0
+    sinks = {sink.strip() for sink in sinks.split(",") if sink.strip()}
+    records = [alert_to_dict(alert) for alert in alerts]
+    if "stdout" in sinks:
+        for record in records:
+            icon = {"buy": "🟢", "sell": "🔴"}.get(record["side"], "🔔")
+            print(f"{icon} {record['time']} {record['ticker']} {record['rule']} @ {record['price']} {record['values']}")
+    if "jsonl" in sinks:
+        with open(ALERTS_FILE, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if "webhook" in sinks and ALERT_WEBHOOK_URL:
+        try:
+            from main import get_http_session
+
+            get_http_session().post(ALERT_WEBHOOK_URL, json={"alerts": records}, timeout=10).raise_for_status()
+        except Exception as e:
+            print(f"⚠️ No se pudieron enviar {len(records)} alertas al webhook: {e}")
+    return len(records)
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+API HTTP de recomendaciones (aiohttp). Sirve el último análisis por ticker
+y región, el historial de análisis en un rango de fechas y las últimas
+noticias, desde una foto en memoria de stock_analysis y news: ningún
+pedido consulta PostgreSQL.
+
+La foto se recarga cuando el pipeline avisa que guardó resultados (NOTIFY
+en RESULTS_CHANNEL, ver main_job) y, por si el aviso se pierde, cuando
+cambia la versión de las tablas (máximo id) que se consulta cada
+API_REFRESH_SECONDS. Cada respuesta se arma una sola vez por foto: el JSON,
+su versión comprimida con gzip y un ETag del contenido, así los clientes
+revalidan con If-None-Match y reciben 304 si nada cambió.
+
+Endpoints:
+    GET /health
+    GET /v1/recommendations[?region=argentina]
+    GET /v1/recommendations/{ticker}
+    GET /v1/history/{ticker}[?from=AAAA-MM-DD&to=AAAA-MM-DD]
+    GET /v1/news/{ticker}[?limit=10]
+    GET /v1/series/{ticker}[?fields=close,rsi,macd&width=800&method=lttb&interval=1d&from=...&to=...]
+    GET /v1/screener?where=rsi < 30 and price > ma200[&sort=-total_score&limit=50&fields=ticker,rsi]
+
+Las series (ver series.py) no salen de la foto: se cargan por ticker la
+primera vez que se piden y quedan con sus niveles de zoom en memoria. El
+screener (ver screener.py) trae los cambios de latest_indicators después
+de cada recarga de la foto.
+
+Uso: python api.py serve [--host 0.0.0.0] [--port 8080]
+     python api.py bench [--url http://127.0.0.1:8080] [--requests 20000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+from tickers import get_universe
+
+###############################################
+# CONFIGURACIÓN DE LA API
+###############################################
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", os.getenv("PORT", "8080")))
+# Días de historial de análisis que se guardan en memoria
+API_HISTORY_DAYS = int(os.getenv("API_HISTORY_DAYS", "730"))
+API_NEWS_PER_TICKER = int(os.getenv("API_NEWS_PER_TICKER", "20"))
+API_REFRESH_SECONDS = float(os.getenv("API_REFRESH_SECONDS", "60"))
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "60"))
+# Las respuestas más chicas que esto no se comprimen
+API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", "1024"))
+# Respuestas armadas que se guardan por foto (los rangos de historial varían por pedido)
+API_RESPONSE_CACHE = int(os.getenv("API_RESPONSE_CACHE", "20000"))
+
+ANALYSIS_FIELDS = ["total_summary", "technical_indicators_summary", "moving_averages_summary",
+                   "rsi_action", "macd_action", "price"]
+
+# body y gzipped son bytes (gzipped es None si no conviene comprimir)
+Payload = namedtuple("Payload", ["body", "gzipped", "etag"])
+
+###############################################
+# FOTO EN MEMORIA
+###############################################
+def _encode(data):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= API_GZIP_MIN_BYTES else None
+    # ETag por contenido: una recarga que no cambió un recurso no invalida la copia del cliente
+    return Payload(body, gzipped, f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"')
+
+class Snapshot:
+    """
+    Últimos análisis, historial y noticias por ticker. Es inmutable: una
+    recarga arma una foto nueva y la reemplaza entera.
+    """
+
+    def __init__(self, version, analyses, news, universe=None):
+        universe = universe or get_universe()
+        self.version = version
+        self.loaded_at = time.time()
+        self.history = {}
+        for row in analyses:
+            self.history.setdefault(row["ticker"], []).append(row)
+        for ticker, rows in self.history.items():
+            region = universe.lookup(ticker).region
+            for row in rows:
+                row["region"] = region
+        self.dates = {ticker: [row["date"] for row in rows] for ticker, rows in self.history.items()}
+        self.latest = {ticker: rows[-1] for ticker, rows in sorted(self.history.items())}
+        self.regions = {}
+        for ticker, row in self.latest.items():
+            self.regions.setdefault(row["region"], []).append(ticker)
+        self.news = news
+        self._payloads = {}
+
+    def payload(self, key, build):
+        """Respuesta ya codificada para `key`; `build()` arma los datos la primera vez."""
+        cached = self._payloads.get(key)
+        if cached is None:
+            if len(self._payloads) >= API_RESPONSE_CACHE:
+                self._payloads.clear()
+            cached = self._payloads[key] = _encode(build())
+        return cached
+
+    def history_range(self, ticker, start=None, end=None):
+        dates = self.dates[ticker]
+        lo = bisect.bisect_left(dates, start) if start else 0
+        hi = bisect.bisect_right(dates, end) if end else len(dates)
+        return self.history[ticker][lo:hi]
+
+def _version_query(cur):
+    cur.execute("SELECT (SELECT coalesce(max(id), 0) FROM stock_analysis), (SELECT coalesce(max(id), 0) FROM news)")
+    return tuple(cur.fetchone())
+
+def fetch_version():
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        version = _version_query(cur)
+        conn.commit()
+        cur.close()
+    return version
+
+def load_snapshot(history_days=API_HISTORY_DAYS, news_per_ticker=API_NEWS_PER_TICKER):
+    from db import pooled_connection
+    from main import ensure_tables
+
+    since = date.today() - timedelta(days=history_days)
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        ensure_tables(cur)
+        conn.commit()
+        # Versión primero: si se inserta algo durante la carga, el próximo chequeo recarga
+        version = _version_query(cur)
+        cur.execute(f"""
+            SELECT ticker, analysis_date, {', '.join(ANALYSIS_FIELDS)}
+            FROM stock_analysis WHERE analysis_date >= %s
+            ORDER BY ticker, analysis_date, id
+        """, (since,))
+        analyses = [
+            {"ticker": ticker, "date": analysis_date.date().isoformat(),
+             "analysis_date": analysis_date.isoformat(timespec="seconds"),
+             **dict(zip(ANALYSIS_FIELDS[:-1], values)), "price": float(price) if price is not None else None}
+            for ticker, analysis_date, *values, price in cur.fetchall()
+        ]
+        cur.execute("""
+            SELECT ticker, title, link, published_at FROM (
+                SELECT ticker, title, link, published_at,
+                       row_number() OVER (PARTITION BY ticker ORDER BY published_at DESC NULLS LAST, id DESC) AS n
+                FROM news
+            ) ranked WHERE n <= %s ORDER BY ticker, n
+        """, (news_per_ticker,))
+        news = {}
+        for ticker, title, link, published_at in cur.fetchall():
+            news.setdefault(ticker, []).append({
+                "title": title, "link": link,
+                "published_at": published_at.isoformat(timespec="seconds") if published_at else None,
+            })
+        conn.commit()
+        cur.close()
+    return Snapshot(version, analyses, news)
+
+###############################################
+# RECARGA DE LA FOTO
+###############################################
+class SnapshotHolder:
+    """
+    Mantiene la foto vigente. Las cargas corren en un hilo del executor; la
+    conexión de LISTEN se atiende desde el loop con add_reader, sin hilos.
+    """
+
+    def __init__(self, refresh_seconds=API_REFRESH_SECONDS):
+        self.snapshot = None
+        self.refresh_seconds = refresh_seconds
+        self.reloads = 0
+        # Funciones a llamar después de cada recarga (p. ej. vaciar la caché de series)
+        self.listeners = []
+        self._wake = None
+        self._listen_conn = None
+
+    async def reload(self, force=False):
+        loop = asyncio.get_running_loop()
+        if not force and self.snapshot is not None:
+            if await loop.run_in_executor(None, fetch_version) == self.snapshot.version:
+                return False
+        started_at = time.perf_counter()
+        self.snapshot = await loop.run_in_executor(None, load_snapshot)
+        self.reloads += 1
+        print(f"🗂️ Foto cargada: {len(self.snapshot.latest)} tickers, "
+              f"{sum(len(rows) for rows in self.snapshot.history.values())} análisis, "
+              f"{sum(len(items) for items in self.snapshot.news.values())} noticias "
+              f"en {time.perf_counter() - started_at:.2f}s.")
+        for listener in self.listeners:
+            listener()
+        return True
+
+    def _listen(self, loop):
+        from db import RESULTS_CHANNEL, get_connection
+
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {RESULTS_CHANNEL}")
+        except Exception as e:
+            print(f"⚠️ Sin LISTEN {RESULTS_CHANNEL} ({e}); la foto se recarga cada {self.refresh_seconds:.0f}s.")
+            return
+
+        def on_notify():
+            try:
+                conn.poll()
+            except Exception as e:
+                print(f"⚠️ Se cortó la conexión de LISTEN ({e}); se sigue con el chequeo periódico.")
+                loop.remove_reader(conn.fileno())
+                return
+            if conn.notifies:
+                conn.notifies.clear()
+                self._wake.set()
+
+        loop.add_reader(conn.fileno(), on_notify)
+        self._listen_conn = conn
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._listen(loop)
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"⚠️ No se pudo recargar la foto: {e}")
+
+    def close(self):
+        if self._listen_conn is not None and not self._listen_conn.closed:
+            asyncio.get_event_loop().remove_reader(self._listen_conn.fileno())
+            self._listen_conn.close()
+
+###############################################
+# RESPUESTAS HTTP
+###############################################
+def _accepts_gzip(request):
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def _matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+def respond(request, payload):
+    from aiohttp import web
+
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": f"public, max-age={API_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if _matches(request, payload.etag):
+        return web.Response(status=304, headers=headers)
+    body = payload.body
+    if payload.gzipped is not None and _accepts_gzip(request):
+        body = payload.gzipped
+        headers["Content-Encoding"] = "gzip"
+    return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+
+def _error(status, message):
+    from aiohttp import web
+
+    return web.json_response({"error": message}, status=status)
+
+def _snapshot(request):
+    return request.app["holder"].snapshot
+
+def _time_param(request, name, end=False):
+    # Segundos epoch o fecha/hora ISO (UTC si no trae zona); una fecha sola como `to` incluye todo el día
+    value = request.query.get(name)
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    seconds = int(moment.timestamp())
+    return seconds + 86399 if end and len(value) == 10 else seconds
+
+def _date_param(request, name):
+    value = request.query.get(name)
+    if value is None:
+        return None
+    return date.fromisoformat(value).isoformat()
+
+###############################################
+# ENDPOINTS
+###############################################
+async def health(request):
+    from aiohttp import web
+
+    snapshot = _snapshot(request)
+    holder = request.app["holder"]
+    return web.json_response({
+        "status": "ok" if snapshot else "loading",
+        "version": list(snapshot.version) if snapshot else None,
+        "loaded_at": snapshot.loaded_at if snapshot else None,
+        "tickers": len(snapshot.latest) if snapshot else 0,
+        "reloads": holder.reloads,
+    }, status=200 if snapshot else 503)
+
+async def recommendations(request):
+    snapshot = _snapshot(request)
+    region = request.query.get("region")
+    if region is not None and region not in snapshot.regions:
+        return _error(404, f"Región sin análisis: {region}")
+
+    def build():
+        tickers = snapshot.regions[region] if region else list(snapshot.latest)
+        return {"region": region, "count": len(tickers), "items": [snapshot.latest[t] for t in tickers]}
+
+    return respond(request, snapshot.payload(("recommendations", region), build))
+
+async def recommendation(request):
+    snapshot = _snapshot(request)
+    ticker = request.match_info["ticker"].upper()
+    if ticker not in snapshot.latest:
+        return _error(404, f"Ticker sin análisis: {ticker}")
+    return respond(request, snapshot.payload(("recommendation", ticker), lambda: snapshot.latest[ticker]))
+
+async def history(request):
+    snapshot = _snapshot(request)
+    ticker = request.match_info["ticker"].upper()
+    if ticker not in snapshot.history:
+        return _error(404, f"Ticker sin análisis: {ticker}")
+    try:
+        start, end = _date_param(request, "from"), _date_param(request, "to")
+    except ValueError:
+        return _error(400, "from y to van como AAAA-MM-DD")
+
+    def build():
+        rows = snapshot.history_range(ticker, start, end)
+        return {"ticker": ticker, "from": start, "to": end, "count": len(rows), "items": rows}
+
+    return respond(request, snapshot.payload(("history", ticker, start, end), build))
+
+async def news(request):
+    snapshot = _snapshot(request)
+    ticker = request.match_info["ticker"].upper()
+    try:
+        limit = max(1, min(int(request.query.get("limit", API_NEWS_PER_TICKER)), API_NEWS_PER_TICKER))
+    except ValueError:
+        return _error(400, "limit debe ser un entero")
+
+    def build():
+        items = snapshot.news.get(ticker, [])[:limit]
+        return {"ticker": ticker, "count": len(items), "items": items}
+
+    return respond(request, snapshot.payload(("news", ticker, limit), build))
+
+async def series(request):
+    from series import METHODS, SERIES_FIELDS, SERIES_INTERVALS, SERIES_DEFAULT_WIDTH, SERIES_MAX_WIDTH
+
+    ticker = request.match_info["ticker"].upper()
+    interval = request.query.get("interval", "1d")
+    fields = tuple(request.query.get("fields", "close,rsi,macd").split(","))
+    method = request.query.get("method", "lttb")
+    if interval not in SERIES_INTERVALS:
+        return _error(400, f"interval debe ser uno de {', '.join(SERIES_INTERVALS)}")
+    if not set(fields) <= set(SERIES_FIELDS):
+        return _error(400, f"fields admite {', '.join(SERIES_FIELDS)}")
+    if method not in METHODS:
+        return _error(400, f"method debe ser uno de {', '.join(METHODS)}")
+    try:
+        width = max(10, min(int(request.query.get("width", SERIES_DEFAULT_WIDTH)), SERIES_MAX_WIDTH))
+        start, end = _time_param(request, "from"), _time_param(request, "to", end=True)
+    except ValueError:
+        return _error(400, "width va como entero y from/to como AAAA-MM-DD, fecha y hora ISO o segundos epoch")
+
+    # Solo se cargan series de tickers conocidos: cualquier otro sería una descarga al proveedor por pedido
+    snapshot = _snapshot(request)
+    if get_universe().get(ticker) is None and (snapshot is None or ticker not in snapshot.latest):
+        return _error(404, f"Ticker desconocido: {ticker}")
+    cache = request.app["series"]
+    entry = cache.cached(ticker, interval)
+    if entry is None and not cache.missing(ticker, interval):
+        try:
+            entry = await asyncio.get_running_loop().run_in_executor(None, cache.get, ticker, interval)
+        except Exception as e:
+            # Proveedor de precios o DB caídos: no es un error del pedido y no queda en caché
+            print(f"⚠️ No se pudo cargar la serie {interval} de {ticker}: {type(e).__name__}: {e}")
+            return _error(503, f"No se pudo cargar la serie {interval} de {ticker}, reintentar más tarde")
+    if entry is None:
+        return _error(404, f"Sin serie {interval} para {ticker}")
+    key = (fields, start, end, width, method)
+    payload = entry.payloads.get(key)
+    if payload is None:
+        if len(entry.payloads) >= API_RESPONSE_CACHE:
+            entry.payloads.clear()
+        payload = entry.payloads[key] = _encode({
+            "ticker": ticker, "interval": interval, "method": method, "width": width,
+            "from": start, "to": end, "first": entry.first, "last": entry.last, "points": entry.points,
+            "series": entry.query(fields, start, end, width, method),
+        })
+    return respond(request, payload)
+
+async def screen(request):
+    from screener import COLUMNS, SCREENER_LIMIT, SCREENER_MAX_LIMIT
+
+    screener = request.app["screener"]
+    where, sort = request.query.get("where"), request.query.get("sort", "-total_score")
+    fields = tuple(request.query.get("fields", ",".join(COLUMNS)).split(","))
+    try:
+        limit = max(1, min(int(request.query.get("limit", SCREENER_LIMIT)), SCREENER_MAX_LIMIT))
+    except ValueError:
+        return _error(400, "limit debe ser un entero")
+    payloads = request.app["screener_payloads"]
+    if payloads.get("version") != screener.version or len(payloads) >= API_RESPONSE_CACHE:
+        payloads.clear()
+        payloads["version"] = screener.version
+    key = (where, sort, limit, fields)
+    payload = payloads.get(key)
+    if payload is None:
+        try:
+            result = screener.query(where, sort, limit, fields)
+        except ValueError as e:
+            return _error(400, str(e))
+        payload = payloads[key] = _encode({
+            "where": where, "sort": sort, "matched": result.matched, "total": result.total,
+            "count": len(result.rows), "items": result.rows,
+        })
+    return respond(request, payload)
+
+def create_app(holder=None):
+    from aiohttp import web
+    from screener import Screener
+    from series import SeriesCache
+
+    @web.middleware
+    async def require_snapshot(request, handler):
+        if request.path != "/health" and not request.path.startswith("/v1/series/") \
+                and request.app["holder"].snapshot is None:
+            return _error(503, "La foto de datos todavía se está cargando")
+        return await handler(request)
+
+    app = web.Application(middlewares=[require_snapshot])
+    app["holder"] = holder or SnapshotHolder()
+    app["series"] = SeriesCache()
+    # Una corrida nueva del pipeline trae velas diarias nuevas
+    app["holder"].listeners.append(app["series"].clear)
+    app["screener"] = Screener()
+    app["screener_payloads"] = {}
+
+    def refresh_screener():
+        try:
+            print(f"🔎 Screener: {app['screener'].refresh()} tickers actualizados.")
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el screener: {e}")
+
+    # La primera recarga hace la carga completa; las siguientes traen solo lo que cambió
+    app["holder"].listeners.append(lambda: asyncio.get_running_loop().run_in_executor(None, refresh_screener))
+    app.router.add_get("/health", health)
+    app.router.add_get("/v1/recommendations", recommendations)
+    app.router.add_get("/v1/recommendations/{ticker}", recommendation)
+    app.router.add_get("/v1/history/{ticker}", history)
+    app.router.add_get("/v1/news/{ticker}", news)
+    app.router.add_get("/v1/series/{ticker}", series)
+    app.router.add_get("/v1/screener", screen)
+
+    async def start_watch(app):
+        try:
+            await app["holder"].reload(force=True)
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar la foto inicial: {e}")
+        app["watch"] = asyncio.create_task(app["holder"].watch())
+
+    async def stop_watch(app):
+        app["watch"].cancel()
+        app["holder"].close()
+
+    app.on_startup.append(start_watch)
+    app.on_cleanup.append(stop_watch)
+    return app
+
+###############################################
+# CLI
+###############################################
+async def _bench(url, total, concurrency):
+    import aiohttp
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async with session.get(f"{url}/v1/recommendations") as response:
+            items = (await response.json())["items"]
+        if not items:
+            print("La API no tiene análisis cargados.")
+            return
+        tickers = [item["ticker"] for item in items]
+        paths = [f"/v1/recommendations/{tickers[i % len(tickers)]}" for i in range(200)] \
+            + [f"/v1/history/{tickers[i % len(tickers)]}" for i in range(50)] \
+            + [f"/v1/news/{tickers[i % len(tickers)]}" for i in range(50)] \
+            + ["/v1/recommendations"] * 5
+        etags, latencies, statuses = {}, [], {}
+        next_request = iter(range(total))
+
+        async def client():
+            for i in next_request:
+                path = paths[i % len(paths)]
+                # La mitad de los pedidos revalida con el ETag ya visto
+                headers = {"Accept-Encoding": "gzip"}
+                if i % 2 and path in etags:
+                    headers["If-None-Match"] = etags[path]
+                started_at = time.perf_counter()
+                async with session.get(url + path, headers=headers) as response:
+                    await response.read()
+                    etags[path] = response.headers.get("ETag")
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+                latencies.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    print(f"{total} pedidos en {elapsed:.2f}s: {total / elapsed:,.0f} req/s con {concurrency} conexiones; "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms; "
+          f"respuestas {dict(sorted(statuses.items()))}.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--url", default=f"http://127.0.0.1:{API_PORT}")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    if args.command == "bench":
+        asyncio.run(_bench(args.url.rstrip("/"), args.requests, args.concurrency))
+        return
+    from aiohttp import web
+
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
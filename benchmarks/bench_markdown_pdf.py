@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark del renderizado markdown -> PDF: compara el renderizador anterior
+(regex y cambio de fuente por segmento, línea por línea), el mismo con
+GlyphSubset y markdown_pdf sobre reportes largos generados, midiendo tiempo
+total (incluido pdf.output) y cambios de fuente.
+
+Uso: python -m benchmarks.bench_markdown_pdf [--sections 40] [--runs 3] [--json resultados.json]
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from fpdf import FPDF
+from pdf_output import add_report_fonts
+from report_pdf import PDFReportWriter
+
+def synthetic_report(sections, tickers_per_section=8, seed_words=("compra", "venta", "neutral", "soporte", "resistencia")):
+    lines = []
+    for s in range(sections):
+        lines.append(f"### Sección {s + 1}: Mercado sintético")
+        lines.append("")
+        for t in range(tickers_per_section):
+            word = seed_words[(s + t) % len(seed_words)]
+            lines.append(f"- **SYN{s:02d}{t}:** señal de **{word}** con RSI en zona {word} "
+                         f"y MACD cruzando la señal; precio cerca de la **media de 50** ruedas [N{t + 1}].")
+            lines.append(f"  - Detalle: volumen {t * 13 % 7 + 1}x el promedio, **tendencia {word}**.")
+        lines.append("")
+        lines.append("#### Recomendaciones")
+        for n in range(1, 4):
+            lines.append(f"{n}. **Acción {n}:** revisar posiciones en SYN{s:02d}{n} y ajustar stops.")
+        lines.append("")
+        lines.append("| Ticker | Señal | RSI | Comentario |")
+        lines.append("|---|---|---:|---|")
+        for t in range(4):
+            lines.append(f"| SYN{s:02d}{t} | {seed_words[t]} | {30 + t * 10} | Comentario con algo de texto para cortar |")
+        lines.append("")
+        lines.append("Resumen de la sección con texto corrido y un **dato destacado** al final del párrafo.")
+        lines.append("")
+    return "\n".join(lines)
+
+###############################################
+# RENDERIZADOR ANTERIOR (REFERENCIA)
+###############################################
+class CountingFPDF(FPDF):
+    # Cuenta solo los cambios efectivos, igual que MarkdownRenderer.font_switches
+    font_switches = 0
+
+    def set_font(self, family, style='', size=0):
+        if (self.font_family, self.font_style, self.font_size_pt) != (family.lower(), style, size):
+            self.font_switches += 1
+        super().set_font(family, style, size)
+
+def legacy_write_formatted_line(pdf, line, font_size=12, line_height=8):
+    segments = re.split(r'(\*\*.*?\*\*)', line)
+    for seg in segments:
+        if seg.startswith('**') and seg.endswith('**'):
+            pdf.set_font("DejaVu", "B", font_size)
+            pdf.write(line_height, seg[2:-2])
+        else:
+            pdf.set_font("DejaVu", "", font_size)
+            pdf.write(line_height, seg)
+    pdf.ln(line_height)
+
+def legacy_render(report_text, output_filename, glyph_subset=False):
+    pdf = CountingFPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    add_report_fonts(pdf)
+    if not glyph_subset:
+        # Como antes de GlyphSubset: una entrada por carácter escrito
+        for font in pdf.fonts.values():
+            font['subset'] = list(font['subset'])
+    pdf.add_page()
+    pdf.set_font("DejaVu", "B", 16)
+    pdf.cell(0, 10, "Reporte Diario de Mercados", ln=True, align="C")
+    pdf.set_font("DejaVu", "", 12)
+    pdf.cell(0, 10, f"Fecha: {datetime.now().strftime('%Y-%m-%d')}", ln=True, align="C")
+    pdf.ln(10)
+    for raw_line in report_text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            pdf.ln(4)
+            continue
+        if line.startswith("### "):
+            pdf.set_font("DejaVu", "B", 16)
+            pdf.cell(0, 10, line[4:].strip(), ln=True)
+        elif line.startswith("#### "):
+            pdf.set_font("DejaVu", "B", 14)
+            pdf.cell(0, 10, line[5:].strip(), ln=True)
+        elif line.startswith("- ") or line.startswith("• "):
+            pdf.set_font("DejaVu", "", 12)
+            pdf.cell(10, 8, "• ", ln=0)
+            legacy_write_formatted_line(pdf, line[2:].strip())
+        else:
+            legacy_write_formatted_line(pdf, line)
+        pdf.ln(2)
+    pdf.ln(5)
+    pdf.output(output_filename)
+    return pdf.font_switches, pdf.page
+
+def new_render(report_text, output_filename):
+    writer = PDFReportWriter()
+    writer.add_text(report_text)
+    writer.pdf.ln(5)
+    writer.pdf.output(output_filename)
+    return writer.renderer.font_switches, writer.pdf.page
+
+def bench(render, report_text, workdir, name, runs):
+    timings = []
+    for i in range(runs):
+        filename = os.path.join(workdir, f"{name}-{i}.pdf")
+        started_at = time.perf_counter()
+        font_switches, pages = render(report_text, filename)
+        timings.append(1000 * (time.perf_counter() - started_at))
+    return {
+        "renderer": name,
+        "ms_best": round(min(timings), 1),
+        "ms_mean": round(sum(timings) / len(timings), 1),
+        "font_switches": font_switches,
+        "pages": pages,
+        "pdf_bytes": os.path.getsize(filename),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    report_text = synthetic_report(args.sections)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Una corrida de calentamiento para que la carga de fuentes no cuente
+        new_render(report_text[:200], os.path.join(workdir, "warmup.pdf"))
+        results = [
+            bench(legacy_render, report_text, workdir, "anterior", args.runs),
+            bench(lambda text, filename: legacy_render(text, filename, glyph_subset=True),
+                  report_text, workdir, "anterior+subset", args.runs),
+            bench(new_render, report_text, workdir, "markdown_pdf", args.runs),
+        ]
+
+    lines = len(report_text.splitlines())
+    print(f"\nReporte sintético: {args.sections} secciones, {lines} líneas, {len(report_text)} caracteres")
+    print(f"{'renderizador':<16} {'ms mejor':>9} {'ms media':>9} {'cambios fuente':>15} {'páginas':>8} {'bytes PDF':>10}")
+    for r in results:
+        print(f"{r['renderer']:<16} {r['ms_best']:>9} {r['ms_mean']:>9} {r['font_switches']:>15} "
+              f"{r['pages']:>8} {r['pdf_bytes']:>10}")
+    print("(el renderizador anterior no interpreta tablas, listas numeradas ni anidadas: las deja como texto)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sections": args.sections, "lines": lines, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark de salida del PDF: bytes y tiempo de armado por ticker para cada
+combinación de DPI y formato de imagen, más el costo de registrar las fuentes.
+
+Uso: python -m benchmarks.bench_pdf_output [--tickers 20] [--json resultados.json]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from charts import FIGSIZE, build_charts_pdf, compute_chart_series, render_chart
+from pdf_output import CHART_MAX_DPI, chart_render_dpi
+from report_pdf import create_pdf_report
+
+def synthetic_items(n_tickers, days=252, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=days, freq="B")
+    items = []
+    for i in range(n_tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        items.append((f"SYN{i:03d}", compute_chart_series(pd.DataFrame({"Close": close}, index=index))))
+    return items
+
+def bench_charts(items, dpi, image_format, workdir):
+    started_at = time.perf_counter()
+    images = [render_chart(ticker, series, dpi=dpi, image_format=image_format) for ticker, series in items]
+    render_seconds = time.perf_counter() - started_at
+    filename = os.path.join(workdir, f"charts-{image_format}-{dpi}.pdf")
+    started_at = time.perf_counter()
+    build_charts_pdf(images, filename)
+    build_seconds = time.perf_counter() - started_at
+    size = os.path.getsize(filename)
+    n = len(items)
+    return {
+        "config": f"{image_format}@{dpi}dpi",
+        "pdf_bytes": size,
+        "bytes_per_ticker": size // n,
+        "render_ms_per_ticker": round(1000 * render_seconds / n, 1),
+        "build_ms_per_ticker": round(1000 * build_seconds / n, 1),
+    }
+
+def bench_fonts(workdir, runs=3):
+    text = "\n".join(["### Mercado de USA", "- **AAPL:** compra, RSI neutral", "Texto con acentos: áéíóú ñ"] * 20)
+    timings = []
+    for i in range(runs):
+        started_at = time.perf_counter()
+        create_pdf_report(text, os.path.join(workdir, f"texto-{i}.pdf"))
+        timings.append(round(1000 * (time.perf_counter() - started_at), 1))
+    return {"text_pdf_ms_first": timings[0], "text_pdf_ms_warm": min(timings[1:])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    items = synthetic_items(args.tickers)
+    capped_dpi = chart_render_dpi(FIGSIZE, CHART_MAX_DPI)
+    configs = [(100, "rgb"), (capped_dpi, "rgb"), (capped_dpi, "indexed"), (capped_dpi, "jpeg")]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [bench_charts(items, dpi, image_format, workdir) for dpi, image_format in configs]
+        fonts = bench_fonts(workdir)
+
+    print(f"\n{'configuración':<18} {'bytes PDF':>11} {'bytes/ticker':>13} {'render ms/t':>12} {'armado ms/t':>12}")
+    for r in results:
+        print(f"{r['config']:<18} {r['pdf_bytes']:>11} {r['bytes_per_ticker']:>13} "
+              f"{r['render_ms_per_ticker']:>12} {r['build_ms_per_ticker']:>12}")
+    print(f"\nPDF de texto: primera vez {fonts['text_pdf_ms_first']} ms, con fuentes en memoria {fonts['text_pdf_ms_warm']} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"tickers": args.tickers, "charts": results, "fonts": fonts}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks sin red: indicadores, parseo de noticias, fechas,
+inserts en lote en la DB, PDF de texto y gráficos, a varias escalas, sobre
+datos sintéticos (OHLCV de N tickers x M ruedas y páginas de noticias
+guardadas en disco). Los resultados se guardan en JSON y se pueden comparar
+con una corrida anterior: si algún caso empeora más que el umbral, sale
+con código 1.
+
+Los inserts van contra SQLite en memoria salvo que BENCH_DB_URL apunte a
+un PostgreSQL local (se usan tablas temporales, no se toca ninguna tabla real).
+
+Uso: python -m benchmarks.bench_suite [--scales small,medium] [--runs 5]
+         [--only indicadores,noticias] [--json resultados.json]
+         [--baseline latest|ruta.json] [--threshold 0.25]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from benchmarks.bench_markdown_pdf import synthetic_report
+from fake_services import PUBLISHED_TEXTS, synthetic_news_html
+from main import calculate_macd, calculate_moving_averages, calculate_rsi, parse_news_html, parse_published_date
+
+###############################################
+# CONFIGURACIÓN
+###############################################
+RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", os.path.join(".cache", "benchmarks"))
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+# Empeoramiento relativo (sobre el mejor tiempo) que cuenta como regresión
+REGRESSION_THRESHOLD = float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.25"))
+# Diferencias absolutas menores a esto se consideran ruido
+REGRESSION_MIN_DELTA_MS = float(os.getenv("BENCH_MIN_DELTA_MS", "2"))
+
+# news_pages: páginas de noticias guardadas; news_rows: filas para los inserts
+Scale = namedtuple("Scale", ["tickers", "days", "news_pages", "news_rows", "report_sections", "charts"])
+
+SCALES = {
+    "small": Scale(20, 252, 10, 1000, 10, 5),
+    "medium": Scale(100, 252, 50, 5000, 40, 20),
+    "large": Scale(500, 1260, 200, 20000, 120, 50),
+}
+
+SUITES = ["indicadores", "noticias", "fechas", "db", "pdf", "graficos"]
+
+###############################################
+# DATOS SINTÉTICOS
+###############################################
+def synthetic_ohlcv(n_tickers, days, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2020-01-01", periods=days, freq="B")
+    frames = {}
+    for i in range(n_tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+        spread = np.abs(rng.normal(0, 0.01, days)) * close
+        frames[f"SYN{i:04d}"] = pd.DataFrame({
+            "Open": close * (1 + rng.normal(0, 0.005, days)),
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(100_000, 10_000_000, days),
+        }, index=index)
+    return frames
+
+def save_news_pages(directory, count):
+    paths = []
+    for i in range(count):
+        ticker = f"SYN{i:04d}"
+        path = os.path.join(directory, f"{ticker}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_news_html(ticker, seed=i))
+        paths.append((ticker, path))
+    return paths
+
+def synthetic_news_rows(count, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    return [(f"SYN{i % 500:04d}", f"Título sintético {i}", f"https://finance.yahoo.com/news/n-{seed}-{i}.html",
+             now - pd.Timedelta(minutes=rng.randint(0, 60 * 24 * 7)).to_pytimedelta())
+            for i in range(count)]
+
+###############################################
+# MEDICIÓN
+###############################################
+def measure(func, runs, warmup=1):
+    """Ejecuta func warmup + runs veces (sin mostrar lo que imprima) y devuelve los tiempos en ms."""
+    timings = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(warmup + runs):
+            started_at = time.perf_counter()
+            func()
+            if i >= warmup:
+                timings.append(1000 * (time.perf_counter() - started_at))
+    return {"ms_best": round(min(timings), 3), "ms_median": round(statistics.median(timings), 3), "runs": runs}
+
+def bench_indicators(scale, runs, workdir):
+    frames = list(synthetic_ohlcv(scale.tickers, scale.days).values())
+    prices = [float(data["Close"].iloc[-1]) for data in frames]
+    return {
+        "calculate_rsi": measure(lambda: [calculate_rsi(data) for data in frames], runs),
+        "calculate_macd": measure(lambda: [calculate_macd(data) for data in frames], runs),
+        "calculate_moving_averages": measure(
+            lambda: [calculate_moving_averages(data, price) for data, price in zip(frames, prices)], runs),
+    }
+
+def bench_news(scale, runs, workdir, pages_dir=None):
+    if pages_dir:
+        pages = [(name.rsplit(".", 1)[0], os.path.join(pages_dir, name))
+                 for name in sorted(os.listdir(pages_dir)) if name.endswith(".html")]
+    else:
+        pages = save_news_pages(workdir, scale.news_pages)
+
+    def parse_saved_pages():
+        for ticker, path in pages:
+            with open(path, encoding="utf-8") as f:
+                parse_news_html(ticker, f.read())
+    return {"parse_news_html": dict(measure(parse_saved_pages, runs), pages=len(pages))}
+
+def bench_dates(scale, runs, workdir):
+    texts = [PUBLISHED_TEXTS[i % len(PUBLISHED_TEXTS)] for i in range(scale.news_pages * 5)]
+    return {"parse_published_date": dict(measure(lambda: [parse_published_date(t) for t in texts], runs),
+                                         calls=len(texts))}
+
+def _db_connection():
+    if BENCH_DB_URL:
+        import psycopg2
+
+        conn = psycopg2.connect(BENCH_DB_URL)
+        conn.cursor().execute("""
+        CREATE TEMP TABLE IF NOT EXISTS news (
+            id SERIAL PRIMARY KEY, ticker VARCHAR(20), title TEXT, link TEXT UNIQUE, published_at TIMESTAMP
+        );""")
+        return "postgres", conn, "%s"
+    import sqlite3
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE news (id INTEGER PRIMARY KEY, ticker TEXT, title TEXT, link TEXT UNIQUE, published_at TEXT)")
+    return "sqlite", conn, "?"
+
+def bench_db(scale, runs, workdir):
+    """
+    Inserta las mismas filas fila por fila (como save_news_to_db) y en lote.
+    Cada corrida usa links nuevos para que ON CONFLICT no descarte filas.
+    """
+    backend, conn, mark = _db_connection()
+    insert = (f"INSERT INTO news (ticker, title, link, published_at) VALUES ({', '.join([mark] * 4)}) "
+              f"ON CONFLICT (link) DO NOTHING")
+    # Las filas se generan antes de medir: una tanda por corrida (más la de calentamiento)
+    batches = iter([synthetic_news_rows(scale.news_rows, seed) for seed in range(2 * (runs + 1))])
+
+    def row_by_row():
+        cur = conn.cursor()
+        for row in next(batches):
+            cur.execute(insert, row)
+        conn.commit()
+
+    def batched():
+        rows = next(batches)
+        cur = conn.cursor()
+        if backend == "postgres":
+            from psycopg2.extras import execute_values
+
+            execute_values(cur, insert.replace(f"({', '.join([mark] * 4)})", "%s"), rows, page_size=1000)
+        else:
+            cur.executemany(insert, rows)
+        conn.commit()
+
+    try:
+        return {
+            f"insert_fila_por_fila[{backend}]": dict(measure(row_by_row, runs), rows=scale.news_rows),
+            f"insert_en_lote[{backend}]": dict(measure(batched, runs), rows=scale.news_rows),
+        }
+    finally:
+        conn.close()
+
+def bench_pdf(scale, runs, workdir):
+    from report_pdf import create_pdf_report
+
+    report_text = synthetic_report(scale.report_sections)
+    path = os.path.join(workdir, "reporte.pdf")
+    result = measure(lambda: create_pdf_report(report_text, path), runs)
+    return {"create_pdf_report": dict(result, sections=scale.report_sections, pdf_bytes=os.path.getsize(path))}
+
+def bench_charts(scale, runs, workdir):
+    from charts import build_charts_pdf, compute_chart_series, render_chart
+
+    frames = synthetic_ohlcv(scale.charts, 252, seed=1)
+    items = [(ticker, compute_chart_series(data)) for ticker, data in frames.items()]
+    images = []
+
+    def render():
+        images[:] = [render_chart(ticker, series) for ticker, series in items]
+    result = {"render_chart": dict(measure(render, runs), charts=len(items))}
+    path = os.path.join(workdir, "graficos.pdf")
+    result["build_charts_pdf"] = dict(measure(lambda: build_charts_pdf(images, path), runs), charts=len(items))
+    return result
+
+BENCHES = {
+    "indicadores": bench_indicators,
+    "noticias": bench_news,
+    "fechas": bench_dates,
+    "db": bench_db,
+    "pdf": bench_pdf,
+    "graficos": bench_charts,
+}
+
+###############################################
+# RESULTADOS Y REGRESIONES
+###############################################
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(scale_names, suites, runs, pages_dir=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale_name in scale_names:
+            scale = SCALES[scale_name]
+            for suite in suites:
+                print(f"⏱️ {suite} @ {scale_name} ({scale.tickers} tickers x {scale.days} ruedas)...", flush=True)
+                kwargs = {"pages_dir": pages_dir} if suite == "noticias" else {}
+                for name, result in BENCHES[suite](scale, runs, workdir, **kwargs).items():
+                    results[f"{suite}.{name}@{scale_name}"] = result
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "scales": {name: SCALES[name]._asdict() for name in scale_names},
+        "results": results,
+    }
+
+def latest_results(directory=RESULTS_DIR, exclude=None):
+    if not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+    paths = [p for p in paths if exclude is None or os.path.abspath(p) != os.path.abspath(exclude)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD, min_delta_ms=REGRESSION_MIN_DELTA_MS):
+    """
+    Compara los mejores tiempos caso por caso. Devuelve las filas de la
+    comparación y la lista de regresiones (más lento que baseline * (1 + threshold)
+    y por más de min_delta_ms).
+    """
+    rows, regressions = [], []
+    for key, result in current["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        before, after = previous["ms_best"], result["ms_best"]
+        ratio = after / before if before else float("inf")
+        regressed = ratio > 1 + threshold and after - before > min_delta_ms
+        rows.append((key, before, after, ratio, regressed))
+        if regressed:
+            regressions.append(key)
+    return rows, regressions
+
+def print_results(results):
+    print(f"\n{'caso':<52} {'ms mejor':>10} {'ms mediana':>11}")
+    for key, result in results["results"].items():
+        print(f"{key:<52} {result['ms_best']:>10.1f} {result['ms_median']:>11.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="small,medium", help=f"Escalas separadas por coma ({', '.join(SCALES)})")
+    parser.add_argument("--only", help=f"Subconjunto de suites ({', '.join(SUITES)})")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--news-html", help="Directorio con páginas de noticias guardadas (TICKER.html) en lugar de las sintéticas")
+    parser.add_argument("--json", help=f"Dónde guardar los resultados (por defecto, {RESULTS_DIR}/<fecha>.json)")
+    parser.add_argument("--baseline", help="Resultados anteriores a comparar: ruta o 'latest'")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Empeoramiento relativo tolerado (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    scale_names = [s.strip() for s in args.scales.split(",") if s.strip()]
+    suites = [s.strip() for s in args.only.split(",")] if args.only else SUITES
+    unknown = [s for s in scale_names if s not in SCALES] + [s for s in suites if s not in BENCHES]
+    if unknown:
+        parser.error(f"escala o suite desconocida: {', '.join(unknown)}")
+
+    results = run_suite(scale_names, suites, args.runs, args.news_html)
+    print_results(results)
+
+    path = args.json or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResultados guardados en {path}")
+
+    if args.baseline:
+        baseline_path = latest_results(exclude=path) if args.baseline == "latest" else args.baseline
+        if baseline_path is None:
+            print("No hay resultados anteriores para comparar.")
+            return
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f"\nComparación con {baseline_path} (commit {baseline.get('commit') or '-'}):")
+        print(f"{'caso':<52} {'antes':>9} {'ahora':>9} {'ratio':>7}")
+        for key, before, after, ratio, regressed in rows:
+            print(f"{key:<52} {before:>9.1f} {after:>9.1f} {ratio:>6.2f}x{'  ❌' if regressed else ''}")
+        if regressions:
+            print(f"\n❌ {len(regressions)} regresiones por encima del {args.threshold:.0%}.")
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones por encima del {args.threshold:.0%}.")
+
+if __name__ == "__main__":
+    main()
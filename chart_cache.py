@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import struct
+import time
+from charts import CHART_DPI, FIGSIZE, ChartImage, render_charts
+from pdf_output import image_settings
+
+###############################################
+# CONFIGURACIÓN DE LA CACHÉ DE GRÁFICOS
+###############################################
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", os.path.join(".cache", "charts"))
+CHART_CACHE_MAX_MB = float(os.getenv("CHART_CACHE_MAX_MB", "200"))
+# Incrementar si cambia el código de dibujo para invalidar las imágenes guardadas
+CHART_STYLE_VERSION = "2"
+
+_HEADER = struct.Struct(">I")
+
+def chart_key(ticker, series, dpi=CHART_DPI):
+    """
+    Hash del contenido graficado: ticker, parámetros de renderizado y los
+    bytes de cada serie. Si nada cambió, el gráfico es idéntico.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{CHART_STYLE_VERSION}|{ticker}|{dpi}|{FIGSIZE}|{image_settings()}".encode("utf-8"))
+    for name in sorted(series):
+        values = series[name]
+        if values.dtype.kind == "M":
+            values = values.astype("datetime64[ns]").view("int64")
+        digest.update(name.encode("utf-8"))
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """
+    Caché en disco de gráficos ya renderizados, acotada por tamaño. Cuando se
+    supera el límite se eliminan primero las imágenes usadas hace más tiempo.
+    """
+
+    def __init__(self, directory=CHART_CACHE_DIR, max_mb=CHART_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.render_seconds = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+        self._stats_path = os.path.join(self.directory, "stats.json")
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def get(self, ticker, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                meta_size, = _HEADER.unpack(f.read(_HEADER.size))
+                meta = json.loads(f.read(meta_size))
+                data = f.read()
+        except (OSError, ValueError, struct.error):
+            return None
+        # Se actualiza la fecha de uso para el desalojo LRU
+        os.utime(path)
+        encoded = {"cs": meta["cs"], "f": meta["f"], "pal": bytes.fromhex(meta["pal"]), "data": data}
+        return ChartImage(ticker, meta["width"], meta["height"], encoded)
+
+    def put(self, key, image):
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        meta = json.dumps({
+            "width": image.width,
+            "height": image.height,
+            "cs": image.encoded["cs"],
+            "f": image.encoded["f"],
+            "pal": image.encoded["pal"].hex(),
+        }).encode("utf-8")
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(len(meta)))
+            f.write(meta)
+            f.write(image.encoded["data"])
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        removed = 0
+        while total > self.max_bytes and entries:
+            _, size, name = entries.pop(0)
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            removed += 1
+        return removed
+
+    def _average_render_seconds(self):
+        try:
+            with open(self._stats_path) as f:
+                return json.load(f).get("avg_render_seconds")
+        except (OSError, ValueError):
+            return None
+
+    def _save_average_render_seconds(self, seconds):
+        with open(self._stats_path, "w") as f:
+            json.dump({"avg_render_seconds": seconds}, f)
+
+    def report(self):
+        total = self.hits + self.misses
+        if not total:
+            return
+        avg = self.render_seconds / self.misses if self.misses else self._average_render_seconds()
+        if self.misses:
+            self._save_average_render_seconds(avg)
+        saved = f", ~{self.hits * avg:.1f}s ahorrados" if avg and self.hits else ""
+        print(f"🖼️ Caché de gráficos: {self.hits} aciertos, {self.misses} renderizados "
+              f"({100 * self.hits / total:.0f}% de aciertos){saved}.")
+
+
+def render_charts_cached(items, max_workers=None, cache=None):
+    """
+    Igual que render_charts, pero solo renderiza con matplotlib los tickers
+    cuyo contenido cambió; el resto se lee de la caché.
+    """
+    cache = cache or ChartCache()
+    keys = [chart_key(ticker, series) for ticker, series in items]
+    images = [cache.get(ticker, key) for (ticker, _), key in zip(items, keys)]
+    pending = [i for i, image in enumerate(images) if image is None]
+    cache.hits += len(items) - len(pending)
+    cache.misses += len(pending)
+
+    if pending:
+        started_at = time.perf_counter()
+        rendered = render_charts([items[i] for i in pending], max_workers)
+        cache.render_seconds += time.perf_counter() - started_at
+        for i, image in zip(pending, rendered):
+            images[i] = image
+            cache.put(keys[i], image)
+        cache.evict()
+
+    cache.report()
+    return images
@@ -0,0 +1,165 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from fpdf import FPDF
+from pdf_output import CHART_IMAGE_FORMAT, chart_render_dpi, encode_image, register_image
+
+###############################################
+# CONFIGURACIÓN DE GRÁFICOS
+###############################################
+FIGSIZE = (12, 12)
+# Por defecto el DPI se ajusta al tope de CHART_MAX_DPI (ver pdf_output.py)
+CHART_DPI = int(os.getenv("CHART_DPI", str(chart_render_dpi(FIGSIZE))))
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(os.cpu_count() or 1)))
+
+# `encoded` es el dict de pdf_output.encode_image (espacio de color, filtro, paleta y datos)
+ChartImage = namedtuple("ChartImage", ["ticker", "width", "height", "encoded"])
+
+###############################################
+# SERIES A GRAFICAR
+###############################################
+def compute_chart_series(data):
+    """
+    Calcula las series del gráfico (precio, medias móviles, RSI y MACD) a
+    partir de los datos diarios y las devuelve como arrays de numpy, que son
+    livianos de enviar a los procesos de renderizado.
+    """
+    close = data['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=14, min_periods=14).mean()
+    avg_loss = loss.rolling(window=14, min_periods=14).mean()
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema12 - ema26
+    signal = macd.ewm(span=9, adjust=False).mean()
+
+    return {
+        "dates": close.index.to_numpy(),
+        "close": close.to_numpy(dtype=float),
+        "ma50": close.rolling(window=50).mean().to_numpy(dtype=float),
+        "ma200": close.rolling(window=200).mean().to_numpy(dtype=float),
+        "rsi": rsi.to_numpy(dtype=float),
+        "macd": macd.to_numpy(dtype=float),
+        "signal": signal.to_numpy(dtype=float),
+        "hist": (macd - signal).fillna(0).to_numpy(dtype=float),
+    }
+
+###############################################
+# RENDERIZADO (UNA FIGURA REUTILIZADA POR PROCESO)
+###############################################
+_figure = None
+_axes = None
+
+def _get_figure():
+    global _figure, _axes
+    if _figure is None:
+        _figure, _axes = plt.subplots(3, 1, figsize=FIGSIZE, sharex=True)
+    else:
+        for ax in _axes:
+            ax.cla()
+    return _figure, _axes
+
+def render_chart(ticker, series, dpi=CHART_DPI, image_format=CHART_IMAGE_FORMAT):
+    """
+    Dibuja los tres paneles del ticker sobre la figura del proceso y la
+    devuelve como imagen codificada en memoria, sin pasar por disco.
+    """
+    fig, axes = _get_figure()
+    dates = series["dates"]
+
+    # Gráfico de precios y medias móviles
+    axes[0].plot(dates, series["close"], label='Close Price', linewidth=2)
+    axes[0].plot(dates, series["ma50"], label='MA 50', linestyle='dashed')
+    axes[0].plot(dates, series["ma200"], label='MA 200', linestyle='dotted')
+    axes[0].set_title(f'Precio y Medias Móviles - {ticker}')
+    axes[0].legend()
+
+    # RSI
+    axes[1].plot(dates, series["rsi"], label='RSI', color='purple')
+    axes[1].axhline(70, linestyle='dashed', color='red', alpha=0.5)
+    axes[1].axhline(30, linestyle='dashed', color='green', alpha=0.5)
+    axes[1].set_title(f'RSI - {ticker}')
+    axes[1].legend()
+
+    # MACD
+    axes[2].plot(dates, series["macd"], label='MACD', color='blue')
+    axes[2].plot(dates, series["signal"], label='Signal', color='orange', linestyle='dashed')
+    axes[2].bar(dates, series["hist"], label='Histogram', color='gray', alpha=0.5, width=1.0)
+    axes[2].set_title(f'MACD - {ticker}')
+    axes[2].legend()
+
+    # Se dibuja directo sobre el buffer del canvas Agg, sin archivos intermedios
+    fig.set_dpi(dpi)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    height, width, _ = rgba.shape
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    return ChartImage(ticker, width, height, encode_image(rgb, image_format))
+
+def _render_item(item):
+    ticker, series = item
+    return render_chart(ticker, series)
+
+def _init_worker():
+    # Cada proceso crea su figura una vez al arrancar y la reutiliza en todos sus gráficos
+    _get_figure()
+
+def _pool_context():
+    """
+    Los gráficos se piden desde un hilo del pipeline mientras otras etapas
+    corren en paralelo con locks tomados (pool de la DB, sesiones HTTP):
+    hacer fork de ese proceso puede dejar a los hijos bloqueados. Con
+    forkserver (o spawn donde no existe) los procesos salen de un
+    intérprete limpio que ya tiene importado este módulo.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def render_charts(items, max_workers=None):
+    """
+    Renderiza los gráficos de varios tickers en paralelo con un pool de
+    procesos. `items` es una lista de (ticker, series); el resultado respeta
+    el mismo orden.
+    """
+    max_workers = max_workers or CHART_WORKERS
+    if max_workers <= 1 or len(items) <= 1:
+        return [_render_item(item) for item in items]
+    chunksize = max(1, len(items) // (max_workers * 4))
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(items)), mp_context=_pool_context(),
+                             initializer=_init_worker) as executor:
+        return list(executor.map(_render_item, items, chunksize=chunksize))
+
+###############################################
+# ARMADO DEL PDF DE ANÁLISIS TÉCNICO
+###############################################
+def add_chart_page(pdf, image):
+    pdf.add_page()
+    pdf.set_font("Arial", size=16)
+    pdf.cell(200, 10, f'Análisis Técnico - {image.ticker}', ln=True, align='C')
+    name = register_image(pdf, f"chart-{image.ticker}", image.width, image.height, image.encoded)
+    pdf.image(name, x=10, y=30, w=190)
+
+def build_charts_pdf(images, filename="stock_analysis.pdf"):
+    pdf = FPDF()
+    for image in images:
+        add_chart_page(pdf, image)
+    pdf.output(filename)
+    print(f"PDF guardado como {filename}")
+    return filename
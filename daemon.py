@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Modo daemon: el proceso queda residente y refresca cada mercado cuando
+cierra (NYSE/Nasdaq, BYMA para los .BA y cripto cada CRYPTO_REFRESH_HOURS),
+manteniendo en memoria precios, análisis, noticias, el pool de la DB y las
+sesiones HTTP entre corridas. El reporte diario se arma y se encola una vez
+por día, cuando terminaron los mercados de DAEMON_REPORT_MARKETS que
+operaron ese día.
+
+Uso: python daemon.py [--once MERCADO] [--no-warm-start]
+"""
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+import pandas as pd
+from db import close_pool
+from email_delivery import enqueue_email, shutdown_delivery
+from main import get_http_session, refresh_tickers
+from metrics import export_metrics
+from market_calendar import MARKETS, is_trading_day, next_trigger, session_date, tickers_by_market
+from report_build import build_reports, download_price_frames, news_from_run
+from tickers import get_universe
+
+###############################################
+# CONFIGURACIÓN DEL DAEMON
+###############################################
+DAEMON_REPORT_MARKETS = [m.strip() for m in os.getenv("DAEMON_REPORT_MARKETS", "us,byma").split(",") if m.strip()]
+# Ruedas que se vuelven a pedir en cada refresco incremental (correcciones de yfinance)
+PRICE_OVERLAP_DAYS = int(os.getenv("PRICE_OVERLAP_DAYS", "5"))
+PRICE_HISTORY_DAYS = 366
+# Tope de espera entre chequeos, para reaccionar a señales y cambios de hora
+DAEMON_MAX_SLEEP_SECONDS = 60
+
+###############################################
+# CACHÉ DE PRECIOS EN MEMORIA
+###############################################
+class PriceCache:
+    """
+    Un año de velas diarias por ticker. La primera vez se descarga el año
+    completo; después solo se piden las ruedas desde la última guardada
+    (menos PRICE_OVERLAP_DAYS) y se combinan con lo que ya estaba.
+    """
+
+    def __init__(self):
+        self.frames = {}
+        self.downloaded_rows = 0
+
+    def refresh(self, tickers):
+        cold = [t for t in tickers if t not in self.frames]
+        warm = [t for t in tickers if t in self.frames]
+        if cold:
+            for ticker, data in download_price_frames(cold).items():
+                self.frames[ticker] = data
+                self.downloaded_rows += len(data)
+        if warm:
+            since = min(self.frames[t].index[-1] for t in warm) - timedelta(days=PRICE_OVERLAP_DAYS)
+            for ticker, data in download_price_frames(warm, start=since.strftime("%Y-%m-%d")).items():
+                self.downloaded_rows += len(data)
+                merged = pd.concat([self.frames[ticker], data])
+                merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+                self.frames[ticker] = merged[merged.index >= merged.index[-1] - timedelta(days=PRICE_HISTORY_DAYS)]
+        return {t: self.frames[t] for t in tickers if t in self.frames}
+
+
+class MarketDaemon:
+    def __init__(self, tickers=None, report_markets=None):
+        tickers = tickers or get_universe().tickers
+        self.tickers = {name: group for name, group in tickers_by_market(tickers).items() if group}
+        self.report_markets = [m for m in (report_markets or DAEMON_REPORT_MARKETS) if m in self.tickers]
+        self.prices = PriceCache()
+        # Estado de indicadores: último análisis por ticker y la vela con la que se calculó
+        self.analyses = {}
+        self.analyzed_bars = {}
+        self.news = {}
+        self.completed = {}
+        self.reported_on = None
+        self.next_runs = {}
+        self._stop = threading.Event()
+
+    def _changed_frames(self, frames):
+        changed = {}
+        for ticker, data in frames.items():
+            last_bar = (data.index[-1], float(data['Close'].iloc[-1]))
+            if self.analyzed_bars.get(ticker) != last_bar:
+                changed[ticker] = data
+        return changed
+
+    def refresh_market(self, name, now=None):
+        now = now or datetime.now(timezone.utc)
+        market = MARKETS[name]
+        started_at = time.perf_counter()
+        frames = self.prices.refresh(self.tickers[name])
+        changed = self._changed_frames(frames)
+        print(f"🔁 {market.label}: {len(changed)}/{len(self.tickers[name])} tickers con velas nuevas.")
+        if changed:
+            analyses, _, news_lists = refresh_tickers(list(changed), changed)
+            for analysis in analyses:
+                ticker = analysis["ticker"]
+                self.analyses[ticker] = analysis
+                data = frames[ticker]
+                self.analyzed_bars[ticker] = (data.index[-1], float(data['Close'].iloc[-1]))
+            for news in news_lists:
+                self.news[news[0][0]] = news
+        self.completed[name] = session_date(market, now)
+        print(f"✅ {market.label} actualizado en {time.perf_counter() - started_at:.1f}s.")
+        # Las métricas del daemon son acumuladas desde el arranque
+        export_metrics("daemon")
+
+    def markets_pending_report(self, now):
+        # Mercados del reporte que operaron hoy y todavía no se refrescaron
+        pending = []
+        for name in self.report_markets:
+            market = MARKETS[name]
+            today = session_date(market, now)
+            if is_trading_day(market, today) and self.completed.get(name) != today:
+                pending.append(name)
+        return pending
+
+    def maybe_report(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        today = now.astimezone(MARKETS["us"].timezone).date()
+        traded = [m for m in self.report_markets if is_trading_day(MARKETS[m], session_date(MARKETS[m], now))]
+        if not traded or self.reported_on == today or self.markets_pending_report(now) or not self.analyses:
+            return None
+        print("\nGenerando reporte diario...")
+        df = pd.DataFrame(list(self.analyses.values())).sort_values("ticker").reset_index(drop=True)
+        price_frames = {t: self.prices.frames[t] for t in df['ticker'] if t in self.prices.frames}
+        report_files = build_reports(df, price_frames, news_from_run(list(self.news.values())), get_universe().group())
+        enqueue_email(report_files)
+        self.reported_on = today
+        export_metrics("daemon")
+        return report_files
+
+    def warm_start(self):
+        """
+        Llena las cachés al arrancar para que los disparos siguientes sean
+        incrementales. Si el cierre de hoy ya pasó, la rueda cuenta como
+        refrescada y el reporte del día puede salir sin esperar a mañana.
+        """
+        now = datetime.now(timezone.utc)
+        for name in self.tickers:
+            self.refresh_market(name, now)
+            market = MARKETS[name]
+            midnight = datetime.combine(session_date(market, now), dt_time.min, tzinfo=market.timezone)
+            if market.close is not None and next_trigger(market, midnight) > now:
+                self.completed.pop(name, None)
+
+    def run(self, warm_start=True):
+        if warm_start:
+            self.warm_start()
+        now = datetime.now(timezone.utc)
+        self.next_runs = {name: next_trigger(MARKETS[name], now) for name in self.tickers}
+        for name, at in sorted(self.next_runs.items(), key=lambda item: item[1]):
+            print(f"⏰ {MARKETS[name].label}: próximo refresco {at.isoformat()}")
+
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            for name, at in sorted(self.next_runs.items(), key=lambda item: item[1]):
+                if at > now or self._stop.is_set():
+                    continue
+                try:
+                    self.refresh_market(name, now)
+                except Exception as e:
+                    print(f"Error al refrescar {MARKETS[name].label}: {e}")
+                self.next_runs[name] = next_trigger(MARKETS[name], datetime.now(timezone.utc))
+                print(f"⏰ {MARKETS[name].label}: próximo refresco {self.next_runs[name].isoformat()}")
+            try:
+                self.maybe_report()
+            except Exception as e:
+                print(f"Error al generar el reporte diario: {e}")
+            wait = (min(self.next_runs.values()) - datetime.now(timezone.utc)).total_seconds()
+            self._stop.wait(timeout=max(1.0, min(wait, DAEMON_MAX_SLEEP_SECONDS)))
+
+    def stop(self, *_):
+        print("Deteniendo el daemon...")
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--once", choices=sorted(MARKETS), help="Refrescar un solo mercado y salir")
+    parser.add_argument("--no-warm-start", action="store_true", help="No precargar las cachés al iniciar")
+    args = parser.parse_args()
+
+    daemon = MarketDaemon()
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        if args.once:
+            daemon.refresh_market(args.once)
+        else:
+            daemon.run(warm_start=not args.no_warm_start)
+    finally:
+        shutdown_delivery()
+        close_pool()
+        get_http_session().close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+import os
+import threading
+from dotenv import load_dotenv
+
+###############################################
+# CONFIGURACIÓN DE BASES DE DATOS
+###############################################
+
+# Cargar las variables de entorno desde el archivo .env
+load_dotenv()
+
+# Configuración de conexión a la DB
+DB_PARAMS = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "database": os.getenv("DB_NAME", "stocks_db"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", ""),
+    "port": os.getenv("DB_PORT", "5432")
+}
+DB_URL = os.getenv("DB_URL")
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "4"))
+# Segundos que un hilo espera una conexión libre del pool antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Canal de NOTIFY por el que el pipeline avisa que guardó resultados nuevos (ver api.py)
+RESULTS_CHANNEL = "pipeline_results"
+
+def get_connection():
+    # psycopg2 se importa recién al conectarse, así importar main no lo carga (ver startup.py)
+    import psycopg2
+
+    return psycopg2.connect(**DB_PARAMS)
+
+_engine = None
+
+def get_engine():
+    # El engine de SQLAlchemy se crea una sola vez y se reutiliza
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+        _engine = create_engine(DB_URL)
+    return _engine
+
+_pool = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool falla con PoolError si no quedan conexiones: los hilos esperan turno acá
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def get_pool():
+    # Pool de conexiones psycopg2 compartido por todo el proceso
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from psycopg2.pool import ThreadedConnectionPool
+            _pool = ThreadedConnectionPool(1, DB_POOL_MAX, **DB_PARAMS)
+        return _pool
+
+@contextmanager
+def pooled_connection():
+    """
+    Presta una conexión del pool, esperando hasta DB_POOL_TIMEOUT segundos
+    si están todas en uso. Si el bloque falla se hace rollback; si la
+    conexión quedó cerrada (p. ej. se cortó el servidor) se descarta en lugar
+    de devolverla al pool.
+    """
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        from psycopg2.pool import PoolError
+
+        raise PoolError(f"sin conexiones libres en el pool tras {DB_POOL_TIMEOUT:.0f}s (DB_POOL_MAX={DB_POOL_MAX})")
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def notify(channel, payload=""):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+        conn.commit()
+        cur.close()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Cola de envío de correos: los reportes se encolan en un directorio spool y un
+worker en segundo plano los envía por una única conexión SMTP autenticada,
+en lotes de destinatarios y con reintentos con backoff exponencial.
+
+Uso: python email_delivery.py send     # envía lo pendiente y termina
+     python email_delivery.py status   # muestra pendientes y fallidos
+     python email_delivery.py requeue  # vuelve a encolar los fallidos
+
+Para probar sin un servidor real:
+     python -m aiosmtpd -n -l localhost:8025
+     SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 python email_delivery.py send
+"""
+import argparse
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime
+from email import policy
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+from metrics import span
+
+load_dotenv()
+
+###############################################
+# CONFIGURACIÓN DE CORREO
+###############################################
+EMAIL_SPOOL_DIR = os.getenv("EMAIL_SPOOL_DIR", os.path.join(".cache", "outbox"))
+# Destinatarios por transacción SMTP (RCPT TO)
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_BACKOFF_SECONDS = float(os.getenv("EMAIL_BACKOFF_SECONDS", "30"))
+EMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "1800"))
+# Cuánto espera el proceso al terminar para vaciar la cola
+EMAIL_DRAIN_TIMEOUT = float(os.getenv("EMAIL_DRAIN_TIMEOUT", "300"))
+# La conexión se verifica con NOOP si estuvo ociosa más de esto
+SMTP_IDLE_CHECK_SECONDS = 60
+
+def email_config_from_env():
+    return {
+        "smtp_server": os.getenv("SMTP_SERVER"),
+        "smtp_port": int(os.getenv("SMTP_PORT") or "587"),
+        "username": os.getenv("EMAIL_USERNAME"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+        "sender": os.getenv("EMAIL_SENDER"),
+        "recipients": [r.strip() for r in (os.getenv("EMAIL_RECIPIENTS") or "").split(",") if r.strip()],
+        "starttls": os.getenv("SMTP_STARTTLS", "1") == "1",
+        "timeout": float(os.getenv("SMTP_TIMEOUT", "30")),
+    }
+
+def build_message(report_files, subject, sender, recipients,
+                  body="Adjunto se encuentra el reporte diario de mercados."):
+    msg = MIMEMultipart()
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = ", ".join(recipients)
+    msg.attach(MIMEText(body, "plain"))
+    for report_file in report_files:
+        with open(report_file, "rb") as f:
+            part = MIMEApplication(f.read(), Name=os.path.basename(report_file))
+        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_file)}"'
+        msg.attach(part)
+    return msg
+
+###############################################
+# SPOOL EN DISCO
+###############################################
+class Outbox:
+    """
+    Cada envío pendiente es un par de archivos en el spool: `<id>.eml` con el
+    mensaje ya armado (los adjuntos quedan copiados, aunque la próxima corrida
+    pise los PDFs) y `<id>.json` con los destinatarios que faltan, intentos y
+    la hora del próximo intento. Los que agotan los reintentos pasan a
+    `failed/`. Se escribe con archivo temporal + os.replace, como la caché de
+    gráficos, para que un corte no deje trabajos a medias.
+    """
+
+    def __init__(self, directory=EMAIL_SPOOL_DIR):
+        self.directory = directory
+        self.failed_directory = os.path.join(directory, "failed")
+        os.makedirs(self.failed_directory, exist_ok=True)
+
+    def _path(self, job_id, extension, directory=None):
+        return os.path.join(directory or self.directory, f"{job_id}.{extension}")
+
+    def _write(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def enqueue(self, msg, sender, recipients):
+        job_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        # Primero el mensaje: un .json sin su .eml nunca se considera pendiente
+        # policy.SMTP pliega los encabezados largos (To con muchos destinatarios) y usa CRLF
+        self._write(self._path(job_id, "eml"), msg.as_bytes(policy=policy.SMTP))
+        self.save({
+            "id": job_id,
+            "subject": msg['Subject'],
+            "sender": sender,
+            "pending": list(recipients),
+            "attempts": 0,
+            "next_attempt_at": 0,
+            "last_error": None,
+            "created_at": time.time(),
+        })
+        return job_id
+
+    def save(self, job, directory=None):
+        self._write(self._path(job["id"], "json", directory), json.dumps(job).encode("utf-8"))
+
+    def jobs(self, directory=None):
+        directory = directory or self.directory
+        jobs = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return jobs
+
+    def due(self, now=None):
+        now = now or time.time()
+        return [job for job in self.jobs() if job["next_attempt_at"] <= now]
+
+    def message_bytes(self, job, directory=None):
+        with open(self._path(job["id"], "eml", directory), "rb") as f:
+            return f.read()
+
+    def done(self, job):
+        for extension in ("json", "eml"):
+            try:
+                os.remove(self._path(job["id"], extension))
+            except FileNotFoundError:
+                pass
+
+    def fail(self, job):
+        self.save(job, self.failed_directory)
+        # Si el .eml ya no está (p. ej. lo borraron del spool) el trabajo queda en failed/ igual
+        try:
+            os.replace(self._path(job["id"], "eml"), self._path(job["id"], "eml", self.failed_directory))
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(self._path(job["id"], "json"))
+        except FileNotFoundError:
+            pass
+
+    def requeue_failed(self):
+        jobs = self.jobs(self.failed_directory)
+        for job in jobs:
+            job.update(attempts=0, next_attempt_at=0)
+            os.replace(self._path(job["id"], "eml", self.failed_directory), self._path(job["id"], "eml"))
+            self.save(job)
+            os.remove(self._path(job["id"], "json", self.failed_directory))
+        return len(jobs)
+
+###############################################
+# CONEXIÓN SMTP PERSISTENTE
+###############################################
+class SMTPSender:
+    """
+    Mantiene una conexión SMTP abierta y autenticada entre envíos: STARTTLS y
+    login se hacen una sola vez. Si el servidor cerró la conexión se
+    reconecta una vez antes de dar el envío por fallido.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or email_config_from_env()
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        config = self.config
+        server = smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=config["timeout"])
+        server.ehlo()
+        if config["starttls"]:
+            server.starttls()
+            server.ehlo()
+        if config["username"]:
+            server.login(config["username"], config["password"])
+        self._server = server
+
+    def _connection(self):
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK_SECONDS:
+            try:
+                self._server.noop()
+            except (smtplib.SMTPException, OSError):
+                # Un socket cerrado a medias da OSError (p. ej. ConnectionResetError): se reconecta igual
+                self.close()
+        if self._server is None:
+            self._connect()
+        return self._server
+
+    def send(self, sender, recipients, message_bytes):
+        """Devuelve el dict de destinatarios rechazados, como smtplib.sendmail."""
+        for attempt in range(2):
+            try:
+                refused = self._connection().sendmail(sender, recipients, message_bytes)
+                self._last_used = time.monotonic()
+                return refused
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+def is_permanent(error):
+    # Los 5xx no se arreglan reintentando (dirección inválida, credenciales, etc.)
+    code = getattr(error, "smtp_code", None)
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [c for c, _ in error.recipients.values()]
+        return all(500 <= c < 600 for c in codes)
+    return code is not None and 500 <= code < 600
+
+def backoff_seconds(attempts, base=EMAIL_BACKOFF_SECONDS, maximum=EMAIL_BACKOFF_MAX_SECONDS):
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+###############################################
+# WORKER DE ENVÍO
+###############################################
+class DeliveryWorker:
+    """
+    Envía los trabajos del spool desde un hilo propio. Cada trabajo se manda
+    en lotes de EMAIL_BATCH_SIZE destinatarios; después de cada lote se
+    guarda qué destinatarios faltan, así un reintento no duplica correos.
+    """
+
+    def __init__(self, outbox=None, sender=None, batch_size=EMAIL_BATCH_SIZE, max_attempts=EMAIL_MAX_ATTEMPTS):
+        self.outbox = outbox or Outbox()
+        self.sender = sender or SMTPSender()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.failed = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._idle = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def deliver(self, job):
+        with span("send_email") as current:
+            self._deliver(job, current)
+
+    def _deliver(self, job, current):
+        message_bytes = self.outbox.message_bytes(job)
+        while job["pending"]:
+            batch = job["pending"][:self.batch_size]
+            try:
+                refused = self.sender.send(job["sender"], batch, message_bytes)
+            except smtplib.SMTPRecipientsRefused as e:
+                # Todo el lote rechazado de forma definitiva: se descarta y sigue el resto
+                if not is_permanent(e):
+                    raise
+                refused = e.recipients
+            for recipient, (code, reason) in (refused or {}).items():
+                print(f"⚠️ {recipient} rechazado por el servidor ({code}): {reason!r}")
+            current.add_bytes(len(message_bytes))
+            current.add_items(len(batch))
+            job["pending"] = job["pending"][len(batch):]
+            self.outbox.save(job)
+
+    def process_due(self):
+        """Envía todos los trabajos vencidos. Devuelve cuántos quedaron pendientes."""
+        with self._lock:
+            for job in self.outbox.due():
+                try:
+                    self.deliver(job)
+                except Exception as e:
+                    job["attempts"] += 1
+                    job["last_error"] = f"{type(e).__name__}: {e}"[:300]
+                    if is_permanent(e) or job["attempts"] >= self.max_attempts:
+                        print(f"❌ No se pudo enviar '{job['subject']}' ({job['last_error']}); movido a failed/.")
+                        self.outbox.fail(job)
+                        self.failed += 1
+                    else:
+                        delay = backoff_seconds(job["attempts"])
+                        job["next_attempt_at"] = time.time() + delay
+                        self.outbox.save(job)
+                        print(f"⏳ Error al enviar '{job['subject']}' ({job['last_error']}); "
+                              f"reintento {job['attempts']} en {delay:.0f}s.")
+                    # Conexión en estado dudoso: se rehace en el próximo envío
+                    self.sender.close()
+                    continue
+                self.outbox.done(job)
+                self.sent += 1
+                print(f"📧 Correo '{job['subject']}' enviado.")
+            return len(self.outbox.jobs())
+
+    def next_attempt_in(self):
+        jobs = self.outbox.jobs()
+        if not jobs:
+            return None
+        return max(0.0, min(job["next_attempt_at"] for job in jobs) - time.time())
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._idle.clear()
+            try:
+                self.process_due()
+                wait = self.next_attempt_in()
+            except Exception as e:
+                # Un trabajo roto no puede dejar sin envíos al resto de la cola
+                print(f"⚠️ Error en el envío de correos ({type(e).__name__}: {e}); se reintenta en "
+                      f"{EMAIL_BACKOFF_SECONDS:.0f}s.")
+                self.sender.close()
+                wait = EMAIL_BACKOFF_SECONDS
+            if wait is None or wait > 0:
+                self._idle.set()
+            self._wakeup.wait(timeout=wait if wait is not None else None)
+            self._wakeup.clear()
+        self.sender.close()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="email-delivery", daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self):
+        self._wakeup.set()
+
+    def drain(self, timeout=EMAIL_DRAIN_TIMEOUT):
+        """
+        Espera a que la cola quede vacía o hasta `timeout` segundos. Lo que
+        siga pendiente (en backoff) queda en el spool para la próxima corrida.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            wait = self.next_attempt_in()
+            if wait is None or wait > deadline - time.monotonic():
+                break
+            self.notify()
+            self._idle.wait(timeout=max(0.1, min(wait, deadline - time.monotonic())))
+            time.sleep(0.05)
+        pending = len(self.outbox.jobs())
+        if pending:
+            print(f"📭 Quedan {pending} correos pendientes en {self.outbox.directory}; se reintentarán en la próxima corrida.")
+        return pending
+
+    def stop(self, drain_timeout=EMAIL_DRAIN_TIMEOUT):
+        pending = self.drain(drain_timeout) if drain_timeout else len(self.outbox.jobs())
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        return pending
+
+###############################################
+# API PARA EL JOB DIARIO
+###############################################
+_worker = None
+_worker_lock = threading.Lock()
+
+def get_delivery_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = DeliveryWorker()
+        return _worker.start()
+
+def enqueue_email(report_files, subject="Reporte Diario de Mercados", recipients=None, config=None):
+    """
+    Encola el correo con los PDFs adjuntos y vuelve enseguida; el envío lo
+    hace el worker en segundo plano. Devuelve el id del trabajo.
+    """
+    if isinstance(report_files, str):
+        report_files = [report_files]
+    config = config or email_config_from_env()
+    recipients = recipients or config["recipients"]
+    msg = build_message(report_files, subject, config["sender"], recipients)
+    worker = get_delivery_worker()
+    job_id = worker.outbox.enqueue(msg, config["sender"], recipients)
+    worker.notify()
+    print(f"📨 Correo '{subject}' encolado ({len(recipients)} destinatarios).")
+    return job_id
+
+def shutdown_delivery(timeout=EMAIL_DRAIN_TIMEOUT):
+    # Se llama al final del proceso: espera los envíos en curso y cierra la conexión
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is None:
+        return 0
+    return worker.stop(timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["send", "status", "requeue"])
+    args = parser.parse_args()
+
+    outbox = Outbox()
+    if args.command == "status":
+        for label, directory in (("pendiente", outbox.directory), ("fallido", outbox.failed_directory)):
+            for job in outbox.jobs(directory):
+                print(f"{label:<10} {job['id']}  {job['subject']!r}  destinatarios={len(job['pending'])} "
+                      f"intentos={job['attempts']}  último error={job['last_error']}")
+        return
+    if args.command == "requeue":
+        print(f"{outbox.requeue_failed()} correos vueltos a encolar.")
+        return
+    worker = DeliveryWorker(outbox)
+    for job in outbox.jobs():
+        # Envío manual: no se respeta el backoff pendiente
+        job["next_attempt_at"] = 0
+        outbox.save(job)
+    worker.process_due()
+    worker.sender.close()
+    print(f"Enviados: {worker.sent}, fallidos: {worker.failed}, pendientes: {len(outbox.jobs())}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Servicios locales que reemplazan a los externos en pruebas de carga:
+
+- FakeNewsServer: sirve el listado de noticias de un ticker con la misma
+  estructura que Yahoo Finance (o un HTML guardado en un directorio de
+  fixtures). Se usa con NEWS_URL_TEMPLATE.
+- FakeLLMServer: API compatible con OpenAI (/chat/completions, con y sin
+  stream) con latencia al primer token y tokens por segundo configurables.
+  Se usa con DEEPSEEK_BASE_URL.
+- SMTPSink: servidor SMTP mínimo que acepta todo y cuenta mensajes,
+  destinatarios y bytes (opcionalmente los guarda como .eml). Se usa con
+  SMTP_SERVER/SMTP_PORT y SMTP_STARTTLS=0.
+- FakeTickServer: websocket que emite operaciones sintéticas de los
+  tickers cripto a una tasa configurable. Se usa con STREAM_FEED=websocket
+  y STREAM_WS_URL.
+
+Las respuestas son determinísticas: dependen solo del ticker o del prompt.
+
+Uso: python fake_services.py [--news-port 8081] [--llm-port 8082] [--smtp-port 8025] [--ticks-port 8083]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+###############################################
+# NOTICIAS (HTML CON LA ESTRUCTURA DE YAHOO)
+###############################################
+PUBLISHED_TEXTS = ["Reuters • 2 hours ago", "Bloomberg • yesterday", "Yahoo Finance • 3 days ago",
+                   "Barron's • 45 minutes ago", "Motley Fool • 1 week ago", "MarketWatch • 5 hours ago"]
+
+def synthetic_news_html(ticker, articles=12, seed=0):
+    """
+    Página con la misma estructura que el listado de Yahoo que lee
+    parse_news_html: dos enlaces subtle-link por nota y el pie con la fuente
+    y la fecha relativa como hermano del segundo.
+    """
+    rng = random.Random(seed)
+    items = []
+    for n in range(articles):
+        href = f"/news/{ticker.lower()}-nota-{seed}-{n}.html"
+        title = f"{ticker} {rng.choice(['sube', 'baja', 'lateraliza'])} tras el reporte trimestral {n}"
+        items.append(
+            f'<li class="stream-item"><section>'
+            f'<a class="subtle-link" href="{href}" title="{title}"><img src="x.jpg"></a>'
+            f'<div class="content"><a class="subtle-link" href="{href}"><h3>{title}</h3></a>'
+            f'<p>{"Texto del resumen de la nota. " * 8}</p>'
+            f'<div class="footer"><div class="publishing">{rng.choice(PUBLISHED_TEXTS)}</div></div></div>'
+            f'</section></li>'
+        )
+    filler = "".join(f'<div class="nav"><a href="/quote/X{i}">X{i}</a></div>' for i in range(200))
+    return f"<html><head><title>{ticker} news</title></head><body>{filler}<ul>{''.join(items)}</ul></body></html>"
+
+
+class _ServerThread:
+    """ThreadingHTTPServer en un hilo de fondo, en 127.0.0.1 (port=0: puerto libre)."""
+
+    def __init__(self, handler, port=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.server.owner = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _NewsHandler(BaseHTTPRequestHandler):
+    PATH_RE = re.compile(r"^/quote/([^/]+)/news/?$")
+
+    def do_GET(self):
+        owner = self.server.owner
+        owner.count()
+        match = self.PATH_RE.match(self.path.split("?")[0])
+        if not match:
+            self.send_error(404)
+            return
+        if owner.latency:
+            time.sleep(owner.latency)
+        body = owner.page(unquote(match.group(1))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeNewsServer(_ServerThread):
+    def __init__(self, port=0, latency_ms=0, fixtures_dir=None, articles=12):
+        super().__init__(_NewsHandler, port)
+        self.latency = latency_ms / 1000
+        self.fixtures_dir = fixtures_dir
+        self.articles = articles
+
+    def page(self, ticker):
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, f"{ticker}.html")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    return f.read()
+        return synthetic_news_html(ticker, self.articles, seed=zlib.crc32(ticker.encode("utf-8")))
+
+    @property
+    def url_template(self):
+        return f"http://127.0.0.1:{self.port}/quote/{{ticker}}/news"
+
+###############################################
+# LLM COMPATIBLE CON OPENAI
+###############################################
+TICKER_RE = re.compile(r"\b[A-Z][A-Z0-9]{1,9}(?:\.BA|-USD)?\b")
+
+def fake_completion(prompt, max_tickers=12):
+    """Reporte en markdown armado con los tickers que aparecen en el prompt."""
+    tickers = []
+    for ticker in TICKER_RE.findall(prompt):
+        if ticker not in tickers:
+            tickers.append(ticker)
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+    lines = ["### Resumen del mercado", "",
+             f"Se analizaron {len(tickers)} activos con señales mixtas. [N1]", "",
+             "#### Activos destacados"]
+    for ticker in tickers[:max_tickers]:
+        signal = rng.choice(["compra", "venta", "neutral"])
+        lines.append(f"- **{ticker}:** señal de **{signal}**; RSI en zona {rng.randint(20, 80)} y MACD {signal}.")
+    lines += ["", "#### Recomendaciones", "1. **Diversificar:** mantener posiciones balanceadas.",
+              "2. **Stops:** ajustar según volatilidad.", ""]
+    return "\n".join(lines)
+
+def _words(text):
+    # Tokens aproximados: palabras con el espacio que las sigue
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        owner = self.server.owner
+        owner.count()
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        model = request.get("model", "fake-chat")
+        content = fake_completion(prompt)
+        tokens = _words(content)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens),
+                 "total_tokens": len(prompt) // 4 + len(tokens)}
+        owner.record(usage)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        time.sleep(owner.latency)
+        if not request.get("stream"):
+            time.sleep(len(tokens) * owner.token_delay)
+            self._send_json({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta, finish_reason=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+        chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            if owner.token_delay:
+                time.sleep(owner.token_delay)
+            chunk({"content": token})
+        chunk({}, "stop")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeLLMServer(_ServerThread):
+    def __init__(self, port=0, latency_ms=500, tokens_per_second=80):
+        super().__init__(_LLMHandler, port)
+        self.latency = latency_ms / 1000
+        self.token_delay = 1 / tokens_per_second if tokens_per_second else 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, usage):
+        with self._lock:
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+###############################################
+# SUMIDERO SMTP
+###############################################
+class SMTPSink:
+    """
+    Servidor SMTP (asyncio, en un hilo propio) que acepta cualquier remitente
+    y destinatario. Sin STARTTLS ni AUTH: usar SMTP_STARTTLS=0 y sin
+    EMAIL_USERNAME.
+    """
+
+    def __init__(self, port=0, save_dir=None, latency_ms=0):
+        self.requested_port = port
+        self.save_dir = save_dir
+        self.latency = latency_ms / 1000
+        self.port = None
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self.connections = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._session, "127.0.0.1", self.requested_port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+        reply = lambda line: writer.write(f"{line}\r\n".encode("ascii"))
+        reply("220 fake-smtp listo")
+        recipients = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode("utf-8", "replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                reply("250-fake-smtp")
+                reply("250-8BITMIME")
+                reply("250 SIZE 104857600")
+            elif verb == "HELO":
+                reply("250 fake-smtp")
+            elif verb == "MAIL":
+                recipients = []
+                reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[-1].strip())
+                reply("250 OK")
+            elif verb == "DATA":
+                reply("354 Terminar con <CRLF>.<CRLF>")
+                await writer.drain()
+                lines = []
+                while True:
+                    data_line = await reader.readline()
+                    if data_line in (b".\r\n", b".\n", b""):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self._store(b"".join(lines), recipients)
+                reply("250 OK: mensaje aceptado")
+            elif verb in ("RSET", "NOOP"):
+                reply("250 OK")
+            elif verb == "QUIT":
+                reply("221 Chau")
+                await writer.drain()
+                break
+            else:
+                reply("502 Comando no implementado")
+            await writer.drain()
+        writer.close()
+
+    def _store(self, message, recipients):
+        self.messages += 1
+        self.recipients += len(recipients)
+        self.bytes += len(message)
+        if self.save_dir:
+            os.makedirs(self.save_dir, exist_ok=True)
+            with open(os.path.join(self.save_dir, f"{self.messages:06d}.eml"), "wb") as f:
+                f.write(message)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+###############################################
+# OPERACIONES EN STREAMING (WEBSOCKET)
+###############################################
+class FakeTickServer:
+    """
+    Websocket (aiohttp, en un hilo propio) que manda a cada cliente, cada
+    `flush_ms`, una lista JSON de operaciones {"s", "p", "q", "t"} con
+    `rate` operaciones por segundo en total, con la hora actual.
+    """
+
+    def __init__(self, port=0, symbols=None, rate=1000, flush_ms=100, seed=0):
+        self.requested_port = port
+        self.symbols = list(symbols) if symbols else None
+        self.rate = rate
+        self.flush = flush_ms / 1000
+        self.seed = seed
+        self.port = None
+        self.connections = 0
+        self.ticks = 0
+        self._clients = set()
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    def _run(self):
+        from aiohttp import web
+
+        asyncio.set_event_loop(self._loop)
+        app = web.Application()
+        app.router.add_get("/ws", self._stream)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, "127.0.0.1", self.requested_port)
+        self._loop.run_until_complete(site.start())
+        self.port = self._runner.addresses[0][1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _stream(self, request):
+        import numpy as np
+        from aiohttp import web
+        from streaming import synthetic_ticks
+
+        if self.symbols is None:
+            from tickers import get_universe
+
+            self.symbols = get_universe().select(asset_class="crypto")
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        self._clients.add(ws)
+        rng = np.random.default_rng(self.seed + self.connections)
+        last_prices, clock = None, time.time()
+        while not ws.closed:
+            await asyncio.sleep(self.flush)
+            now = time.time()
+            count = rng.poisson(self.rate * (now - clock))
+            if count:
+                batch, last_prices = synthetic_ticks(count, len(self.symbols), clock, count / (now - clock),
+                                                     rng, last_prices)
+                ticks = [{"s": self.symbols[s], "p": round(float(p), 6), "q": round(float(q), 6), "t": int(t * 1000)}
+                         for t, s, p, q in zip(np.minimum(batch.times, now), batch.symbols, batch.prices, batch.sizes)]
+                try:
+                    await ws.send_str(json.dumps(ticks))
+                except ConnectionError:
+                    break
+                self.ticks += count
+            clock = now
+        self._clients.discard(ws)
+        return ws
+
+    async def _shutdown(self):
+        for ws in list(self._clients):
+            await ws.close()
+        await self._runner.cleanup()
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--news-port", type=int, default=8081)
+    parser.add_argument("--llm-port", type=int, default=8082)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--ticks-port", type=int, default=8083)
+    parser.add_argument("--ticks-per-second", type=float, default=1000)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80)
+    parser.add_argument("--news-latency-ms", type=float, default=0)
+    parser.add_argument("--news-fixtures", help="Directorio con TICKER.html para servir en lugar de las sintéticas")
+    parser.add_argument("--smtp-save-dir", help="Guardar los correos recibidos como .eml")
+    args = parser.parse_args()
+
+    news = FakeNewsServer(args.news_port, args.news_latency_ms, args.news_fixtures).start()
+    llm = FakeLLMServer(args.llm_port, args.llm_latency_ms, args.llm_tokens_per_second).start()
+    smtp = SMTPSink(args.smtp_port, args.smtp_save_dir).start()
+    ticks = FakeTickServer(args.ticks_port, rate=args.ticks_per_second).start()
+    print("Servicios falsos activos. Variables para una corrida contra ellos:")
+    print(f"  NEWS_URL_TEMPLATE={news.url_template}")
+    print(f"  DEEPSEEK_BASE_URL={llm.base_url} DEEPSEEK_API_KEY=fake")
+    print(f"  SMTP_SERVER=127.0.0.1 SMTP_PORT={smtp.port} SMTP_STARTTLS=0 EMAIL_USERNAME=")
+    print("  PRICE_PROVIDER=synthetic")
+    print(f"  STREAM_FEED=websocket STREAM_WS_URL={ticks.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        news.stop()
+        llm.stop()
+        smtp.stop()
+        ticks.stop()
+
+if __name__ == "__main__":
+    main()
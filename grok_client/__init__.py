@@ -1,4 +1,4 @@
-from .client import GrokClient
+from .client import GrokClient, join_tokens
 
-__version__ = "0.1.0"
-__all__ = ['GrokClient']
\ No newline at end of file
+__version__ = "0.2.0"
+__all__ = ['GrokClient', 'join_tokens']
\ No newline at end of file
@@ -1,8 +1,62 @@
-import requests
+import asyncio
+import contextlib
 import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _parse_line(line):
+    """
+    Parse one streamed line into (token, final_message).
+
+    Lines that cannot carry a token or the final response are skipped
+    without decoding them.
+    """
+    if b'"token"' not in line and b'"modelResponse"' not in line:
+        return None, None
+    try:
+        json_data = json.loads(line)
+    except ValueError:
+        return None, None
+    response_data = json_data.get("result", {}).get("response", {})
+    if "modelResponse" in response_data:
+        return None, response_data["modelResponse"]["message"]
+    return response_data.get("token") or None, None
+
+
+def join_tokens(tokens, max_chars=None):
+    """
+    Join streamed tokens into a single string.
+
+    Args:
+        tokens (iterable): Tokens in arrival order
+        max_chars (int, optional): Stop consuming once this many characters
+            have been collected, so memory stays bounded
+
+    Returns:
+        str: The joined text
+    """
+    parts = []
+    size = 0
+    tokens = iter(tokens)
+    try:
+        for token in tokens:
+            if max_chars is not None and size + len(token) > max_chars:
+                parts.append(token[:max_chars - size])
+                break
+            parts.append(token)
+            size += len(token)
+    finally:
+        # Stopping early closes the stream so its connection and concurrency slot are released right away
+        if hasattr(tokens, "close"):
+            tokens.close()
+    return "".join(parts)
+
 
 class GrokClient:
-    def __init__(self, cookies):
+    def __init__(self, cookies, timeout=(10, 120), max_retries=2, max_concurrency=4):
         """
         Initialize the Grok client with cookie values
 
@@ -13,6 +67,12 @@ class GrokClient:
                 - x-signature
                 - sso
                 - sso-rw
+            timeout (float | tuple): Connect/read timeout in seconds for each request
+            max_retries (int): Retries on connection errors (never once the request was sent)
+            max_concurrency (int): Maximum number of requests in flight at once.
+                The sync and async APIs each enforce it separately (a thread
+                semaphore and an asyncio one), so mixing both on one client
+                allows up to twice as many
         """
         self.base_url = "https://grok.com/rest/app-chat/conversations/new"
         self.cookies = cookies
@@ -32,6 +92,31 @@ class GrokClient:
             "sec-gpc": "1",
             "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
         }
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        # Completions are not idempotent: a 5xx may arrive after Grok already generated (and billed)
+        # the answer, so only requests that never reached the server are retried
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.5,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.cookies.update(self.cookies)
+        self.session.mount("https://", adapter)
+
+        self._async_client = None
+        self._async_semaphore = None
+        self._async_loop = None
 
     def _prepare_payload(self, message):
         """Prepare the default payload with the user's message"""
@@ -57,43 +142,149 @@ class GrokClient:
             "isReasoning": False
         }
 
-    def send_message(self, message):
+    def stream_message(self, message):
+        """
+        Send a message to Grok and yield the response tokens as they arrive
+
+        Args:
+            message (str): The user's input message
+
+        Yields:
+            str: Response tokens in arrival order. If Grok sends the final
+                 modelResponse before any token, it is yielded as a single chunk.
+        """
+        payload = self._prepare_payload(message)
+        self._semaphore.acquire()
+        response = None
+        try:
+            response = self.session.post(self.base_url, json=payload, stream=True, timeout=self.timeout)
+            response.raise_for_status()
+            received_tokens = False
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                token, final_message = _parse_line(line)
+                if final_message is not None:
+                    if not received_tokens:
+                        yield final_message
+                    return
+                if token:
+                    received_tokens = True
+                    yield token
+        finally:
+            # Runs when the stream ends, fails or the caller closes the generator
+            if response is not None:
+                response.close()
+            self._semaphore.release()
+
+    def send_message(self, message, max_chars=None):
         """
         Send a message to Grok and collect the streaming response
 
         Args:
             message (str): The user's input message
+            max_chars (int, optional): Upper bound for the collected response
 
         Returns:
             str: The complete response from Grok
         """
-        payload = self._prepare_payload(message)
-        response = requests.post(
-            self.base_url,
-            headers=self.headers,
-            cookies=self.cookies,
-            json=payload,
-            stream=True
-        )
+        return join_tokens(self.stream_message(message), max_chars).strip()
+
+    def _get_async_client(self):
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            timeout = self.timeout
+            if isinstance(timeout, tuple):
+                timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                cookies=self.cookies,
+                timeout=timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_client
 
-        full_response = ""
+    async def astream_message(self, message):
+        """
+        Async version of stream_message, backed by a pooled httpx.AsyncClient
 
-        for line in response.iter_lines():
-            if line:
-                decoded_line = line.decode('utf-8')
+        Args:
+            message (str): The user's input message
+
+        Yields:
+            str: Response tokens in arrival order
+        """
+        import httpx
+
+        client = self._get_async_client()
+        payload = self._prepare_payload(message)
+        async with self._async_semaphore:
+            for attempt in range(self.max_retries + 1):
                 try:
-                    json_data = json.loads(decoded_line)
-                    result = json_data.get("result", {})
-                    response_data = result.get("response", {})
+                    async with client.stream("POST", self.base_url, json=payload) as response:
+                        response.raise_for_status()
+                        received_tokens = False
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            token, final_message = _parse_line(line.encode("utf-8"))
+                            if final_message is not None:
+                                if not received_tokens:
+                                    yield final_message
+                                return
+                            if token:
+                                received_tokens = True
+                                yield token
+                        return
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    if attempt >= self.max_retries:
+                        raise
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def asend_message(self, message, max_chars=None):
+        """
+        Async version of send_message
 
-                    if "modelResponse" in response_data:
-                        return response_data["modelResponse"]["message"]
+        Args:
+            message (str): The user's input message
+            max_chars (int, optional): Upper bound for the collected response
 
-                    token = response_data.get("token", "")
-                    if token:
-                        full_response += token
+        Returns:
+            str: The complete response from Grok
+        """
+        parts = []
+        size = 0
+        async with contextlib.aclosing(self.astream_message(message)) as tokens:
+            async for token in tokens:
+                if max_chars is not None and size + len(token) > max_chars:
+                    parts.append(token[:max_chars - size])
+                    break
+                parts.append(token)
+                size += len(token)
+        return "".join(parts).strip()
 
-                except json.JSONDecodeError:
-                    continue
+    def close(self):
+        """Close the pooled sync session"""
+        self.session.close()
+
+    async def aclose(self):
+        """Close the pooled async client"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
 
-        return full_response.strip()
\ No newline at end of file
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Modo intradiario: cada INTRADAY_INTERVAL se piden las velas nuevas del
+universo en bloques (Universe.batches), se avanza el estado de indicadores
+de todos los tickers de forma incremental y vectorizada (EMA/MACD, RSI y
+ATR de Wilder, SMA50 con un buffer circular) y se evalúan las reglas de
+alerts.py sobre todos los tickers a la vez.
+
+Al arrancar se carga la historia del día sin evaluar reglas, así las
+alertas corresponden solo a velas nuevas. Los bloques de mercados cerrados
+no se consultan.
+
+Uso: python intraday.py run [--interval 1m]
+     python intraday.py bench [--tickers 1000] [--minutes 390]
+"""
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from alerts import AlertEngine, dispatch_alerts, load_rules
+from market_calendar import MARKETS, is_session_open
+from metrics import span
+from providers import INTERVAL_SECONDS, get_price_provider
+from tickers import get_universe
+
+###############################################
+# CONFIGURACIÓN DEL MODO INTRADIARIO
+###############################################
+INTRADAY_INTERVAL = os.getenv("INTRADAY_INTERVAL", "1m")
+# Tickers por pedido al proveedor de precios
+INTRADAY_BATCH_SIZE = int(os.getenv("INTRADAY_BATCH_SIZE", "200"))
+# Segundos después del cierre de cada vela antes de pedirla (para que el proveedor la publique)
+INTRADAY_DELAY_SECONDS = float(os.getenv("INTRADAY_DELAY_SECONDS", "5"))
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+SMA_PERIOD = 50
+# Velas necesarias antes de evaluar reglas (la SMA50 es la que más pide)
+WARMUP_BARS = SMA_PERIOD
+
+###############################################
+# ESTADO INCREMENTAL DE INDICADORES
+###############################################
+class IndicatorState:
+    """
+    Un array por indicador con un valor por ticker. update() avanza una vela
+    para los tickers indicados y guarda en `previous` los valores que tenían
+    antes, para detectar cruces. A diferencia del análisis diario (medias
+    simples), el RSI y el ATR usan el suavizado de Wilder, que se puede
+    avanzar vela a vela sin guardar la ventana.
+    """
+
+    def __init__(self, size):
+        import numpy as np
+
+        self.size = size
+        self.bars = np.zeros(size, dtype=np.int64)
+        self.current = {field: np.full(size, np.nan) for field in
+                        ("open", "high", "low", "close", "volume", "ema12", "ema26", "macd", "macd_signal",
+                         "macd_hist", "rsi", "sma50", "atr", "atr_pct")}
+        self.previous = {field: values.copy() for field, values in self.current.items()}
+        self._avg_gain = np.zeros(size)
+        self._avg_loss = np.zeros(size)
+        self._atr = np.zeros(size)
+        self._window = np.zeros((size, SMA_PERIOD))
+        self._window_sum = np.zeros(size)
+        self._updates = 0
+
+    @property
+    def ready(self):
+        return self.bars >= WARMUP_BARS
+
+    def update(self, positions, open_, high, low, close, volume):
+        import numpy as np
+
+        current, previous = self.current, self.previous
+        for field, values in current.items():
+            previous[field][positions] = values[positions]
+        bars = self.bars[positions] + 1
+        self.bars[positions] = bars
+        first = bars == 1
+        prev_close = previous["close"][positions]
+        high = np.where(np.isnan(high), close, high)
+        low = np.where(np.isnan(low), close, low)
+
+        def ema(field, value, span):
+            old = previous[field][positions]
+            return np.where(first, value, old + (value - old) * (2 / (span + 1)))
+
+        ema12, ema26 = ema("ema12", close, 12), ema("ema26", close, 26)
+        macd = ema12 - ema26
+        macd_signal = ema("macd_signal", macd, 9)
+
+        # RSI de Wilder: las primeras RSI_PERIOD variaciones se promedian simple
+        delta = np.where(first, 0.0, close - prev_close)
+        warm = bars <= RSI_PERIOD + 1
+        gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+        avg_gain, avg_loss = self._avg_gain[positions], self._avg_loss[positions]
+        avg_gain = np.where(warm, avg_gain + gain / RSI_PERIOD, avg_gain + (gain - avg_gain) / RSI_PERIOD)
+        avg_loss = np.where(warm, avg_loss + loss / RSI_PERIOD, avg_loss + (loss - avg_loss) / RSI_PERIOD)
+        self._avg_gain[positions], self._avg_loss[positions] = avg_gain, avg_loss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(avg_loss > 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+        rsi = np.where(bars > RSI_PERIOD, rsi, np.nan)
+
+        # ATR de Wilder sobre el rango verdadero
+        true_range = np.where(first, high - low, np.maximum(high - low, np.maximum(
+            np.abs(high - prev_close), np.abs(low - prev_close))))
+        atr = self._atr[positions]
+        atr = np.where(bars <= ATR_PERIOD, atr + true_range / ATR_PERIOD, atr + (true_range - atr) / ATR_PERIOD)
+        self._atr[positions] = atr
+        atr = np.where(bars >= ATR_PERIOD, atr, np.nan)
+
+        # SMA50: suma móvil sobre un buffer circular de SMA_PERIOD velas por ticker
+        slot = (bars - 1) % SMA_PERIOD
+        window_sum = self._window_sum[positions] + close - self._window[positions, slot]
+        self._window[positions, slot] = close
+        self._window_sum[positions] = window_sum
+        sma50 = np.where(bars >= SMA_PERIOD, window_sum / SMA_PERIOD, np.nan)
+        self._updates += 1
+        if self._updates % 4096 == 0:
+            # La suma incremental acumula error de redondeo; se recalcula de vez en cuando
+            self._window_sum = self._window.sum(axis=1)
+
+        for field, values in (("open", open_), ("high", high), ("low", low), ("close", close),
+                              ("volume", volume), ("ema12", ema12), ("ema26", ema26), ("macd", macd),
+                              ("macd_signal", macd_signal), ("macd_hist", macd - macd_signal),
+                              ("rsi", rsi), ("sma50", sma50), ("atr", atr), ("atr_pct", atr / close)):
+            current[field][positions] = values
+
+###############################################
+# MONITOR
+###############################################
+class IntradayMonitor:
+    def __init__(self, tickers=None, interval=INTRADAY_INTERVAL, rules=None, provider=None,
+                 batch_size=INTRADAY_BATCH_SIZE, sinks=None):
+        import numpy as np
+
+        if interval not in INTERVAL_SECONDS:
+            raise ValueError(f"Intervalo no soportado: {interval} ({', '.join(INTERVAL_SECONDS)})")
+        universe = get_universe()
+        self.tickers = list(tickers or universe.tickers)
+        self.interval = interval
+        self.step = INTERVAL_SECONDS[interval]
+        self.provider = provider or get_price_provider()
+        if not hasattr(self.provider, "intraday"):
+            raise ValueError(f"El proveedor {self.provider.name} no tiene velas intradiarias")
+        self.state = IndicatorState(len(self.tickers))
+        self.engine = AlertEngine(rules if rules is not None else load_rules(), self.tickers)
+        self.sinks = sinks
+        position = {ticker: i for i, ticker in enumerate(self.tickers)}
+        # Cada bloque es de un solo calendario: se saltea entero cuando su mercado está cerrado
+        self.batches = [(universe.lookup(batch[0]).calendar, batch, np.array([position[t] for t in batch]))
+                        for batch in universe.batches(self.tickers, batch_size)]
+        self.since = [None] * len(self.batches)
+        # Un bloque queda cargado con la primera consulta que responde, aunque no traiga velas
+        self.seeded = [False] * len(self.batches)
+        self._polled = False
+        self._stop = threading.Event()
+
+    def _apply(self, bars, positions, evaluate):
+        import numpy as np
+
+        alerts = []
+        for row, bar_time in enumerate(bars.times):
+            close = bars.close[row]
+            mask = ~np.isnan(close)
+            if not mask.any():
+                continue
+            updated = positions[mask]
+            self.state.update(updated, bars.open[row][mask], bars.high[row][mask], bars.low[row][mask],
+                              close[mask], bars.volume[row][mask])
+            if evaluate:
+                alerts.extend(self.engine.evaluate(self.state, updated, int(bar_time)))
+        return alerts
+
+    def poll(self, now=None):
+        """
+        Pide las velas cerradas desde la última consulta de cada bloque y
+        devuelve las alertas. Los bloques que todavía no tienen historia la
+        cargan sin evaluar reglas. La primera consulta carga todos los
+        bloques; después solo se consultan los de mercados abiertos.
+        """
+        now = now or time.time()
+        # Se mira una vela atrás para no perder la última vela de la rueda
+        last_bar = datetime.fromtimestamp(now - self.step, timezone.utc)
+        alerts = []
+        for i, (calendar, batch, positions) in enumerate(self.batches):
+            seeding = not self.seeded[i]
+            if self._polled and not is_session_open(MARKETS[calendar], last_bar):
+                continue
+            try:
+                bars = self.provider.intraday(batch, self.interval, since=self.since[i], until=now)
+            except Exception as e:
+                print(f"⚠️ No se pudieron obtener velas de {len(batch)} tickers ({calendar}): {e}")
+                continue
+            self.seeded[i] = True
+            if len(bars.times):
+                self.since[i] = int(bars.times[-1])
+            alerts.extend(self._apply(bars, positions, evaluate=not seeding))
+        self._polled = True
+        return alerts
+
+    def run(self):
+        with span("intraday.seed") as current:
+            self.poll()
+            current.add_items(len(self.tickers))
+        print(f"📡 Monitoreo intradiario de {len(self.tickers)} tickers cada {self.interval} "
+              f"({len(self.batches)} bloques, {len(self.engine.rules)} reglas).")
+        while not self._stop.is_set():
+            wake = (time.time() // self.step + 1) * self.step + INTRADAY_DELAY_SECONDS
+            if self._stop.wait(timeout=max(0.0, wake - time.time())):
+                break
+            started_at = time.perf_counter()
+            with span("intraday.poll") as current:
+                alerts = self.poll()
+                current.add_items(len(alerts))
+            dispatch_alerts(alerts, **({"sinks": self.sinks} if self.sinks else {}))
+            elapsed = time.perf_counter() - started_at
+            if elapsed > self.step:
+                print(f"⚠️ El ciclo tardó {elapsed:.1f}s, más que el intervalo de {self.interval}.")
+
+    def stop(self, *_):
+        print("Deteniendo el monitoreo intradiario...")
+        self._stop.set()
+
+###############################################
+# BENCHMARK
+###############################################
+def bench(count=1000, minutes=390, interval="1m", batch_size=INTRADAY_BATCH_SIZE):
+    """
+    Simula `minutes` ciclos con velas sintéticas (sin red ni esperas) y mide
+    cuánto tarda cada ciclo frente al presupuesto del intervalo.
+    """
+    from collections import Counter
+    from loadtest import synthetic_universe
+    from providers import SyntheticPrices
+
+    step = INTERVAL_SECONDS[interval]
+    # Un martes a las 15:00 UTC: NYSE y BYMA abiertos
+    start = int(datetime(2025, 3, 4, 15, 0, tzinfo=timezone.utc).timestamp())
+    monitor = IntradayMonitor(synthetic_universe(count), interval, provider=SyntheticPrices(),
+                              batch_size=batch_size, sinks="")
+    started_at = time.perf_counter()
+    monitor.poll(now=start)
+    seed_seconds = time.perf_counter() - started_at
+    cycles, fired = [], Counter()
+    for minute in range(1, minutes + 1):
+        started_at = time.perf_counter()
+        alerts = monitor.poll(now=start + minute * step + INTRADAY_DELAY_SECONDS)
+        cycles.append(time.perf_counter() - started_at)
+        fired.update(alert.rule for alert in alerts)
+    cycles.sort()
+    p50, p95 = cycles[len(cycles) // 2], cycles[min(len(cycles) - 1, int(len(cycles) * 0.95))]
+    print(f"{count} tickers, {minutes} ciclos de {interval}: historia en {seed_seconds:.2f}s; "
+          f"ciclo p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, máx {cycles[-1] * 1000:.1f} ms "
+          f"({cycles[-1] / step:.2%} del intervalo).")
+    print(f"Alertas: {sum(fired.values())} ({', '.join(f'{rule}={n}' for rule, n in fired.most_common()) or '-'}).")
+    return cycles
+
+###############################################
+# CLI
+###############################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["run", "bench"])
+    parser.add_argument("--interval", default=INTRADAY_INTERVAL, choices=sorted(INTERVAL_SECONDS))
+    parser.add_argument("--tickers", type=int, default=1000, help="Tickers sintéticos (bench)")
+    parser.add_argument("--minutes", type=int, default=390, help="Ciclos a simular (bench)")
+    parser.add_argument("--batch-size", type=int, default=INTRADAY_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.command == "bench":
+        bench(args.tickers, args.minutes, args.interval, args.batch_size)
+        return
+
+    monitor = IntradayMonitor(interval=args.interval, batch_size=args.batch_size)
+    signal.signal(signal.SIGTERM, monitor.stop)
+    signal.signal(signal.SIGINT, monitor.stop)
+    monitor.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from collections import namedtuple
+import os
+import threading
+import time
+from prompt_builder import count_tokens
+from llm_telemetry import record_stream
+
+SYSTEM_PROMPT = "Eres un analista financiero experimentado. "
+# Cualquier servidor compatible con la API de OpenAI (p. ej. el de fake_services.py)
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+###############################################
+# PROVEEDORES DE LLM EN MODO STREAMING
+###############################################
+def stream_deepseek(prompt, system_prompt=SYSTEM_PROMPT):
+    from openai import OpenAI
+
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    client = OpenAI(api_key=api_key, base_url=DEEPSEEK_BASE_URL)
+    response = client.chat.completions.create(
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        stream=True
+    )
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            yield token
+
+def stream_gemini(prompt, system_prompt=SYSTEM_PROMPT):
+    from google import genai
+
+    api_key = os.getenv("GEMINI_KEY")
+    client = genai.Client(api_key=api_key)
+    response = client.models.generate_content_stream(
+        model="gemini-2.0-flash", contents=system_prompt + prompt
+    )
+    for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+def grok_cookies_from_env():
+    cookies = {
+        "x-anonuserid": os.getenv("X_ANONUSERID"),
+        "x-challenge": os.getenv("X_CHALLENGE"),
+        "x-signature": os.getenv("X_SIGNATURE"),
+        "sso": os.getenv("SSO"),
+        "sso-rw": os.getenv("SSO_RW"),
+    }
+    if not all(cookies.values()):
+        return None
+    return cookies
+
+_grok_client = None
+_grok_client_lock = threading.Lock()
+
+def get_grok_client():
+    """
+    Devuelve un único GrokClient por proceso para reutilizar su pool de
+    conexiones entre secciones y corridas.
+    """
+    global _grok_client
+    with _grok_client_lock:
+        if _grok_client is None:
+            from grok_client import GrokClient
+
+            cookies = grok_cookies_from_env()
+            if cookies is None:
+                raise ValueError("Faltan las cookies de Grok en las variables de entorno")
+            _grok_client = GrokClient(
+                cookies,
+                timeout=(10, float(os.getenv("GROK_TIMEOUT", "120"))),
+                max_concurrency=int(os.getenv("GROK_MAX_CONCURRENCY", "3")),
+            )
+        return _grok_client
+
+def stream_grok(prompt, system_prompt=SYSTEM_PROMPT):
+    yield from get_grok_client().stream_message(system_prompt + prompt)
+
+
+LLMProvider = namedtuple("LLMProvider", ["name", "model", "label", "stream"])
+
+# Orden de preferencia: si un proveedor falla se intenta con el siguiente
+STREAMING_PROVIDERS = [
+    LLMProvider("deepseek", "deepseek-chat", "Deepseek AI", stream_deepseek),
+    LLMProvider("gemini", "gemini-2.0-flash", "Gemini AI", stream_gemini),
+    LLMProvider("grok", "grok-3", "Grok AI", stream_grok),
+]
+
+###############################################
+# UTILIDADES PARA CONSUMIR EL STREAM
+###############################################
+class StreamStats:
+    """
+    Mide un stream de tokens: tiempo hasta el primer token (TTFT),
+    duración total, fragmentos/caracteres recibidos y tokens de la respuesta.
+    """
+
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.chars = 0
+        self.completion_tokens = 0
+
+    def track(self, tokens):
+        for token in tokens:
+            if not token:
+                continue
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+                print(f"⏱️ Primer token de {self.provider} en {self.time_to_first_token:.2f}s")
+            self.chunks += 1
+            self.chars += len(token)
+            self.completion_tokens += count_tokens(token)
+            yield token
+        self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def total_seconds(self):
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    def summary(self):
+        ttft = self.time_to_first_token
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "-"
+        return (f"{self.provider} ({self.model}): TTFT {ttft_text}, "
+                f"total {self.total_seconds:.2f}s, {self.chunks} fragmentos, {self.chars} caracteres, "
+                f"~{self.completion_tokens} tokens")
+
+
+def iter_lines(tokens):
+    """
+    Agrupa un stream de tokens en líneas completas. Solo se acumula el
+    fragmento de la línea en curso, nunca el texto completo.
+    """
+    pending = []
+    for token in tokens:
+        parts = token.split("\n")
+        if len(parts) == 1:
+            pending.append(token)
+            continue
+        pending.append(parts[0])
+        yield "".join(pending)
+        yield from parts[1:-1]
+        pending = [parts[-1]] if parts[-1] else []
+    if pending:
+        yield "".join(pending)
+
+
+def complete_with_fallback(prompt, providers=None, system_prompt=SYSTEM_PROMPT, purpose="reporte"):
+    """
+    Genera la respuesta completa probando los proveedores en orden hasta que
+    uno responda. Devuelve (texto, proveedor, estadísticas del stream).
+    Cada intento queda registrado en la telemetría de LLM.
+    """
+    prompt_tokens = count_tokens(prompt)
+    fallback_reason = None
+    for provider in providers or STREAMING_PROVIDERS:
+        stats = StreamStats(provider.name, provider.model)
+        try:
+            text = "".join(stats.track(provider.stream(prompt, system_prompt)))
+        except Exception as e:
+            print(f"Error con {provider.label}: {e}")
+            record_stream(stats, prompt, prompt_tokens, "error", fallback_reason, purpose)
+            fallback_reason = f"{provider.name}: {type(e).__name__}: {e}"[:200]
+            continue
+        if not text.strip():
+            print(f"Respuesta vacía de {provider.label}")
+            record_stream(stats, prompt, prompt_tokens, "empty", fallback_reason, purpose)
+            fallback_reason = f"{provider.name}: respuesta vacía"
+            continue
+        print(f"⏱️ {stats.summary()}")
+        record_stream(stats, prompt, prompt_tokens, "ok", fallback_reason, purpose)
+        return text, provider, stats
+    raise RuntimeError("Ningún proveedor de LLM pudo generar la respuesta")
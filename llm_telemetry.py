@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+from collections import defaultdict
+from datetime import datetime
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import uuid
+
+###############################################
+# CONFIGURACIÓN DE TELEMETRÍA DE LLM
+###############################################
+# "jsonl" (archivo local) o "db" (tabla llm_calls en PostgreSQL)
+TELEMETRY_SINK = os.getenv("LLM_TELEMETRY_SINK", "jsonl")
+TELEMETRY_PATH = os.getenv("LLM_TELEMETRY_PATH", "llm_calls.jsonl")
+FLUSH_EVERY = 50
+
+RUN_ID = os.getenv("RUN_ID") or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+# Precios estimados en USD por millón de tokens (entrada, salida).
+# Se pueden sobrescribir con LLM_PRICING_JSON='{"deepseek-chat": [0.27, 1.10]}'
+LLM_PRICING = {
+    "deepseek-chat": (0.27, 1.10),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "grok-3": (0.0, 0.0),
+}
+LLM_PRICING.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICING_JSON", "{}")).items()})
+
+COLUMNS = [
+    "ts", "run_id", "purpose", "provider", "model", "prompt_hash", "prompt_tokens",
+    "completion_tokens", "ttft_s", "latency_s", "status", "fallback_reason", "cache_hit", "cost_usd",
+]
+
+_buffer = []
+_buffer_lock = threading.Lock()
+
+###############################################
+# REGISTRO DE LLAMADAS
+###############################################
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prices = LLM_PRICING.get(model)
+    if prices is None:
+        return None
+    return ((prompt_tokens or 0) * prices[0] + (completion_tokens or 0) * prices[1]) / 1_000_000
+
+def record_llm_call(provider, model, prompt, prompt_tokens=None, completion_tokens=None, ttft=None,
+                    latency=None, status="ok", fallback_reason=None, cache_hit=False, purpose="reporte"):
+    """
+    Registra una llamada al LLM (o un acierto de caché) como una fila
+    estructurada. Las filas se acumulan en memoria y se escriben en lote.
+    """
+    row = {
+        "ts": datetime.now().isoformat(timespec="seconds"),
+        "run_id": RUN_ID,
+        "purpose": purpose,
+        "provider": provider,
+        "model": model,
+        "prompt_hash": prompt_hash(prompt),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "ttft_s": round(ttft, 3) if ttft is not None else None,
+        "latency_s": round(latency, 3) if latency is not None else None,
+        "status": status,
+        "fallback_reason": fallback_reason,
+        "cache_hit": cache_hit,
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens) if status == "ok" and not cache_hit else 0.0,
+    }
+    with _buffer_lock:
+        _buffer.append(row)
+        should_flush = len(_buffer) >= FLUSH_EVERY
+    if should_flush:
+        flush_telemetry()
+    return row
+
+def record_stream(stats, prompt, prompt_tokens, status="ok", fallback_reason=None, purpose="reporte"):
+    return record_llm_call(
+        stats.provider, stats.model, prompt,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=stats.completion_tokens,
+        ttft=stats.time_to_first_token,
+        latency=stats.total_seconds,
+        status=status,
+        fallback_reason=fallback_reason,
+        purpose=purpose,
+    )
+
+###############################################
+# ESCRITURA EN LOTE (JSONL O POSTGRESQL)
+###############################################
+def _write_jsonl(rows, path=None):
+    with open(path or TELEMETRY_PATH, "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+def _write_db(rows):
+    from psycopg2.extras import execute_values
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id SERIAL PRIMARY KEY,
+            ts TIMESTAMP NOT NULL,
+            run_id VARCHAR(40),
+            purpose VARCHAR(40),
+            provider VARCHAR(20),
+            model VARCHAR(40),
+            prompt_hash VARCHAR(16),
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            ttft_s NUMERIC,
+            latency_s NUMERIC,
+            status VARCHAR(10),
+            fallback_reason TEXT,
+            cache_hit BOOLEAN,
+            cost_usd NUMERIC
+        );
+        """)
+        execute_values(
+            cur,
+            f"INSERT INTO llm_calls ({', '.join(COLUMNS)}) VALUES %s",
+            [tuple(row[column] for column in COLUMNS) for row in rows],
+        )
+        conn.commit()
+        cur.close()
+
+def flush_telemetry():
+    """
+    Escribe en el destino configurado todas las filas pendientes. Si falla la
+    DB se guardan en el JSONL local para no perderlas.
+    """
+    with _buffer_lock:
+        rows = list(_buffer)
+        _buffer.clear()
+    if not rows:
+        return 0
+    try:
+        if TELEMETRY_SINK == "db":
+            _write_db(rows)
+        else:
+            _write_jsonl(rows)
+    except Exception as e:
+        print(f"⚠️ Error al guardar la telemetría de LLM en {TELEMETRY_SINK}: {e}")
+        _write_jsonl(rows)
+    print(f"📈 {len(rows)} llamadas a LLM registradas.")
+    return len(rows)
+
+###############################################
+# RESUMEN (CLI)
+###############################################
+def load_rows(source):
+    if source == "db":
+        import pandas as pd
+        from sqlalchemy import create_engine
+        from db import DB_URL
+
+        df = pd.read_sql(f"SELECT {', '.join(COLUMNS)} FROM llm_calls", create_engine(DB_URL))
+        df["ts"] = df["ts"].astype(str)
+        return df.to_dict("records")
+    if not os.path.exists(TELEMETRY_PATH):
+        return []
+    with open(TELEMETRY_PATH, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def _fmt(value, suffix="s"):
+    return f"{float(value):.2f}{suffix}" if value is not None else "-"
+
+def summarize(rows, month=None):
+    if month:
+        rows = [row for row in rows if str(row["ts"]).startswith(month)]
+    if not rows:
+        print("No hay llamadas registradas.")
+        return
+
+    by_provider = defaultdict(list)
+    for row in rows:
+        by_provider[(row["provider"], row["model"])].append(row)
+
+    print(f"{'proveedor':<10} {'modelo':<18} {'llamadas':>8} {'errores':>7} {'caché':>6} "
+          f"{'p50':>8} {'p95':>8} {'ttft p50':>9} {'tokens':>9} {'costo':>9}")
+    for (provider, model), provider_rows in sorted(by_provider.items()):
+        live = [r for r in provider_rows if not r["cache_hit"]]
+        latencies = [float(r["latency_s"]) for r in live if r["status"] == "ok" and r["latency_s"] is not None]
+        ttfts = [float(r["ttft_s"]) for r in live if r["status"] == "ok" and r["ttft_s"] is not None]
+        errors = sum(1 for r in live if r["status"] != "ok")
+        hits = len(provider_rows) - len(live)
+        tokens = sum((r["prompt_tokens"] or 0) + (r["completion_tokens"] or 0) for r in live if r["status"] == "ok")
+        cost = sum(float(r["cost_usd"] or 0) for r in live)
+        print(f"{provider:<10} {model:<18} {len(provider_rows):>8} {errors:>7} {hits:>6} "
+              f"{_fmt(percentile(latencies, 50)):>8} {_fmt(percentile(latencies, 95)):>8} "
+              f"{_fmt(percentile(ttfts, 50)):>9} {tokens:>9} {cost:>8.4f}$")
+
+    monthly = defaultdict(float)
+    for row in rows:
+        monthly[str(row["ts"])[:7]] += float(row["cost_usd"] or 0)
+    print("\nCosto mensual estimado:")
+    for month_key, cost in sorted(monthly.items()):
+        print(f"  {month_key}: {cost:.4f} USD")
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumen de la telemetría de llamadas a LLM")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="Latencias p50/p95 y costo por proveedor")
+    summary_parser.add_argument("--source", choices=["jsonl", "db"], default=TELEMETRY_SINK)
+    summary_parser.add_argument("--month", help="Filtrar por mes (AAAA-MM)")
+    args = parser.parse_args()
+    if args.command == "summary":
+        summarize(load_rows(args.source), args.month)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Corrida completa del job diario contra proveedores locales: precios
+sintéticos, noticias de FakeNewsServer, DeepSeek simulado por FakeLLMServer
+y correo a SMTPSink. Sirve para medir el throughput del pipeline con
+universos grandes (miles de tickers) en una sola máquina y ver qué etapas
+dominan. La DB sigue siendo la de DB_* (conviene un PostgreSQL local).
+
+Con --workers N la corrida usa la cola de work_queue.py con N procesos
+worker locales (checkpoints siempre en la DB), para medir cómo escala.
+
+Uso: python loadtest.py [--tickers 5000] [--llm-latency-ms 800] [--llm-tokens-per-second 60]
+         [--news-latency-ms 30] [--no-charts] [--db-checkpoints] [--workers 4 [--chunk-size 50]]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from fake_services import FakeLLMServer, FakeNewsServer, SMTPSink
+
+# Proporción de tickers por región en el universo sintético (resto: USA)
+ARGENTINA_SHARE = 0.25
+CRYPTO_SHARE = 0.15
+
+def synthetic_universe(count):
+    tickers = []
+    for i in range(count):
+        bucket = (i * 0.618034) % 1
+        suffix = ".BA" if bucket < ARGENTINA_SHARE else "-USD" if bucket < ARGENTINA_SHARE + CRYPTO_SHARE else ""
+        # El ticker tiene que entrar en las columnas VARCHAR(10) de la DB
+        tickers.append(f"S{i:05d}{suffix}")
+    return tickers
+
+def fake_environment(news, llm, smtp, spool_dir, charts=True):
+    # Tiene que aplicarse antes de importar main: varios módulos leen la configuración al importarse
+    os.environ.update({
+        "PRICE_PROVIDER": "synthetic",
+        "NEWS_URL_TEMPLATE": news.url_template,
+        "DEEPSEEK_BASE_URL": llm.base_url,
+        "DEEPSEEK_API_KEY": "fake",
+        "GEMINI_KEY": "",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_STARTTLS": "0",
+        "EMAIL_USERNAME": "",
+        "EMAIL_PASSWORD": "fake",
+        "EMAIL_SENDER": "reportes@loadtest.local",
+        "EMAIL_RECIPIENTS": "equipo@loadtest.local",
+        "EMAIL_SPOOL_DIR": spool_dir,
+        "CHART_REPORT": "1" if charts else "0",
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=60)
+    parser.add_argument("--news-latency-ms", type=float, default=30)
+    parser.add_argument("--news-fixtures", help="Directorio con TICKER.html guardados")
+    parser.add_argument("--no-charts", action="store_true", help="Omitir el PDF de gráficos")
+    parser.add_argument("--db-checkpoints", action="store_true",
+                        help="Guardar checkpoints en la DB (por defecto en memoria)")
+    parser.add_argument("--workers", type=int, default=0, help="Workers locales de la cola (modo distribuido)")
+    parser.add_argument("--chunk-size", type=int, help="Tickers por trabajo de la cola")
+    parser.add_argument("--run-id", default=f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    args = parser.parse_args()
+
+    news = FakeNewsServer(latency_ms=args.news_latency_ms, fixtures_dir=args.news_fixtures).start()
+    llm = FakeLLMServer(latency_ms=args.llm_latency_ms, tokens_per_second=args.llm_tokens_per_second).start()
+    smtp = SMTPSink().start()
+    spool_dir = tempfile.mkdtemp(prefix="loadtest-outbox-")
+    fake_environment(news, llm, smtp, spool_dir, charts=not args.no_charts)
+
+    from main import daily_stages, distributed_job
+    from email_delivery import shutdown_delivery
+    from metrics import build_summary, export_metrics
+    from pipeline import MemoryCheckpointStore, Pipeline
+
+    tickers = synthetic_universe(args.tickers)
+    store = None if args.db_checkpoints else MemoryCheckpointStore()
+    print(f"🚚 Prueba de carga {args.run_id}: {len(tickers)} tickers sintéticos"
+          + (f", {args.workers} workers." if args.workers else "."))
+    started_at = time.perf_counter()
+    try:
+        if args.workers:
+            pipeline = distributed_job(args.run_id, args.workers, args.chunk_size, tickers)
+        else:
+            pipeline = Pipeline(daily_stages(), store=store, run_id=args.run_id)
+            pipeline.run(tickers)
+        shutdown_delivery()
+    finally:
+        wall = time.perf_counter() - started_at
+        news.stop()
+        llm.stop()
+        smtp.stop()
+
+    export_metrics(args.run_id)
+    summary = build_summary(args.run_id)
+    analyzed = len(pipeline.results.get("indicators", {}))
+    print(f"\n⏱️ {wall:.1f}s de reloj, {analyzed}/{len(tickers)} tickers analizados "
+          f"({analyzed / wall:.1f} tickers/s).")
+    print(f"{'etapa':<14} {'unidades':>9} {'errores':>8} {'total s':>9} {'tickers/s':>10}")
+    for name, entry in summary["stages"].items():
+        if not name.startswith("stage."):
+            continue
+        rate = entry["count"] / entry["total_s"] if entry["total_s"] and entry["tickers"] else None
+        print(f"{name[6:]:<14} {entry['count']:>9} {entry['errors']:>8} {entry['total_s']:>9.1f} "
+              f"{f'{rate:.1f}' if rate else '-':>10}")
+    print(f"Noticias: {news.requests} pedidos. LLM: {llm.requests} pedidos, {llm.completion_tokens} tokens. "
+          f"SMTP: {smtp.messages} mensajes, {smtp.bytes} bytes.")
+    if pipeline.errors:
+        print(f"⚠️ Etapas con errores: {', '.join(pipeline.errors)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,22 @@
 #!/usr/bin/env python3
+import argparse
 from datetime import datetime, date
+import math
 import os
-import re
-import requests
-import dateparser
-import yfinance as yf
-import pandas as pd
-import numpy as np
-import psycopg2
-from bs4 import BeautifulSoup
-from sqlalchemy import create_engine
-from fpdf import FPDF
-import matplotlib.pyplot as plt
-import openai
-from openai import OpenAI
+import threading
 from dotenv import load_dotenv
-from google import genai
-
-# Nuevas importaciones para envío de email y scheduling
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
+from db import pooled_connection
+from pipeline import Pipeline, stage
+from email_delivery import enqueue_email, shutdown_delivery
+from metrics import add_bytes, add_items, export_metrics, mark_error, span, timed
+from tickers import get_universe, group_tickers
+
+# Las dependencias pesadas (yfinance, pandas, bs4, dateparser, clientes de LLM,
+# fpdf, matplotlib) se importan dentro de las funciones y etapas que las usan,
+# así un arranque que solo reanuda etapas pendientes no paga por todas.
+# Ver startup.py y `python main.py --profile-startup`.
+
+# Importaciones para scheduling
 import schedule
 import time
 
@@ -32,28 +27,9 @@ import time
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv()
 
-# Configuración de conexión a la DB
-DB_PARAMS = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "database": os.getenv("DB_NAME", "stocks_db"),
-    "user": os.getenv("DB_USER", "postgres"),
-    "password": os.getenv("DB_PASSWORD", ""),
-    "port": os.getenv("DB_PORT", "5432")
-}
-DB_URL = os.getenv("DB_URL")
-engine = create_engine(DB_URL)
+# DB_PARAMS, DB_URL y el engine de SQLAlchemy se definen en db.py
 
-###############################################
-# CONFIGURACIÓN DE EMAIL
-###############################################
-EMAIL_CONFIG = {
-    "smtp_server": os.getenv("SMTP_SERVER"),
-    "smtp_port": int(os.getenv("SMTP_PORT")),
-    "username": os.getenv("EMAIL_USERNAME"),
-    "password": os.getenv("EMAIL_PASSWORD"),
-    "sender": os.getenv("EMAIL_SENDER"),
-    "recipients": os.getenv("EMAIL_RECIPIENTS").split(",")  # Convertir la cadena en una lista
-}
+# La configuración de email y la cola de envío están en email_delivery.py
 
 ###############################################
 # FUNCIONES PARA ANÁLISIS DE INDICADORES
@@ -70,14 +46,18 @@ def map_score_to_level(score):
     else:
         return "strong buy"
 
-def calculate_rsi(data):
+# Cada indicador se calcula en dos pasos: el valor (que se guarda en latest_indicators
+# para el screener) y el puntaje/nivel que sale de ese valor.
+def rsi_value(data):
     delta = data['Close'].diff()
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
     avg_gain = float(gain.rolling(window=14, min_periods=14).mean().iloc[-1])
     avg_loss = float(loss.rolling(window=14, min_periods=14).mean().iloc[-1])
-    rs = avg_gain / avg_loss if avg_loss != 0 else np.nan
-    rsi = 100 - (100 / (1 + rs))
+    rs = avg_gain / avg_loss if avg_loss != 0 else math.nan
+    return 100 - (100 / (1 + rs))
+
+def rsi_score(rsi):
     if rsi <= 20:
         score_rsi = 2
     elif rsi <= 30:
@@ -90,16 +70,20 @@ def calculate_rsi(data):
         score_rsi = -2
     return map_score_to_level(score_rsi), score_rsi
 
-def calculate_macd(data):
+def calculate_rsi(data):
+    return rsi_score(rsi_value(data))
+
+def macd_values(data):
+    """Último MACD, su señal y el desvío del histograma (la escala del puntaje)."""
     ema12 = data['Close'].ewm(span=12, adjust=False).mean()
     ema26 = data['Close'].ewm(span=26, adjust=False).mean()
     macd = ema12 - ema26
     macd_signal_line = macd.ewm(span=9, adjust=False).mean()
-    latest_macd = float(macd.iloc[-1])
-    latest_macd_signal = float(macd_signal_line.iloc[-1])
-    diff = latest_macd - latest_macd_signal
     hist = macd - macd_signal_line
-    std_hist = float(hist.std())
+    return float(macd.iloc[-1]), float(macd_signal_line.iloc[-1]), float(hist.std())
+
+def macd_score(latest_macd, latest_macd_signal, std_hist):
+    diff = latest_macd - latest_macd_signal
     if diff >= std_hist:
         score_macd = 2
     elif diff > 0:
@@ -112,9 +96,15 @@ def calculate_macd(data):
         score_macd = -2
     return map_score_to_level(score_macd), score_macd
 
-def calculate_moving_averages(data, price):
+def calculate_macd(data):
+    return macd_score(*macd_values(data))
+
+def moving_average_values(data):
     ma50 = float(data['Close'].rolling(window=50).mean().iloc[-1])
     ma200 = float(data['Close'].rolling(window=200).mean().iloc[-1])
+    return ma50, ma200
+
+def moving_averages_score(price, ma50, ma200):
     diff50 = (price - ma50) / ma50
     diff200 = (price - ma200) / ma200
     avg_diff = (diff50 + diff200) / 2.0
@@ -130,13 +120,20 @@ def calculate_moving_averages(data, price):
         score_ma = -2
     return map_score_to_level(score_ma), score_ma
 
+def calculate_moving_averages(data, price):
+    return moving_averages_score(price, *moving_average_values(data))
+
 ###############################################
 # FUNCIONES PARA GUARDAR EN LA BASE DE DATOS
 ###############################################
-def insert_stock_analysis(total_summary, tech_summary, ma_action, rsi_signal, macd_action, price, ticker):
-    conn = psycopg2.connect(**DB_PARAMS)
-    cur = conn.cursor()
-    create_table_query = """
+_tables_ready = False
+
+def ensure_tables(cur):
+    # Las tablas se crean una sola vez por proceso (en modo daemon, una vez en total)
+    global _tables_ready
+    if _tables_ready:
+        return
+    cur.execute("""
     CREATE TABLE IF NOT EXISTS stock_analysis (
         id SERIAL PRIMARY KEY,
         analysis_date TIMESTAMP NOT NULL,
@@ -148,82 +145,180 @@ def insert_stock_analysis(total_summary, tech_summary, ma_action, rsi_signal, ma
         price NUMERIC,
         ticker VARCHAR(10)
     );
-    """
-    cur.execute(create_table_query)
-    conn.commit()
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS news (
+        id SERIAL PRIMARY KEY,
+        ticker VARCHAR(10),
+        title TEXT,
+        link TEXT UNIQUE,
+        published_at TIMESTAMP
+    );
+    """)
+    # Una fila por ticker con los valores del último análisis (ver screener.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS latest_indicators (
+        ticker VARCHAR(20) PRIMARY KEY,
+        analysis_date TIMESTAMP NOT NULL,
+        price DOUBLE PRECISION,
+        rsi DOUBLE PRECISION,
+        macd DOUBLE PRECISION,
+        macd_signal DOUBLE PRECISION,
+        ma50 DOUBLE PRECISION,
+        ma200 DOUBLE PRECISION,
+        score_rsi SMALLINT,
+        score_macd SMALLINT,
+        score_ma SMALLINT,
+        tech_score REAL,
+        total_score REAL,
+        total_summary VARCHAR(20),
+        technical_indicators_summary VARCHAR(20),
+        moving_averages_summary VARCHAR(20),
+        rsi_action VARCHAR(20),
+        macd_action VARCHAR(20),
+        updated_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS latest_indicators_updated_at ON latest_indicators (updated_at);")
+    _tables_ready = True
+
+LATEST_INDICATOR_FIELDS = ["analysis_date", "price", "rsi", "macd", "macd_signal", "ma50", "ma200",
+                           "score_rsi", "score_macd", "score_ma", "tech_score", "total_score",
+                           "total_summary", "technical_indicators_summary", "moving_averages_summary",
+                           "rsi_action", "macd_action"]
+
+def save_latest_indicators(ticker, values):
+    """Reemplaza la fila del ticker en latest_indicators con los valores de `values`."""
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        ensure_tables(cur)
+        cur.execute(f"""
+            INSERT INTO latest_indicators (ticker, {', '.join(LATEST_INDICATOR_FIELDS)}, updated_at)
+            VALUES (%s, {', '.join(['%s'] * len(LATEST_INDICATOR_FIELDS))}, now())
+            ON CONFLICT (ticker) DO UPDATE SET
+                {', '.join(f'{field} = EXCLUDED.{field}' for field in LATEST_INDICATOR_FIELDS)},
+                updated_at = EXCLUDED.updated_at
+        """, [ticker] + [values[field] for field in LATEST_INDICATOR_FIELDS])
+        conn.commit()
+        cur.close()
 
-    analysis_date = datetime.now()
+def insert_stock_analysis(total_summary, tech_summary, ma_action, rsi_signal, macd_action, price, ticker):
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        ensure_tables(cur)
+        conn.commit()
+
+        analysis_date = datetime.now()
+
+        check_query = """
+        SELECT id FROM stock_analysis 
+        WHERE ticker = %s AND analysis_date::date = %s
+        """
+        cur.execute(check_query, (ticker, analysis_date.date()))
+        if cur.fetchone():
+            print(f"Ya existe un análisis para {ticker} en la fecha {analysis_date.date()}.")
+            cur.close()
+            return
 
-    check_query = """
-    SELECT id FROM stock_analysis 
-    WHERE ticker = %s AND analysis_date::date = %s
-    """
-    cur.execute(check_query, (ticker, analysis_date.date()))
-    if cur.fetchone():
-        print(f"Ya existe un análisis para {ticker} en la fecha {analysis_date.date()}.")
+        insert_query = """
+        INSERT INTO stock_analysis (
+            analysis_date,
+            total_summary,
+            technical_indicators_summary,
+            moving_averages_summary,
+            rsi_action,
+            macd_action,
+            price,
+            ticker
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
+        """
+        cur.execute(insert_query, (
+            analysis_date,
+            total_summary,
+            tech_summary,
+            ma_action,
+            rsi_signal,
+            macd_action,
+            round(price, 2),
+            ticker
+        ))
+        conn.commit()
+        print(f"Datos insertados en PostgreSQL para {ticker}")
         cur.close()
-        conn.close()
-        return
-
-    insert_query = """
-    INSERT INTO stock_analysis (
-        analysis_date,
-        total_summary,
-        technical_indicators_summary,
-        moving_averages_summary,
-        rsi_action,
-        macd_action,
-        price,
-        ticker
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-    """
-    cur.execute(insert_query, (
-        analysis_date,
-        total_summary,
-        tech_summary,
-        ma_action,
-        rsi_signal,
-        macd_action,
-        round(price, 2),
-        ticker
-    ))
-    conn.commit()
-    print(f"Datos insertados en PostgreSQL para {ticker}")
-    cur.close()
-    conn.close()
 
 ###############################################
 # FUNCIONES PARA PROCESAR TICKERS Y ANÁLISIS
 ###############################################
-def process_ticker(ticker):
+def analyze_ticker(ticker, data):
+    """
+    Calcula los indicadores de un ticker, guarda el análisis en la DB y
+    devuelve la fila. A diferencia de process_ticker, los errores se propagan
+    (el pipeline los registra en el checkpoint del ticker).
+    """
+    if data is None or data.empty:
+        raise ValueError(f"No se obtuvieron datos para {ticker}")
+    price = float(data['Close'].iloc[-1])
+    rsi = rsi_value(data)
+    macd, macd_signal, std_hist = macd_values(data)
+    ma50, ma200 = moving_average_values(data)
+    rsi_signal, score_rsi = rsi_score(rsi)
+    macd_action, score_macd = macd_score(macd, macd_signal, std_hist)
+    ma_action, score_ma = moving_averages_score(price, ma50, ma200)
+    tech_score = (score_rsi + score_macd) / 2.0
+    tech_summary = map_score_to_level(tech_score)
+    total_score = (tech_score + score_ma) / 2.0
+    total_summary = map_score_to_level(total_score)
+    print(f"Ticker: {ticker}")
+    print("  Total Summary:", total_summary)
+    print("  Technical Indicators Summary:", tech_summary)
+    print("  Moving Averages Summary:", ma_action)
+    print("  RSI Action:", rsi_signal)
+    print("  MACD Action:", macd_action)
+    print("  Precio:", round(price, 2))
+    insert_stock_analysis(total_summary, tech_summary, ma_action, rsi_signal, macd_action, price, ticker)
+    analysis_date = datetime.now()
+    save_latest_indicators(ticker, {
+        "analysis_date": analysis_date, "price": price, "rsi": rsi, "macd": macd, "macd_signal": macd_signal,
+        "ma50": ma50, "ma200": ma200, "score_rsi": score_rsi, "score_macd": score_macd, "score_ma": score_ma,
+        "tech_score": tech_score, "total_score": total_score, "total_summary": total_summary,
+        "technical_indicators_summary": tech_summary, "moving_averages_summary": ma_action,
+        "rsi_action": rsi_signal, "macd_action": macd_action,
+    })
+    return {
+        "ticker": ticker,
+        "analysis_date": analysis_date,
+        "total_summary": total_summary,
+        "technical_indicators_summary": tech_summary,
+        "moving_averages_summary": ma_action,
+        "rsi_action": rsi_signal,
+        "macd_action": macd_action,
+        "price": round(price, 2),
+    }
+
+@timed("process_ticker", per_ticker=True)
+def process_ticker(ticker, data=None):
+    """
+    Analiza un ticker y guarda el resultado en la DB. Devuelve la fila de
+    análisis y los precios usados para reutilizarlos en los reportes, o None
+    si no hubo datos. Si no se pasan precios se descarga un año.
+    """
     try:
-        data = yf.download(ticker, period="1y", interval="1d")
-        if data.empty:
-            print(f"No se obtuvieron datos para {ticker}")
-            return
-        price = float(data['Close'].iloc[-1])
-        rsi_signal, score_rsi = calculate_rsi(data)
-        macd_action, score_macd = calculate_macd(data)
-        ma_action, score_ma = calculate_moving_averages(data, price)
-        tech_score = (score_rsi + score_macd) / 2.0
-        tech_summary = map_score_to_level(tech_score)
-        total_score = (tech_score + score_ma) / 2.0
-        total_summary = map_score_to_level(total_score)
-        print(f"Ticker: {ticker}")
-        print("  Total Summary:", total_summary)
-        print("  Technical Indicators Summary:", tech_summary)
-        print("  Moving Averages Summary:", ma_action)
-        print("  RSI Action:", rsi_signal)
-        print("  MACD Action:", macd_action)
-        print("  Precio:", round(price, 2))
-        insert_stock_analysis(total_summary, tech_summary, ma_action, rsi_signal, macd_action, price, ticker)
+        if data is None:
+            from report_build import download_price_frames
+
+            data = download_price_frames([ticker]).get(ticker)
+        return analyze_ticker(ticker, data), data
     except Exception as e:
         print(f"Error al procesar {ticker}: {e}")
+        mark_error()
+        return None
 
 ###############################################
 # FUNCIONES PARA EXTRACCIÓN Y GUARDADO DE NOTICIAS
 ###############################################
 def parse_published_date(published_text):
+    import dateparser
+
     parts = published_text.split("•")
     if len(parts) >= 2:
         relative_time = parts[-1].strip()
@@ -232,14 +327,39 @@ def parse_published_date(published_text):
     parsed_date = dateparser.parse(relative_time)
     return parsed_date
 
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    # Sesión HTTP compartida: reutiliza conexiones TLS con Yahoo entre tickers
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+
+            _http_session = requests.Session()
+            _http_session.headers["User-Agent"] = "Mozilla/5.0"
+        return _http_session
+
+@timed("get_news_yahoo", per_ticker=True)
 def get_news_yahoo(ticker):
-    url = f"https://finance.yahoo.com/quote/{ticker}/news"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(url, headers=headers)
+    from providers import news_url
+
+    response = get_http_session().get(news_url(ticker), timeout=30)
+    add_bytes(len(response.content))
     if response.status_code != 200:
         print(f"❌ ERROR {response.status_code} al obtener noticias de {ticker}")
+        mark_error()
         return []
-    soup = BeautifulSoup(response.text, "html.parser")
+    news_data = parse_news_html(ticker, response.text)
+    add_items(len(news_data))
+    return news_data
+
+def parse_news_html(ticker, html):
+    # Separado de la descarga para poder medirlo con páginas guardadas (benchmarks/)
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
     articles = soup.find_all("a", {"class": "subtle-link"})
     news_data = []
     seen_links = set()
@@ -272,221 +392,33 @@ def save_news_to_db(news_list):
     if not news_list:
         print("⚠️ No hay noticias para guardar.")
         return
-    conn = psycopg2.connect(**DB_PARAMS)
-    cursor = conn.cursor()
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS news (
-        id SERIAL PRIMARY KEY,
-        ticker VARCHAR(10),
-        title TEXT,
-        link TEXT UNIQUE,
-        published_at TIMESTAMP
-    );
-    """
-    cursor.execute(create_table_query)
-    conn.commit()
-    insert_query = """
-        INSERT INTO news (ticker, title, link, published_at) 
-        VALUES (%s, %s, %s, %s::timestamp)
-        ON CONFLICT (link) DO NOTHING;
-    """
-    for news in news_list:
-        print(f"Insertando noticia para {news[0]} con published_at = {news[3]}")
-        cursor.execute(insert_query, news)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with span("save_news_to_db", news_list[0][0]) as current, pooled_connection() as conn:
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+        conn.commit()
+        insert_query = """
+            INSERT INTO news (ticker, title, link, published_at) 
+            VALUES (%s, %s, %s, %s::timestamp)
+            ON CONFLICT (link) DO NOTHING;
+        """
+        for news in news_list:
+            print(f"Insertando noticia para {news[0]} con published_at = {news[3]}")
+            cursor.execute(insert_query, news)
+        conn.commit()
+        cursor.close()
+        current.add_items(len(news_list))
     print(f"✅ {len(news_list)} noticias procesadas en la DB.")
 
-###############################################
-# FUNCIONES PARA GENERAR REPORTE DIARIO
-###############################################
-def fetch_stock_analysis_for_today():
-    query = """
-    SELECT ticker, analysis_date, total_summary, technical_indicators_summary, 
-           moving_averages_summary, rsi_action, macd_action, price
-    FROM stock_analysis
-    WHERE analysis_date::date = %s
-    ORDER BY ticker;
+def news_sentiment(news_list):
     """
-    today = date.today()
-    df = pd.read_sql(query, engine, params=(today,))
-    return df
-
-def fetch_latest_news(ticker, limit=5):
-    query = """
-    SELECT title, link, published_at
-    FROM news
-    WHERE ticker = %s
-    ORDER BY published_at DESC
-    LIMIT %s;
+    Polaridad de cada título (TextBlob, -1 a 1) indexada por link. Si
+    TextBlob no está instalado se devuelve un dict vacío.
     """
-    with engine.connect() as conn:
-        news_df = pd.read_sql(query, conn, params=(ticker, limit))
-    return news_df
-
-def generate_daily_report_text(df):
-    report = "Reporte Diario de Mercados\n"
-    report += f"Fecha: {datetime.now().strftime('%Y-%m-%d')}\n\n"
-    report += "Resumen de Análisis:\n"
-    for _, row in df.iterrows():
-        ticker = row['ticker']
-        report += f"- {ticker}:\n"
-        report += f"   Recomendación Global: {row['total_summary']} " \
-                  f"(Técnico: {row['technical_indicators_summary']}, " \
-                  f"Medias: {row['moving_averages_summary']}).\n"
-        report += f"   RSI: {row['rsi_action']}, MACD: {row['macd_action']}. Precio: {row['price']}\n"
-        news_df = fetch_latest_news(ticker, limit=5)
-        if not news_df.empty:
-            report += "   Últimas Noticias:\n"
-            for _, news in news_df.iterrows():
-                published = pd.to_datetime(news['published_at']).strftime('%Y-%m-%d')
-                report += f"      * {news['title']} - {news['link']} (Publicado: {published})\n"
-        else:
-            report += "   No se encontraron noticias recientes.\n"
-        report += "\n"
-    return report
-
-def generate_final_report(df):
-    base_report = generate_daily_report_text(df)
-    prompt = (
-        "Con base en los siguientes datos diarios, "
-        "genera un reporte que incluya:\n"
-        " - El estado general del mercado.\n"
-        " - Recomendaciones claras de compra y venta para el día.\n"
-        " - Análisis de tendencias y factores técnicos (incluyendo indicadores, medias móviles, RSI, MACD, etc.).\n"
-        " - Para estos items, hacer una seccion del mercado de USA, otra seccion para el mercado de Argentina y otra para cripto. Si no hay buenas señales de compra o de venta para ese dia, aclararlo.\n"
-        "Datos:\n" + base_report +
-        "\nEl reporte debe ser conciso, claro y útil para tomar decisiones de inversión diaria."
-    )
-
-    # Guardar el contenido de prompt en un archivo de texto
-    with open("prompt.txt", "w") as file:
-        file.write(prompt)
-
-    api_key = os.getenv("DEEPSEEK_API_KEY")
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "Eres un analista financiero experimentado. "},
-                {"role": "user", "content": prompt},
-            ],
-            stream=False
-        )
-
-        if not response:
-            raise ValueError("Respuesta de OpenAI vacía o None")
-        
-        print(f"response: {response}")
-        final_report = response.choices[0].message.content
-        return final_report + "\n\n(Generado con Deepseek AI)"
-    except openai.APIConnectionError as e:
-        print("The server could not be reached")
-        print(e.__cause__)  # an underlying Exception, likely raised within httpx.
-    except openai.RateLimitError as e:
-        print("A 429 status code was received; we should back off a bit.")
-    except openai.APIStatusError as e:
-        print("Another non-200-range status code was received")
-        print(e.status_code)
-        print(e.response)
-    except ValueError as e:
-        print(f"Error de validación: {e}")
-    except Exception as e:
-        print(f"Error inesperado: {e}")
-    
-    return generate_with_gemini(prompt)
-    
-def generate_with_gemini(prompt):
-    api_key = os.getenv("GEMINI_KEY")
-    client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model="gemini-2.0-flash", contents="Eres un analista financiero experimentado. " + prompt
-    )
-    return response.text + "\n\n(Generado con Gemini AI)"
-
-
-###############################################
-# FUNCIONES PARA GENERAR PDF CON REPORTE
-###############################################
-def write_formatted_line(pdf, line, font_size=12, line_height=8):
-    segments = re.split(r'(\*\*.*?\*\*)', line)
-    for seg in segments:
-        if seg.startswith('**') and seg.endswith('**'):
-            pdf.set_font("DejaVu", "B", font_size)
-            pdf.write(line_height, seg[2:-2])
-        else:
-            pdf.set_font("DejaVu", "", font_size)
-            pdf.write(line_height, seg)
-    pdf.ln(line_height)
-
-def create_pdf_report(report_text, output_filename="reporte_diario.pdf"):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_font('DejaVu', '', 'DejaVuSans.ttf', uni=True)
-    pdf.add_font('DejaVu', 'B', 'DejaVuSans-Bold.ttf', uni=True)
-    pdf.add_page()
-    pdf.set_font("DejaVu", "B", 16)
-    pdf.cell(0, 10, "Reporte Diario de Mercados", ln=True, align="C")
-    pdf.set_font("DejaVu", "", 12)
-    pdf.cell(0, 10, f"Fecha: {datetime.now().strftime('%Y-%m-%d')}", ln=True, align="C")
-    pdf.ln(10)
-    for raw_line in report_text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            pdf.ln(4)
-            continue
-        if line.startswith("### "):
-            header = line[4:].strip()
-            pdf.set_font("DejaVu", "B", 16)
-            pdf.cell(0, 10, header, ln=True)
-        elif line.startswith("#### "):
-            header = line[5:].strip()
-            pdf.set_font("DejaVu", "B", 14)
-            pdf.cell(0, 10, header, ln=True)
-        elif line.startswith("- ") or line.startswith("• "):
-            bullet = "• "
-            content = line[2:].strip()
-            pdf.set_font("DejaVu", "", 12)
-            pdf.cell(10, 8, bullet, ln=0)
-            write_formatted_line(pdf, content, font_size=12, line_height=8)
-        else:
-            write_formatted_line(pdf, line, font_size=12, line_height=8)
-        pdf.ln(2)
-    pdf.ln(5)
-    pdf.output(output_filename)
-    print(f"Reporte guardado en '{output_filename}'.")
-    return output_filename
-
-###############################################
-# NUEVA FUNCIÓN: ENVÍO DE CORREO CON EL REPORTE
-###############################################
-def send_email(report_file, subject="Reporte Diario de Mercados"):
-    msg = MIMEMultipart()
-    msg['Subject'] = subject
-    msg['From'] = EMAIL_CONFIG["sender"]
-    msg['To'] = ", ".join(EMAIL_CONFIG["recipients"])
-    
-    # Cuerpo del mensaje
-    body = MIMEText("Adjunto se encuentra el reporte diario de mercados.", "plain")
-    msg.attach(body)
-    
-    # Adjuntar el PDF
-    with open(report_file, "rb") as f:
-        part = MIMEApplication(f.read(), Name=os.path.basename(report_file))
-    part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_file)}"'
-    msg.attach(part)
-    
-    try:
-        with smtplib.SMTP(EMAIL_CONFIG["smtp_server"], EMAIL_CONFIG["smtp_port"]) as server:
-            server.starttls()
-            server.login(EMAIL_CONFIG["username"], EMAIL_CONFIG["password"])
-            server.sendmail(msg['From'], EMAIL_CONFIG["recipients"], msg.as_string())
-        print("Correo enviado exitosamente.")
-    except Exception as e:
-        print(f"Error al enviar el correo: {e}")
+        from textblob import TextBlob
+    except ImportError:
+        return {}
+    return {link: round(TextBlob(title).sentiment.polarity, 3) for _, title, link, _ in news_list}
 
 ###############################################
 # CONFIGURACIÓN DE TWITTER
@@ -515,42 +447,280 @@ def post_tweet(message):
 ###############################################
 # FUNCIÓN PRINCIPAL QUE REALIZA TODO EL PROCESO
 ###############################################
-def main_job():
-    # Listas de tickers
-    usa_tickers = ["AAPL", "MSFT", "AMZN", "GOOGL", "META", "TSLA", "BRK-B", "JNJ", "V", "WMT", "BABA", "NVDA", "GOLD", "MELI", "NFLX", "PYPL", "GM", "AAL", "ABNB"]
-    argentina_tickers = ["GGAL.BA", "YPFD.BA", "PAMP.BA", "TX", "CEPU.BA", "SUPV.BA", "ALUA.BA", "BMA.BA", "EDN.BA", "COME.BA", "LOMA.BA", "MIRG.BA", "TRAN.BA"]
-    crypto_tickers = ["BTC-USD", "ETH-USD", "BNB-USD", "XRP-USD", "ADA-USD", "SOL-USD", "DOT-USD", "DOGE-USD", "LTC-USD", "MATIC-USD"]
-    all_tickers = usa_tickers + argentina_tickers + crypto_tickers
-
-    print("Procesando análisis de activos y extracción de noticias...")
-    for ticker in all_tickers:
-        process_ticker(ticker)
+def refresh_tickers(tickers, price_frames=None):
+    """
+    Analiza los tickers y extrae sus noticias. Si se pasan `price_frames`
+    (p. ej. desde la caché del modo daemon) no se descargan precios.
+    Devuelve (análisis, precios, listas de noticias).
+    """
+    analyses = []
+    frames = {}
+    news_lists = []
+    for ticker in tickers:
+        data = price_frames.get(ticker) if price_frames is not None else None
+        if price_frames is not None and data is None:
+            print(f"No se obtuvieron datos para {ticker}")
+        else:
+            result = process_ticker(ticker, data)
+            if result is not None:
+                analysis, data = result
+                analyses.append(analysis)
+                frames[ticker] = data
         print(f"🔄 Obteniendo noticias para {ticker}...")
         news = get_news_yahoo(ticker)
         if news:
             save_news_to_db(news)
+            news_lists.append(news)
         else:
             print(f"⚠️ No se encontraron noticias para {ticker}.")
+    return analyses, frames, news_lists
 
-    print("\nGenerando reporte diario...")
-    df = fetch_stock_analysis_for_today()
-    if df.empty:
-        print("No hay datos de análisis para la fecha de hoy.")
-        return
+###############################################
+# ETAPAS DEL JOB DIARIO (ver pipeline.py)
+###############################################
+def _stage_prices(tickers, _inputs):
+    from report_build import download_price_frames
+
+    return download_price_frames(tickers)
+
+def _stage_indicators(ticker, inputs):
+    return analyze_ticker(ticker, inputs["prices"])
+
+def _news_working_set(tickers):
+    return get_universe().select(tickers, news_source="yahoo")
+
+def _stage_news(ticker, _inputs):
+    print(f"🔄 Obteniendo noticias para {ticker}...")
+    news = get_news_yahoo(ticker)
+    if news:
+        save_news_to_db(news)
+    else:
+        print(f"⚠️ No se encontraron noticias para {ticker}.")
+    return news
+
+def _stage_sentiment(ticker, inputs):
+    return news_sentiment(inputs["news"])
+
+def _stage_report_data(inputs):
+    import pandas as pd
+    from report_build import news_from_run
+
+    analyses = list(inputs["indicators"].values())
+    if not analyses:
+        raise ValueError("No hay datos de análisis para la fecha de hoy.")
+    df = pd.DataFrame(analyses).sort_values("ticker").reset_index(drop=True)
+    news_by_ticker = news_from_run([news for news in inputs["news"].values() if news])
+    sentiment = {}
+    for scores in inputs["sentiment"].values():
+        sentiment.update(scores)
+    for items in news_by_ticker.values():
+        for item in items:
+            item["sentiment"] = sentiment.get(item["link"])
+    return {"df": df, "news_by_ticker": news_by_ticker}
+
+def _stage_llm(inputs):
+    from report_build import generate_report_text
+
+    data = inputs["report_data"]
+    return generate_report_text(data["df"], data["news_by_ticker"], group_tickers(data["df"]["ticker"]))
+
+def _stage_llm_streaming(inputs):
+    # REPORT_MODE=streaming: el PDF de texto se arma mientras llegan los tokens, así que llm también renderiza
+    from report_build import stream_report_pdf
+    from llm_telemetry import flush_telemetry
+
+    data = inputs["report_data"]
+    try:
+        path, text = stream_report_pdf(data["df"], "reporte_diario.pdf", data["news_by_ticker"])
+    finally:
+        flush_telemetry()
+    return {"pdf": path, "text": text}
+
+def _stage_charts(inputs):
+    # Si fallan los gráficos el reporte de texto sale igual
+    if os.getenv("CHART_REPORT", "1") != "1":
+        return None
+    try:
+        from report_build import generate_charts_pdf
+
+        return generate_charts_pdf(inputs["prices"])
+    except Exception as e:
+        print(f"Error al generar el PDF de gráficos: {e}")
+        return None
 
-    final_report = generate_final_report(df)
-    pdf_filename = create_pdf_report(final_report)
-    send_email(pdf_filename)
+def _stage_render(inputs):
+    from report_pdf import create_pdf_report
+
+    if isinstance(inputs["llm"], dict):
+        text_pdf = inputs["llm"]["pdf"]
+    else:
+        text_pdf = create_pdf_report(inputs["llm"], "reporte_diario.pdf")
+    return [path for path in (text_pdf, inputs["charts"]) if path]
+
+def _stage_deliver(inputs):
+    # El envío lo hace el worker de email_delivery en segundo plano
+    return enqueue_email(inputs["render"])
+
+def _files_exist(paths):
+    paths = [paths] if isinstance(paths, str) else (paths or [])
+    return all(os.path.exists(path) for path in paths)
+
+DAILY_STAGES = [
+    stage("prices", _stage_prices, per_ticker=True, batch=True),
+    stage("news", _stage_news, per_ticker=True, select=_news_working_set),
+    stage("indicators", _stage_indicators, deps=["prices"], per_ticker=True),
+    stage("sentiment", _stage_sentiment, deps=["news"], per_ticker=True),
+    stage("report_data", _stage_report_data, deps=["indicators", "news", "sentiment"]),
+    stage("llm", _stage_llm, deps=["report_data"]),
+    stage("charts", _stage_charts, deps=["prices"], check=_files_exist),
+    stage("render", _stage_render, deps=["llm", "charts"], check=_files_exist),
+    stage("deliver", _stage_deliver, deps=["render"], once=True),
+]
+
+# Con REPORT_MODE=streaming la etapa llm deja el PDF de texto armado; si no existe se vuelve a generar
+STREAMING_STAGES = [stage("llm", _stage_llm_streaming, deps=["report_data"],
+                          check=lambda result: _files_exist(result["pdf"]))
+                    if s.name == "llm" else s for s in DAILY_STAGES]
+
+# Lo que hace cada worker de la cola con su bloque de tickers: todas las etapas por ticker
+SHARD_STAGES = [s for s in DAILY_STAGES if s.per_ticker]
+
+def daily_stages():
+    return STREAMING_STAGES if os.getenv("REPORT_MODE", "regional") == "streaming" else DAILY_STAGES
+
+def notify_results(run_id):
+    # Avisa a la API (api.py) que recargue su foto; si falla, la API igual se entera por su chequeo periódico
+    from db import RESULTS_CHANNEL, notify
+
+    try:
+        notify(RESULTS_CHANNEL, run_id)
+    except Exception as e:
+        print(f"⚠️ No se pudo avisar de los resultados nuevos: {e}")
+
+def main_job(run_id=None, profile_stages=None, profile_modes=None, tickers=None, resend=False):
+    """
+    Corre el job diario como DAG de etapas con checkpoints en la DB. Si una
+    corrida anterior con el mismo run_id (por defecto, la fecha) quedó a
+    medias, se reanuda desde la primera unidad incompleta. Las etapas de
+    profile_stages (o PROFILE_STAGES) se perfilan, ver profiling.py. Si el
+    reporte ya se envió no se vuelve a enviar salvo con resend.
+    """
+    from profiling import profiler_from_env
+
+    run_id = run_id or date.today().isoformat()
+    all_tickers = tickers or get_universe().tickers
+    print("Procesando análisis de activos y extracción de noticias...")
+    profiler = profiler_from_env(run_id, profile_stages, profile_modes)
+    pipeline = Pipeline(daily_stages(), run_id=run_id, profiler=profiler, resend=resend)
+    pipeline.run(all_tickers)
+    notify_results(run_id)
 
     # Publicar tweet tras completar el proceso
     tweet_message = f"Reporte Diario de Mercados generado para {datetime.now().strftime('%Y-%m-%d')}. Revisa tu correo para más detalles."
     # post_tweet(tweet_message)
+    return pipeline
+
+def process_shard(run_id, tickers, store=None):
+    """
+    Etapas por ticker de un bloque de la cola (ver work_queue.py). Los
+    resultados quedan en los checkpoints de la corrida; los tickers que
+    fallen los reintenta el coordinador al armar el reporte. Si una etapa
+    no produjo nada para ningún ticker (p. ej. yfinance caído) el bloque
+    falla entero para que la cola lo reintente.
+    """
+    from pipeline import DBCheckpointStore
+
+    pipeline = Pipeline(SHARD_STAGES, store=store or DBCheckpointStore(), run_id=run_id)
+    pipeline.run(tickers)
+    empty = [s.name for s in SHARD_STAGES
+             if not pipeline.results.get(s.name) and (s.select is None or s.select(tickers))]
+    if empty:
+        raise RuntimeError(f"sin resultados en {', '.join(empty)}")
+    return pipeline
+
+def distributed_job(run_id=None, local_workers=0, chunk_size=None, tickers=None, resend=False):
+    """
+    Modo distribuido: encola la corrida en bloques, lanza `local_workers`
+    procesos `main.py --worker` en esta máquina (los workers remotos, p. ej.
+    otros servicios de Railway, toman de la misma tabla) y espera a que se
+    procesen todos los bloques. Después corre el DAG completo, que reanuda
+    las etapas por ticker desde los checkpoints y arma el reporte.
+    """
+    import subprocess
+    import sys
+    from work_queue import QUEUE_CHUNK_SIZE, WorkQueue, wait_for_run
+
+    run_id = run_id or date.today().isoformat()
+    all_tickers = tickers or get_universe().tickers
+    queue = WorkQueue()
+    # Los bloques no mezclan calendarios: cada worker descarga un mercado por vez
+    chunks = queue.enqueue_chunks(run_id, get_universe().batches(all_tickers, chunk_size or QUEUE_CHUNK_SIZE))
+    print(f"📬 Corrida {run_id}: {len(all_tickers)} tickers encolados en {chunks} bloques.")
+    workers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", "--drain", "--run-id", run_id])
+        for _ in range(local_workers)
+    ]
+    try:
+        wait_for_run(run_id, queue, should_stop=(lambda: all(w.poll() is not None for w in workers))
+                     if workers else None)
+    finally:
+        for worker in workers:
+            worker.wait()
+    return main_job(run_id, tickers=all_tickers, resend=resend)
 
 ###############################################
 # PROGRAMACIÓN DE LA TAREA: EJECUCIÓN A LAS 11:00 AM DE LUNES A VIERNES
 ###############################################
 if __name__ == "__main__":
-    main_job()
+    parser = argparse.ArgumentParser(description="Job diario de análisis y reporte")
+    parser.add_argument("--run-id", help="Corrida a reanudar (por defecto, la fecha de hoy)")
+    parser.add_argument("--restart", action="store_true", help="Ignorar los checkpoints y empezar una corrida nueva")
+    parser.add_argument("--resend", action="store_true",
+                        help="Volver a enviar el reporte si la corrida ya lo envió y sus datos cambiaron")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Mostrar el tiempo de importación por paquete y compararlo con STARTUP_TARGET_MS")
+    parser.add_argument("--check-config", action="store_true", help="Validar la configuración sin conectarse y salir")
+    parser.add_argument("--profile", metavar="ETAPAS",
+                        help="Perfilar estas etapas (p. ej. prices,news,llm,render o all); ver profiling.py")
+    parser.add_argument("--profile-mode", default=None, help="cpu, memory o cpu,memory (por defecto PROFILE_MODE)")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Repartir los tickers en la cola de la DB y esperar a los workers; ver work_queue.py")
+    parser.add_argument("--local-workers", type=int, default=0,
+                        help="Workers a lanzar en esta máquina con --distributed")
+    parser.add_argument("--chunk-size", type=int, help="Tickers por trabajo de la cola (por defecto QUEUE_CHUNK_SIZE)")
+    parser.add_argument("--worker", action="store_true", help="Procesar trabajos de la cola")
+    parser.add_argument("--drain", action="store_true", help="Con --worker, salir cuando la cola quede vacía")
+    args = parser.parse_args()
+    if args.profile_startup:
+        from startup import profile_startup
+
+        raise SystemExit(0 if profile_startup() else 1)
+    # La configuración se valida antes de descargar nada, sin abrir conexiones; un worker no necesita mail ni LLM
+    from startup import check_config
+
+    if not check_config(mode="worker" if args.worker else "daily"):
+        raise SystemExit(2)
+    if args.check_config:
+        raise SystemExit(0)
+    if args.worker:
+        from pipeline import DBCheckpointStore
+        from work_queue import run_worker, worker_name
+
+        store = DBCheckpointStore()
+        run_worker(lambda run_id, tickers: process_shard(run_id, tickers, store), args.run_id, args.drain)
+        export_metrics(f"{args.run_id or 'worker'}-{worker_name()}")
+        raise SystemExit(0)
+    run_id = args.run_id
+    if args.restart:
+        run_id = f"{date.today().isoformat()}-{datetime.now().strftime('%H%M%S')}"
+    if args.distributed:
+        pipeline = distributed_job(run_id, args.local_workers, args.chunk_size, resend=args.resend)
+    else:
+        pipeline = main_job(run_id, args.profile, args.profile_mode, resend=args.resend)
+    # Antes de salir se espera a que se envíen los correos encolados
+    shutdown_delivery()
+    # Las métricas se exportan después del envío para incluir send_email
+    export_metrics(pipeline.run_id)
     # Programar la tarea para cada día hábil a las 11:00 AM
     # schedule.every().monday.at("11:00").do(main_job)
     # schedule.every().tuesday.at("11:00").do(main_job)
@@ -0,0 +1,348 @@
+from collections import namedtuple
+import re
+
+###############################################
+# TOKENIZACIÓN DEL MARKDOWN DEL LLM
+###############################################
+# Un solo patrón por línea, compilado una vez, que clasifica el bloque
+BLOCK_RE = re.compile(r"""
+    ^(?P<indent>[ \t]*)(?:
+        (?P<heading>\#{1,6})\s+(?P<heading_text>.*?)\s*\#*
+      | (?P<rule>(?:[-*_][ \t]*){3,})
+      | (?P<bullet>[-*+•])\s+(?P<bullet_text>.*)
+      | (?P<number>\d{1,3})[.)]\s+(?P<number_text>.*)
+      | (?P<table>\|.*\|)
+      | (?P<text>.*?)
+    )\s*$
+""", re.VERBOSE)
+TABLE_SEPARATOR_RE = re.compile(r"^\|?(?:\s*:?-{2,}:?\s*\|)+\s*(?::?-{2,}:?\s*)?\|?$")
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+WORD_RE = re.compile(r"\s+|\S+")
+
+# kind: blank, heading, rule, bullet, number, table, text
+# level: nivel del encabezado o profundidad de la lista
+# content: runs [(negrita, texto)] o, en tablas, filas de celdas
+Block = namedtuple("Block", ["kind", "level", "marker", "content"])
+
+BULLET_MARKERS = ("•", "◦", "▪")
+HEADING_SIZES = {1: 18, 2: 17, 3: 16, 4: 14, 5: 13, 6: 12}
+
+def parse_inline(text):
+    """
+    Separa el texto en runs (negrita, texto). Los runs contiguos con el mismo
+    estilo se unen para no cambiar de fuente más de lo necesario.
+    """
+    runs = []
+    position = 0
+    for match in BOLD_RE.finditer(text):
+        if match.start() > position:
+            runs.append((False, text[position:match.start()]))
+        runs.append((True, match.group(1)))
+        position = match.end()
+    if position < len(text):
+        runs.append((False, text[position:]))
+
+    merged = []
+    for bold, chunk in runs:
+        if merged and merged[-1][0] == bold:
+            merged[-1] = (bold, merged[-1][1] + chunk)
+        else:
+            merged.append((bold, chunk))
+    return merged
+
+def plain_text(text):
+    return BOLD_RE.sub(r"\1", text)
+
+def split_table_row(line):
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+def classify_line(line):
+    match = BLOCK_RE.match(line)
+    groups = match.groupdict()
+    if groups["heading"]:
+        return Block("heading", len(groups["heading"]), None, plain_text(groups["heading_text"]))
+    if groups["rule"]:
+        return Block("rule", 0, None, None)
+    depth = min(len(groups["indent"].expandtabs(4)) // 2, len(BULLET_MARKERS) - 1)
+    if groups["bullet"]:
+        return Block("bullet", depth, BULLET_MARKERS[depth], parse_inline(groups["bullet_text"]))
+    if groups["number"]:
+        return Block("number", depth, f"{int(groups['number'])}.", parse_inline(groups["number_text"]))
+    if groups["table"]:
+        if TABLE_SEPARATOR_RE.match(groups["table"]):
+            return Block("table", 0, "separator", None)
+        return Block("table", 0, None, [split_table_row(groups["table"])])
+    if not groups["text"]:
+        return Block("blank", 0, None, None)
+    return Block("text", 0, None, parse_inline(groups["text"]))
+
+def parse_markdown(text):
+    """
+    Tokeniza el documento completo en bloques. Las filas consecutivas de una
+    tabla se agrupan en un único bloque; si la segunda fila es el separador
+    (|---|), la primera se marca como encabezado.
+    """
+    blocks = []
+    for line in text.splitlines():
+        block = classify_line(line)
+        if block.kind != "table":
+            blocks.append(block)
+            continue
+        previous = blocks[-1] if blocks else None
+        if previous is None or previous.kind != "table":
+            previous = Block("table", 0, None, [])
+            blocks.append(previous)
+        if block.marker == "separator":
+            if len(previous.content) == 1:
+                blocks[-1] = previous._replace(marker="header")
+        else:
+            previous.content.extend(block.content)
+    return [block for block in blocks if block.kind != "table" or block.content]
+
+def fit_columns(natural, available):
+    """
+    Ajusta los anchos de columna al ancho disponible: las columnas angostas
+    conservan su ancho natural y solo se achican (y cortan en renglones)
+    las que superan su parte proporcional del espacio restante.
+    """
+    if sum(natural) <= available:
+        return list(natural)
+    widths = [None] * len(natural)
+    remaining = available
+    pending = list(range(len(natural)))
+    while pending:
+        share = remaining / len(pending)
+        narrow = [i for i in pending if natural[i] <= share]
+        if not narrow:
+            total = sum(natural[i] for i in pending)
+            for i in pending:
+                widths[i] = remaining * natural[i] / total
+            break
+        for i in narrow:
+            widths[i] = natural[i]
+            remaining -= natural[i]
+        pending = [i for i in pending if i not in narrow]
+    return widths
+
+###############################################
+# RENDERIZADO EN FPDF
+###############################################
+class MarkdownRenderer:
+    """
+    Dibuja bloques de markdown sobre un FPDF. Solo cambia de fuente cuando
+    el estilo del próximo run difiere del actual, y las listas anidadas usan
+    sangría francesa (el texto que se corta queda alineado bajo el primer
+    renglón, no bajo la viñeta).
+
+    Sirve tanto para el documento completo (render) como para líneas que
+    llegan de a una (feed): las filas de tabla se acumulan hasta que termina
+    la tabla, porque el ancho de las columnas depende de todas las filas.
+    """
+
+    def __init__(self, pdf, family="DejaVu", font_size=12, line_height=8, indent=6):
+        self.pdf = pdf
+        self.family = family
+        self.font_size = font_size
+        self.line_height = line_height
+        self.indent = indent
+        self.font_switches = 0
+        self._widths = {}
+        self._pending_table = None
+
+    def set_font(self, bold=False, size=None):
+        size = size or self.font_size
+        style = "B" if bold else ""
+        pdf = self.pdf
+        if pdf.font_family != self.family.lower() or pdf.font_style != style or pdf.font_size_pt != size:
+            pdf.set_font(self.family, style, size)
+            self.font_switches += 1
+
+    def text_width(self, text, bold=False, size=None):
+        """
+        Ancho en mm de `text`, calculado con la tabla de anchos de la fuente
+        sin seleccionarla. Las palabras se repiten mucho en un reporte, así
+        que el ancho en unidades de fuente se guarda por palabra.
+        """
+        key = (bold, text)
+        units = self._widths.get(key)
+        if units is None:
+            font = self.pdf.fonts[self.family.lower() + ("B" if bold else "")]
+            cw = font['cw']
+            size_cw = len(cw)
+            missing = font['desc'].get('MissingWidth') or 500
+            units = sum(cw[code] if code < size_cw else missing for code in map(ord, text))
+            self._widths[key] = units
+        return units * (size or self.font_size) / 1000.0 / self.pdf.k
+
+    def write_runs(self, runs, size=None, line_height=None):
+        """
+        Escribe texto corrido con corte de línea propio: mide palabras con
+        text_width y emite una sola celda por tramo del mismo estilo en cada
+        renglón. FPDF.write, en cambio, mide carácter por carácter.
+        Deja el cursor al final del último renglón, como FPDF.write.
+        """
+        pdf = self.pdf
+        size = size or self.font_size
+        line_height = line_height or self.line_height
+        right = pdf.w - pdf.r_margin
+        available = right - pdf.get_x()
+        line = []
+        used = 0.0
+        for bold, chunk in runs:
+            for piece in WORD_RE.findall(chunk):
+                if piece.isspace():
+                    if line:
+                        line.append((bold, " ", self.text_width(" ", bold, size)))
+                        used += line[-1][2]
+                    continue
+                width = self.text_width(piece, bold, size)
+                if used + width > available and line:
+                    self._emit_line(line, size, line_height)
+                    pdf.ln(line_height)
+                    available = right - pdf.get_x()
+                    line, used = [], 0.0
+                while width > available and len(piece) > 1:
+                    # Palabra más larga que el renglón: se corta por caracteres
+                    cut = len(piece) - 1
+                    while cut > 1 and self.text_width(piece[:cut], bold, size) > available:
+                        cut -= 1
+                    self._emit_line([(bold, piece[:cut], self.text_width(piece[:cut], bold, size))], size, line_height)
+                    pdf.ln(line_height)
+                    available = right - pdf.get_x()
+                    piece = piece[cut:]
+                    width = self.text_width(piece, bold, size)
+                line.append((bold, piece, width))
+                used += width
+        self._emit_line(line, size, line_height)
+
+    def _emit_line(self, pieces, size, line_height):
+        while pieces and pieces[-1][1] == " ":
+            pieces = pieces[:-1]
+        pdf = self.pdf
+        cell_margin, pdf.c_margin = pdf.c_margin, 0
+        start = 0
+        while start < len(pieces):
+            bold = pieces[start][0]
+            end = start
+            while end < len(pieces) and pieces[end][0] == bold:
+                end += 1
+            self.set_font(bold, size)
+            pdf.cell(sum(piece[2] for piece in pieces[start:end]), line_height,
+                     "".join(piece[1] for piece in pieces[start:end]))
+            start = end
+        pdf.c_margin = cell_margin
+
+    def render(self, blocks):
+        for block in blocks:
+            self.render_block(block)
+        self.flush()
+
+    def feed(self, line):
+        block = classify_line(line)
+        if block.kind == "table":
+            if self._pending_table is None:
+                self._pending_table = Block("table", 0, None, [])
+            if block.marker == "separator":
+                if len(self._pending_table.content) == 1:
+                    self._pending_table = self._pending_table._replace(marker="header")
+            else:
+                self._pending_table.content.extend(block.content)
+            return
+        self.flush()
+        self.render_block(block)
+
+    def flush(self):
+        if self._pending_table is not None:
+            table, self._pending_table = self._pending_table, None
+            if table.content:
+                self.render_block(table)
+
+    def render_block(self, block):
+        pdf = self.pdf
+        if block.kind == "blank":
+            pdf.ln(4)
+            return
+        if block.kind == "heading":
+            self.set_font(True, HEADING_SIZES[block.level])
+            pdf.multi_cell(0, 10, block.content)
+        elif block.kind == "rule":
+            y = pdf.get_y() + 2
+            pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+            pdf.ln(4)
+        elif block.kind in ("bullet", "number"):
+            self._render_list_item(block)
+        elif block.kind == "table":
+            self._render_table(block)
+        else:
+            self.write_runs(block.content)
+            pdf.ln(self.line_height)
+        pdf.ln(2)
+
+    def _render_list_item(self, block):
+        pdf = self.pdf
+        margin = pdf.l_margin
+        x = margin + block.level * self.indent
+        self.set_font(False)
+        marker_width = max(self.indent, self.text_width(block.marker) + 2)
+        pdf.set_x(x)
+        pdf.cell(marker_width, self.line_height, block.marker)
+        pdf.set_left_margin(x + marker_width)
+        self.write_runs(block.content)
+        pdf.set_left_margin(margin)
+        pdf.ln(self.line_height)
+
+    def _wrap(self, text, width, bold, size):
+        lines = []
+        current = ""
+        for word in text.split():
+            candidate = f"{current} {word}" if current else word
+            if current and self.text_width(candidate, bold, size) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+            # Una palabra más ancha que la celda (URLs, tickers largos) se corta
+            # por caracteres, igual que hace multi_cell de fpdf
+            while self.text_width(current, bold, size) > width and len(current) > 1:
+                cut = 1
+                while cut < len(current) and self.text_width(current[:cut + 1], bold, size) <= width:
+                    cut += 1
+                lines.append(current[:cut])
+                current = current[cut:]
+        lines.append(current)
+        return lines
+
+    def _render_table(self, block, font_size=10, line_height=6, padding=1.5):
+        pdf = self.pdf
+        rows = [[plain_text(cell) for cell in row] for row in block.content]
+        columns = max(len(row) for row in rows)
+        rows = [row + [""] * (columns - len(row)) for row in rows]
+        has_header = block.marker == "header"
+
+        available = pdf.w - pdf.l_margin - pdf.r_margin
+        natural = [0.0] * columns
+        for index, row in enumerate(rows):
+            bold = has_header and index == 0
+            for column, cell in enumerate(row):
+                natural[column] = max(natural[column], self.text_width(cell, bold, font_size) + 2 * padding)
+        widths = fit_columns(natural, available)
+
+        for index, row in enumerate(rows):
+            bold = has_header and index == 0
+            self.set_font(bold, font_size)
+            wrapped = [self._wrap(cell, width - 2 * padding, bold, font_size) for cell, width in zip(row, widths)]
+            row_height = max(len(lines) for lines in wrapped) * line_height
+            if pdf.get_y() + row_height > pdf.page_break_trigger:
+                pdf.add_page()
+            x, y = pdf.l_margin, pdf.get_y()
+            for lines, width in zip(wrapped, widths):
+                if bold:
+                    pdf.set_fill_color(230, 230, 230)
+                    pdf.rect(x, y, width, row_height, "DF")
+                else:
+                    pdf.rect(x, y, width, row_height)
+                for offset, text in enumerate(lines):
+                    pdf.set_xy(x + padding, y + offset * line_height)
+                    pdf.cell(width - 2 * padding, line_height, text)
+                x += width
+            pdf.set_xy(pdf.l_margin, y + row_height)
@@ -0,0 +1,123 @@
+from collections import namedtuple
+from datetime import date, datetime, time as dt_time, timedelta
+import json
+import os
+from zoneinfo import ZoneInfo
+from tickers import get_universe
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay,
+                                    USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday, sunday_to_monday)
+
+###############################################
+# MERCADOS Y HORARIOS DE CIERRE
+###############################################
+# Minutos después del cierre para que yfinance publique la vela final
+MARKET_CLOSE_DELAY_MINUTES = int(os.getenv("MARKET_CLOSE_DELAY_MINUTES", "20"))
+CRYPTO_REFRESH_HOURS = float(os.getenv("CRYPTO_REFRESH_HOURS", "4"))
+# JSON opcional con feriados extra por mercado: {"byma": ["2025-03-03", ...]}
+MARKET_HOLIDAYS_FILE = os.getenv("MARKET_HOLIDAYS_FILE")
+
+# close (y open) es None para los mercados que operan 24/7 (se refrescan cada `interval`)
+Market = namedtuple("Market", ["name", "label", "timezone", "close", "interval", "open"])
+
+MARKETS = {
+    "us": Market("us", "NYSE/Nasdaq", ZoneInfo("America/New_York"), dt_time(16, 0), None, dt_time(9, 30)),
+    "byma": Market("byma", "BYMA", ZoneInfo("America/Argentina/Buenos_Aires"), dt_time(17, 0), None, dt_time(11, 0)),
+    "crypto": Market("crypto", "Cripto 24/7", ZoneInfo("UTC"), None, timedelta(hours=CRYPTO_REFRESH_HOURS), None),
+}
+
+def market_for_ticker(ticker):
+    # El mercado sale del calendario del registro: TX es de la región Argentina pero cotiza en NYSE
+    return get_universe().lookup(ticker).calendar
+
+def tickers_by_market(tickers):
+    grouped = {name: [] for name in MARKETS}
+    for ticker in tickers:
+        grouped[market_for_ticker(ticker)].append(ticker)
+    return grouped
+
+###############################################
+# FERIADOS
+###############################################
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        # Si el 1 de enero cae sábado NYSE no cierra el viernes 31 (fin del año fiscal)
+        Holiday("New Years Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas", month=12, day=25, observance=nearest_workday),
+    ]
+
+# Feriados nacionales de fecha fija; los trasladables (17/6, 17/8, 12/10, 20/11) y los puentes
+# cambian por decreto cada año y van en MARKET_HOLIDAYS_FILE
+BYMA_FIXED_HOLIDAYS = [(1, 1), (3, 24), (4, 2), (5, 1), (5, 25), (6, 20), (7, 9), (12, 8), (12, 25)]
+# Feriados que dependen de la Pascua, en días desde el domingo de Pascua: lunes y martes de
+# Carnaval, Jueves y Viernes Santo
+BYMA_EASTER_OFFSETS = (-48, -47, -3, -2)
+
+_holidays = {}
+
+def _extra_holidays():
+    if not MARKET_HOLIDAYS_FILE:
+        return {}
+    with open(MARKET_HOLIDAYS_FILE) as f:
+        return {market: {date.fromisoformat(day) for day in days} for market, days in json.load(f).items()}
+
+def holidays(market_name, year):
+    key = (market_name, year)
+    if key not in _holidays:
+        days = set(_extra_holidays().get(market_name, ()))
+        if market_name == "us":
+            days |= {d.date() for d in NYSEHolidayCalendar().holidays(date(year, 1, 1), date(year, 12, 31))}
+        elif market_name == "byma":
+            from dateutil.easter import easter
+
+            days |= {date(year, month, day) for month, day in BYMA_FIXED_HOLIDAYS}
+            days |= {easter(year) + timedelta(days=offset) for offset in BYMA_EASTER_OFFSETS}
+        _holidays[key] = days
+    return _holidays[key]
+
+def is_trading_day(market, day):
+    if market.close is None:
+        return True
+    return day.weekday() < 5 and day not in holidays(market.name, day.year)
+
+###############################################
+# PRÓXIMO DISPARO
+###############################################
+def next_trigger(market, after, delay_minutes=MARKET_CLOSE_DELAY_MINUTES):
+    """
+    Próximo momento (datetime con zona) en que hay que refrescar el mercado
+    estrictamente después de `after`: el cierre de la próxima rueda hábil más
+    una demora, o el siguiente múltiplo de `interval` para los 24/7.
+    """
+    if market.close is None:
+        epoch = datetime(2000, 1, 1, tzinfo=market.timezone)
+        elapsed = (after.astimezone(market.timezone) - epoch) // market.interval
+        return epoch + (elapsed + 1) * market.interval
+
+    local = after.astimezone(market.timezone)
+    day = local.date()
+    delay = timedelta(minutes=delay_minutes)
+    while True:
+        trigger = datetime.combine(day, market.close, tzinfo=market.timezone) + delay
+        if trigger > local and is_trading_day(market, day):
+            return trigger
+        day += timedelta(days=1)
+
+def is_session_open(market, at):
+    # Si `at` (datetime con zona) cae dentro de la rueda; los 24/7 siempre están abiertos
+    if market.close is None:
+        return True
+    local = at.astimezone(market.timezone)
+    return is_trading_day(market, local.date()) and market.open <= local.time() < market.close
+
+def session_date(market, at):
+    # Rueda a la que corresponde un refresco hecho en `at` (para crypto, el día UTC)
+    return at.astimezone(market.timezone).date()
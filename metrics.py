@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Métricas de la corrida: spans con duración, cantidad de elementos, bytes y
+errores por etapa y por ticker, acumulados en histogramas en memoria. Al
+final de cada corrida se exportan como resumen JSON (METRICS_DIR/<run_id>.json)
+y en formato de texto de Prometheus (METRICS_DIR/trading_ai.prom, apto para
+el textfile collector de node_exporter).
+
+Uso: python metrics.py summary [metrics/AAAA-MM-DD.json]
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+###############################################
+# CONFIGURACIÓN DE MÉTRICAS
+###############################################
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+PROMETHEUS_FILE = "trading_ai.prom"
+METRIC_PREFIX = "trading_ai"
+# Límites de los buckets de duración en segundos (como los de los clientes de Prometheus, extendidos)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SLOWEST_TICKERS = 15
+# Duraciones crudas que se guardan por serie para los percentiles; pasado el tope se toma una muestra uniforme
+METRICS_RESERVOIR = int(os.getenv("METRICS_RESERVOIR", "1024"))
+
+###############################################
+# HISTOGRAMAS
+###############################################
+class Series:
+    """Histograma de duraciones más contadores de una combinación (span, ticker)."""
+
+    __slots__ = ("buckets", "count", "total", "top_level_total", "max", "errors", "bytes", "items", "durations")
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        # Tiempo de los spans que no estaban dentro de otro: es el que se suma por ticker
+        self.top_level_total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.bytes = 0
+        self.items = 0
+        # Muestra de las duraciones crudas para los percentiles del JSON: exactos hasta METRICS_RESERVOIR
+        # observaciones y después una muestra uniforme de ese tamaño, así un proceso residente no crece sin límite
+        self.durations = []
+
+    def observe(self, seconds, error=False, nbytes=0, items=0, nested=False):
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        if not nested:
+            self.top_level_total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += int(error)
+        self.bytes += nbytes
+        self.items += items
+        if len(self.durations) < METRICS_RESERVOIR:
+            self.durations.append(seconds)
+        else:
+            slot = random.randrange(self.count)
+            if slot < METRICS_RESERVOIR:
+                self.durations[slot] = seconds
+
+
+_series = defaultdict(Series)
+_series_lock = threading.Lock()
+_started_at = time.time()
+_local = threading.local()
+
+def record_span(name, seconds, ticker=None, error=False, nbytes=0, items=0, nested=False):
+    with _series_lock:
+        _series[(name, ticker)].observe(seconds, error, nbytes, items, nested)
+
+def reset_metrics():
+    global _started_at
+    with _series_lock:
+        _series.clear()
+        _started_at = time.time()
+
+###############################################
+# SPANS
+###############################################
+class Span:
+    __slots__ = ("name", "ticker", "error", "bytes", "items")
+
+    def __init__(self, name, ticker=None):
+        self.name = name
+        self.ticker = ticker
+        self.error = False
+        self.bytes = 0
+        self.items = 0
+
+    def add_bytes(self, nbytes):
+        self.bytes += nbytes
+
+    def add_items(self, count):
+        self.items += count
+
+    def fail(self):
+        self.error = True
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def current_span():
+    # El span abierto más interno de este hilo, o None
+    stack = _stack()
+    return stack[-1] if stack else None
+
+@contextmanager
+def span(name, ticker=None):
+    """
+    Mide el bloque y lo registra al salir. Una excepción que se propaga
+    cuenta como error; las funciones que capturan sus errores llaman a
+    mark_error() para que también queden contados.
+    """
+    current = Span(name, ticker)
+    stack = _stack()
+    stack.append(current)
+    started_at = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        stack.pop()
+        record_span(name, time.perf_counter() - started_at, ticker, current.error, current.bytes, current.items,
+                    nested=bool(stack))
+
+def timed(name, per_ticker=False):
+    """Decorador: un span por llamada. Con per_ticker el primer argumento es el ticker."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, args[0] if per_ticker and args else None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add_bytes(nbytes):
+    current = current_span()
+    if current is not None:
+        current.add_bytes(nbytes)
+
+def add_items(count):
+    current = current_span()
+    if current is not None:
+        current.add_items(count)
+
+def mark_error():
+    current = current_span()
+    if current is not None:
+        current.fail()
+
+###############################################
+# EXPORTACIÓN (JSON Y PROMETHEUS)
+###############################################
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def build_summary(run_id=None):
+    """
+    Resumen de la corrida: por span (sumando todos los tickers) con
+    percentiles de duración, y los tickers que más tiempo acumularon.
+    """
+    with _series_lock:
+        items = [(key, series.count, series.total, series.top_level_total, series.max, series.errors,
+                  series.bytes, series.items, list(series.durations)) for key, series in _series.items()]
+    stages = {}
+    per_ticker = defaultdict(dict)
+    ticker_totals = defaultdict(float)
+    for (name, ticker), count, total, top_level, maximum, errors, nbytes, nitems, durations in items:
+        entry = stages.setdefault(name, {"count": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0,
+                                         "bytes": 0, "items": 0, "tickers": 0, "_durations": []})
+        entry["count"] += count
+        entry["errors"] += errors
+        entry["total_s"] += total
+        entry["max_s"] = max(entry["max_s"], maximum)
+        entry["bytes"] += nbytes
+        entry["items"] += nitems
+        entry["tickers"] += int(ticker is not None)
+        entry["_durations"].extend(durations)
+        if ticker is not None:
+            per_ticker[ticker][name] = round(total, 4)
+            ticker_totals[ticker] += top_level
+    for entry in stages.values():
+        ordered = sorted(entry.pop("_durations"))
+        entry["mean_s"] = entry["total_s"] / entry["count"] if entry["count"] else 0.0
+        entry["p50_s"] = _percentile(ordered, 50)
+        entry["p95_s"] = _percentile(ordered, 95)
+        for key in ("total_s", "max_s", "mean_s", "p50_s", "p95_s"):
+            entry[key] = round(entry[key], 4) if entry[key] is not None else None
+    slowest = sorted(per_ticker, key=ticker_totals.get, reverse=True)
+    return {
+        "run_id": run_id,
+        "started_at": datetime.fromtimestamp(_started_at).isoformat(timespec="seconds"),
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "wall_s": round(time.time() - _started_at, 3),
+        "stages": dict(sorted(stages.items(), key=lambda item: item[1]["total_s"], reverse=True)),
+        "slowest_tickers": [{"ticker": ticker, "total_s": round(ticker_totals[ticker], 4), "spans": per_ticker[ticker]}
+                            for ticker in slowest[:SLOWEST_TICKERS]],
+    }
+
+def _labels(name, ticker, **extra):
+    labels = {"span": name}
+    if ticker is not None:
+        labels["ticker"] = ticker
+    labels.update(extra)
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def prometheus_text():
+    duration = f"{METRIC_PREFIX}_span_duration_seconds"
+    counters = [
+        ("errors", "Spans que terminaron con error", lambda s: s.errors),
+        ("bytes", "Bytes procesados (descargados, escritos o enviados)", lambda s: s.bytes),
+        ("items", "Elementos procesados (noticias, filas, destinatarios)", lambda s: s.items),
+    ]
+    with _series_lock:
+        series = sorted(_series.items(), key=lambda item: (item[0][0], item[0][1] or ""))
+        lines = [f"# HELP {duration} Duración de cada span por etapa y ticker.",
+                 f"# TYPE {duration} histogram"]
+        for (name, ticker), s in series:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, s.buckets):
+                cumulative += count
+                lines.append(f"{duration}_bucket{_labels(name, ticker, le=bound)} {cumulative}")
+            lines.append(f"{duration}_bucket{_labels(name, ticker, le='+Inf')} {s.count}")
+            lines.append(f"{duration}_sum{_labels(name, ticker)} {s.total:.6f}")
+            lines.append(f"{duration}_count{_labels(name, ticker)} {s.count}")
+        for suffix, description, value in counters:
+            metric = f"{METRIC_PREFIX}_span_{suffix}_total"
+            lines.append(f"# HELP {metric} {description}.")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{_labels(name, ticker)} {value(s)}" for (name, ticker), s in series)
+    lines.append(f"# HELP {METRIC_PREFIX}_last_export_timestamp_seconds Momento de la última exportación.")
+    lines.append(f"# TYPE {METRIC_PREFIX}_last_export_timestamp_seconds gauge")
+    lines.append(f"{METRIC_PREFIX}_last_export_timestamp_seconds {time.time():.0f}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    # El textfile collector puede leer en cualquier momento: nunca un archivo a medias
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def export_metrics(run_id=None, directory=METRICS_DIR):
+    """Escribe el resumen JSON y el archivo de Prometheus. Devuelve ambas rutas."""
+    os.makedirs(directory, exist_ok=True)
+    summary = build_summary(run_id)
+    json_path = os.path.join(directory, f"{run_id or datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    prom_path = os.path.join(directory, PROMETHEUS_FILE)
+    _write_atomic(json_path, json.dumps(summary, ensure_ascii=False, indent=2))
+    _write_atomic(prom_path, prometheus_text())
+    print_summary(summary)
+    print(f"📈 Métricas exportadas en {json_path} y {prom_path}.")
+    return json_path, prom_path
+
+def print_summary(summary, top=10):
+    stages = list(summary["stages"].items())
+    if not stages:
+        print("No hay métricas registradas.")
+        return
+    print(f"Corrida {summary['run_id'] or '-'}: {summary['wall_s']:.1f}s de reloj")
+    print(f"{'span':<26} {'llamadas':>8} {'errores':>7} {'total':>9} {'p50':>8} {'p95':>8} {'máx':>8}")
+    for name, entry in stages[:top]:
+        print(f"{name:<26} {entry['count']:>8} {entry['errors']:>7} {entry['total_s']:>8.1f}s "
+              f"{entry['p50_s']:>7.2f}s {entry['p95_s']:>7.2f}s {entry['max_s']:>7.2f}s")
+    if summary["slowest_tickers"]:
+        slowest = ", ".join(f"{row['ticker']} {row['total_s']:.1f}s" for row in summary["slowest_tickers"][:5])
+        print(f"Tickers más lentos: {slowest}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumen de las métricas exportadas por una corrida")
+    parser.add_argument("command", choices=["summary"])
+    parser.add_argument("path", nargs="?", help="Resumen JSON (por defecto, el más reciente de METRICS_DIR)")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    path = args.path
+    if path is None:
+        candidates = [os.path.join(METRICS_DIR, name) for name in os.listdir(METRICS_DIR) if name.endswith(".json")] \
+            if os.path.isdir(METRICS_DIR) else []
+        if not candidates:
+            parser.error(f"no hay resúmenes en {METRICS_DIR}")
+        path = max(candidates, key=os.path.getmtime)
+    with open(path, encoding="utf-8") as f:
+        print_summary(json.load(f), args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import io
+import os
+import zlib
+import numpy as np
+import fpdf
+
+###############################################
+# CONFIGURACIÓN DE SALIDA DEL PDF
+###############################################
+# DPI efectivo máximo de los gráficos una vez ubicados en la página
+CHART_MAX_DPI = int(os.getenv("CHART_MAX_DPI", "120"))
+# "indexed" (paleta de 256 colores), "rgb" (sin pérdida) o "jpeg"
+CHART_IMAGE_FORMAT = os.getenv("CHART_IMAGE_FORMAT", "indexed")
+CHART_JPEG_QUALITY = int(os.getenv("CHART_JPEG_QUALITY", "80"))
+CHART_ZLIB_LEVEL = int(os.getenv("CHART_ZLIB_LEVEL", "9"))
+# Ancho con el que se ubica cada gráfico en la página A4
+CHART_PLACED_WIDTH_MM = 190
+
+FONT_CACHE_DIR = os.getenv("FONT_CACHE_DIR", os.path.join(".cache", "fonts"))
+REPORT_FONTS = [
+    ("DejaVu", "", "DejaVuSans.ttf"),
+    ("DejaVu", "B", "DejaVuSans-Bold.ttf"),
+]
+
+###############################################
+# CODIFICACIÓN DE IMÁGENES DE GRÁFICOS
+###############################################
+def chart_render_dpi(figsize, max_dpi=CHART_MAX_DPI, placed_width_mm=CHART_PLACED_WIDTH_MM):
+    """
+    DPI de renderizado para que la imagen, una vez ubicada en la página,
+    no supere `max_dpi`. Por encima de eso el PDF solo crece sin ganar nitidez.
+    """
+    placed_width_in = placed_width_mm / 25.4
+    return max(30, int(round(max_dpi * placed_width_in / figsize[0])))
+
+def image_settings():
+    # Parte de la clave de la caché de gráficos: si cambia, se re-renderiza
+    quality = CHART_JPEG_QUALITY if CHART_IMAGE_FORMAT == "jpeg" else CHART_ZLIB_LEVEL
+    return f"{CHART_IMAGE_FORMAT}:{quality}"
+
+def encode_image(rgb, image_format=CHART_IMAGE_FORMAT):
+    """
+    Codifica un array RGB (alto, ancho, 3) para incrustarlo en el PDF.
+    Devuelve un dict con el espacio de color, el filtro, la paleta y los datos.
+    """
+    height, width, _ = rgb.shape
+    if image_format == "jpeg":
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.fromarray(rgb).save(buffer, format="JPEG", quality=CHART_JPEG_QUALITY, optimize=True)
+        return {"cs": "DeviceRGB", "f": "DCTDecode", "pal": b"", "data": buffer.getvalue()}
+    if image_format == "indexed":
+        from PIL import Image
+
+        quantized = Image.fromarray(rgb).quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        indices = np.asarray(quantized, dtype=np.uint8)
+        colors = int(indices.max()) + 1
+        palette = bytes(quantized.getpalette()[:3 * colors])
+        return {"cs": "Indexed", "f": "FlateDecode", "pal": palette,
+                "data": zlib.compress(indices.tobytes(), CHART_ZLIB_LEVEL)}
+    return {"cs": "DeviceRGB", "f": "FlateDecode", "pal": b"",
+            "data": zlib.compress(np.ascontiguousarray(rgb).tobytes(), CHART_ZLIB_LEVEL)}
+
+def register_image(pdf, name, width, height, encoded):
+    """
+    Registra una imagen ya codificada en el FPDF para que pdf.image(name) la
+    use directamente, sin leer ningún archivo.
+    """
+    if name not in pdf.images:
+        info = {
+            'w': width,
+            'h': height,
+            'cs': encoded["cs"],
+            'bpc': 8,
+            'f': encoded["f"],
+            'data': encoded["data"],
+            'i': len(pdf.images) + 1,
+        }
+        if encoded["cs"] == "Indexed":
+            info['pal'] = encoded["pal"]
+        pdf.images[name] = info
+    return name
+
+###############################################
+# FUENTES: MÉTRICAS CACHEADAS ENTRE CORRIDAS
+###############################################
+_font_entries = {}
+
+
+class GlyphSubset(list):
+    """
+    Lista de códigos usados de una fuente TTF que ignora repetidos. fpdf 1.7.2
+    agrega un elemento por cada carácter escrito y al cerrar el documento
+    busca cada código en esa lista (`cid in subset`), lo que en reportes
+    largos tarda segundos; así la lista queda con un elemento por glifo y la
+    búsqueda es por conjunto.
+    """
+
+    def __init__(self, codes=()):
+        self._seen = set()
+        super().__init__()
+        for code in codes:
+            self.append(code)
+
+    def append(self, code):
+        if code not in self._seen:
+            self._seen.add(code)
+            super().append(code)
+
+    def __contains__(self, code):
+        return code in self._seen
+
+    def __delitem__(self, index):
+        # fpdf hace `del subset[0]` antes de armar el subset de la fuente
+        removed = self[index]
+        super().__delitem__(index)
+        for code in (removed if isinstance(index, slice) else [removed]):
+            self._seen.discard(code)
+
+
+def configure_font_cache(directory=FONT_CACHE_DIR):
+    """
+    Hace que fpdf guarde las métricas de las TTF en un directorio de caché
+    persistente (modo 2) en lugar de junto a las fuentes del repo.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fpdf.set_global("FPDF_CACHE_MODE", 2)
+    fpdf.set_global("FPDF_CACHE_DIR", directory)
+
+def add_report_fonts(pdf):
+    """
+    Registra las fuentes DejaVu. La primera vez por proceso se leen las
+    métricas (desde la caché en disco o desde la TTF); luego se reutilizan en
+    memoria y solo se crea una lista de subset nueva (GlyphSubset) para cada
+    documento. fpdf sigue incrustando únicamente el subset de glifos usados.
+    """
+    for family, style, filename in REPORT_FONTS:
+        fontkey = family.lower() + style
+        cached = _font_entries.get(fontkey)
+        if cached is None:
+            pdf.add_font(family, style, filename, uni=True)
+            pdf.fonts[fontkey]['subset'] = GlyphSubset(pdf.fonts[fontkey]['subset'])
+            _font_entries[fontkey] = (
+                dict(pdf.fonts[fontkey]),
+                dict(pdf.font_files[fontkey]),
+                list(pdf.fonts[fontkey]['subset']),
+                filename,
+            )
+            continue
+        font, font_file, subset, ttf_name = cached
+        if fontkey in pdf.fonts:
+            continue
+        pdf.fonts[fontkey] = dict(font, i=len(pdf.fonts) + 1, subset=GlyphSubset(subset))
+        pdf.font_files[fontkey] = dict(font_file)
+        pdf.font_files[ttf_name] = {'type': "TTF"}
+
+configure_font_cache()
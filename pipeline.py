@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Orquestador de etapas con checkpoints: el job diario se describe como un DAG
+de etapas (precios, indicadores, noticias, ...) y cada unidad terminada
+(una etapa para un ticker, o una etapa agregada completa) se guarda en la
+tabla pipeline_checkpoints. Si la corrida se repite con el mismo run_id solo
+se ejecuta lo que quedó incompleto.
+
+Uso: python pipeline.py status [--run-id AAAA-MM-DD]
+     python pipeline.py reset --stage llm [--run-id AAAA-MM-DD]
+"""
+import argparse
+import pickle
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+import os
+from metrics import record_span, span
+
+###############################################
+# DEFINICIÓN DE ETAPAS
+###############################################
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+# Unidad de las etapas que no son por ticker
+AGGREGATE_UNIT = "*"
+
+# per_ticker: la etapa se ejecuta y se guarda por ticker.
+# batch: func recibe todos los tickers pendientes juntos y devuelve {ticker: resultado}
+#        (los que falten cuentan como error); si no, func(ticker, inputs) por ticker.
+# check: opcional; valida un resultado guardado antes de reutilizarlo (p. ej. que el PDF exista).
+# select: opcional, solo por ticker; select(tickers) devuelve el subconjunto con el que trabaja la
+#         etapa (p. ej. los símbolos del universo que tienen fuente de noticias).
+# once: la etapa tiene un efecto externo (p. ej. enviar el correo): con un checkpoint ok no se
+#       repite aunque sus dependencias se recalculen, salvo que el Pipeline se cree con resend=True.
+Stage = namedtuple("Stage", ["name", "deps", "func", "per_ticker", "batch", "check", "select", "once"])
+
+def stage(name, func, deps=(), per_ticker=False, batch=False, check=None, select=None, once=False):
+    return Stage(name, tuple(deps), func, per_ticker, batch, check, select, once)
+
+###############################################
+# CHECKPOINTS
+###############################################
+class DBCheckpointStore:
+    """
+    Checkpoints en PostgreSQL. El resultado de cada unidad se guarda
+    serializado con pickle: son datos propios (DataFrames, dicts, rutas) y
+    se leen solo desde esta misma base.
+    """
+
+    def __init__(self):
+        from db import pooled_connection
+
+        self._connection = pooled_connection
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS pipeline_checkpoints (
+                run_id VARCHAR(40) NOT NULL,
+                stage VARCHAR(40) NOT NULL,
+                unit VARCHAR(20) NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                payload BYTEA,
+                error TEXT,
+                seconds NUMERIC,
+                updated_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (run_id, stage, unit)
+            );
+            """)
+            conn.commit()
+            cur.close()
+
+    def load(self, run_id, units=None):
+        # units limita la lectura a esos tickers (y a las etapas agregadas)
+        with self._connection() as conn:
+            cur = conn.cursor()
+            if units is None:
+                cur.execute("SELECT stage, unit, payload FROM pipeline_checkpoints "
+                            "WHERE run_id = %s AND status = 'ok'", (run_id,))
+            else:
+                cur.execute("SELECT stage, unit, payload FROM pipeline_checkpoints "
+                            "WHERE run_id = %s AND status = 'ok' AND unit = ANY(%s)",
+                            (run_id, list(units) + [AGGREGATE_UNIT]))
+            rows = cur.fetchall()
+            cur.close()
+        return {(stage, unit): pickle.loads(bytes(payload)) for stage, unit, payload in rows}
+
+    def save(self, run_id, stage_name, results):
+        """`results` es una lista de (unidad, status, resultado o None, error, segundos)."""
+        from psycopg2 import Binary
+        from psycopg2.extras import execute_values
+
+        now = datetime.now()
+        rows = [
+            (run_id, stage_name, unit, status,
+             Binary(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)) if status == "ok" else None,
+             error, round(seconds, 3), now)
+            for unit, status, payload, error, seconds in results
+        ]
+        with self._connection() as conn:
+            cur = conn.cursor()
+            execute_values(cur, """
+                INSERT INTO pipeline_checkpoints
+                    (run_id, stage, unit, status, payload, error, seconds, updated_at)
+                VALUES %s
+                ON CONFLICT (run_id, stage, unit) DO UPDATE SET
+                    status = EXCLUDED.status, payload = EXCLUDED.payload, error = EXCLUDED.error,
+                    seconds = EXCLUDED.seconds, updated_at = EXCLUDED.updated_at
+            """, rows)
+            conn.commit()
+            cur.close()
+
+    def summary(self, run_id):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT stage, status, COUNT(*), SUM(seconds), MAX(updated_at), MAX(error)
+                FROM pipeline_checkpoints WHERE run_id = %s
+                GROUP BY stage, status ORDER BY MIN(updated_at)
+            """, (run_id,))
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def reset(self, run_id, stage_name):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM pipeline_checkpoints WHERE run_id = %s AND stage = %s", (run_id, stage_name))
+            deleted = cur.rowcount
+            conn.commit()
+            cur.close()
+        return deleted
+
+
+class MemoryCheckpointStore:
+    # Sin persistencia: se usa si la DB no está disponible (no habrá reanudación)
+    def __init__(self):
+        self.rows = {}
+
+    def load(self, run_id, units=None):
+        units = None if units is None else set(units) | {AGGREGATE_UNIT}
+        return {(s, u): payload for (r, s, u), (status, payload) in self.rows.items()
+                if r == run_id and status == "ok" and (units is None or u in units)}
+
+    def save(self, run_id, stage_name, results):
+        for unit, status, payload, _, _ in results:
+            self.rows[(run_id, stage_name, unit)] = (status, payload)
+
+
+def default_store():
+    try:
+        return DBCheckpointStore()
+    except Exception as e:
+        print(f"⚠️ No se pudo usar la DB para checkpoints ({e}); la corrida no podrá reanudarse.")
+        return MemoryCheckpointStore()
+
+###############################################
+# EJECUCIÓN DEL DAG
+###############################################
+class StageFailed(Exception):
+    pass
+
+
+class Pipeline:
+    """
+    Ejecuta las etapas apenas sus dependencias terminan, en un pool de hilos,
+    de modo que ramas independientes (precios y noticias) corren en paralelo.
+
+    Una etapa por ticker se ejecuta solo para los tickers que tienen todas
+    sus dependencias en ok y que no tienen ya un checkpoint ok (o cuyo
+    checkpoint quedó viejo porque una dependencia se recalculó). Una etapa
+    agregada recibe, por cada dependencia, el dict {ticker: resultado} (o el
+    resultado único si la dependencia también es agregada) y falla si alguna
+    dependencia agregada falló.
+    """
+
+    def __init__(self, stages, store=None, run_id=None, max_workers=PIPELINE_MAX_WORKERS, profiler=None,
+                 resend=False):
+        self.stages = {s.name: s for s in stages}
+        for s in stages:
+            missing = [d for d in s.deps if d not in self.stages]
+            if missing:
+                raise ValueError(f"La etapa {s.name} depende de etapas inexistentes: {missing}")
+        self.store = store or default_store()
+        self.run_id = run_id or date.today().isoformat()
+        self.max_workers = max_workers
+        # profiling.StageProfiler opcional; sin él las etapas corren tal cual
+        self.profiler = profiler
+        # Con resend las etapas `once` se repiten si quedaron viejas (p. ej. reenviar el reporte)
+        self.resend = resend
+        self.results = {}
+        self.errors = {}
+        # Unidades recalculadas en esta corrida: invalidan los checkpoints que dependen de ellas
+        self.fresh = {}
+        self._lock = threading.Lock()
+
+    def _inputs(self, stage_, unit):
+        inputs = {}
+        for dep in stage_.deps:
+            if self.stages[dep].per_ticker:
+                results = self.results[dep]
+                inputs[dep] = results.get(unit) if unit != AGGREGATE_UNIT else dict(results)
+            else:
+                inputs[dep] = self.results[dep].get(AGGREGATE_UNIT)
+        return inputs
+
+    def _ready_units(self, stage_, tickers):
+        if not stage_.per_ticker:
+            for dep in stage_.deps:
+                if not self.stages[dep].per_ticker and AGGREGATE_UNIT not in self.results[dep]:
+                    raise StageFailed(f"falló la etapa previa {dep}")
+            return [AGGREGATE_UNIT]
+        if stage_.select is not None:
+            tickers = stage_.select(tickers)
+        units = []
+        for ticker in tickers:
+            if all(ticker in self.results[dep] for dep in stage_.deps
+                   if self.stages[dep].per_ticker):
+                units.append(ticker)
+        return units
+
+    def _stale(self, stage_, unit):
+        for dep in stage_.deps:
+            fresh = self.fresh.get(dep, ())
+            if unit in fresh or (fresh and (unit == AGGREGATE_UNIT or not self.stages[dep].per_ticker)):
+                return True
+        return False
+
+    def _run_stage(self, stage_, tickers, checkpoints):
+        self.results[stage_.name] = results = {}
+        self.fresh[stage_.name] = set()
+        units = self._ready_units(stage_, tickers)
+        pending = []
+        for unit in units:
+            key = (stage_.name, unit)
+            stale = key in checkpoints and self._stale(stage_, unit)
+            if stale and stage_.once and not self.resend:
+                print(f"⚠️ Etapa {stage_.name}: ya se hizo en la corrida {self.run_id}; sus datos cambiaron "
+                      f"pero no se repite (usar --resend para repetirla).")
+                stale = False
+            if (key in checkpoints and not stale
+                    and (stage_.check is None or stage_.check(checkpoints[key]))):
+                results[unit] = checkpoints[key]
+            else:
+                pending.append(unit)
+        resumed = len(units) - len(pending)
+        if pending:
+            print(f"▶️ Etapa {stage_.name}: {len(pending)} unidades a ejecutar"
+                  + (f", {resumed} reanudadas desde checkpoint." if resumed else "."))
+        else:
+            print(f"⏭️ Etapa {stage_.name}: completa en checkpoint ({resumed} unidades).")
+            return
+
+        saved = []
+        if stage_.batch:
+            started_at = time.perf_counter()
+            try:
+                produced = stage_.func(pending, {u: self._inputs(stage_, u) for u in pending})
+                error = None
+            except Exception as e:
+                produced, error = {}, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started_at
+            record_span(f"stage.{stage_.name}", elapsed, error=len(produced) < len(pending), items=len(pending))
+            seconds = elapsed / len(pending)
+            for unit in pending:
+                if unit in produced:
+                    results[unit] = produced[unit]
+                    saved.append((unit, "ok", produced[unit], None, seconds))
+                else:
+                    saved.append((unit, "error", None, error or "sin resultado", seconds))
+        else:
+            for unit in pending:
+                started_at = time.perf_counter()
+                with span(f"stage.{stage_.name}", unit if stage_.per_ticker else None) as current:
+                    try:
+                        inputs = self._inputs(stage_, unit)
+                        payload = stage_.func(unit, inputs) if stage_.per_ticker else stage_.func(inputs)
+                        results[unit] = payload
+                        saved.append((unit, "ok", payload, None, time.perf_counter() - started_at))
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"[:500]
+                        print(f"❌ {stage_.name}[{unit}]: {error}")
+                        current.fail()
+                        saved.append((unit, "error", None, error, time.perf_counter() - started_at))
+
+        self.store.save(self.run_id, stage_.name, saved)
+        self.fresh[stage_.name] = {unit for unit, status, *_ in saved if status == "ok"}
+        failed = [(unit, error) for unit, status, _, error, _ in saved if status != "ok"]
+        if failed:
+            with self._lock:
+                self.errors[stage_.name] = failed
+            if not stage_.per_ticker:
+                raise StageFailed(failed[0][1])
+            print(f"⚠️ Etapa {stage_.name}: {len(failed)} unidades con error "
+                  f"({', '.join(unit for unit, _ in failed[:5])}{'...' if len(failed) > 5 else ''}).")
+
+    def _run_stage_profiled(self, stage_, tickers, checkpoints):
+        with self.profiler.profile(stage_.name):
+            self._run_stage(stage_, tickers, checkpoints)
+
+    def run(self, tickers):
+        """
+        Ejecuta el DAG para `tickers`. Devuelve los resultados por etapa; las
+        etapas que fallaron (o cuyas dependencias fallaron) quedan en
+        self.errors y se reintentarán en la próxima corrida con el mismo run_id.
+        """
+        checkpoints = self.store.load(self.run_id, tickers)
+        if checkpoints:
+            print(f"♻️ Reanudando la corrida {self.run_id} ({len(checkpoints)} unidades en checkpoint).")
+        remaining = dict(self.stages)
+        done = set()
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or futures:
+                for name, stage_ in list(remaining.items()):
+                    if all(dep in done for dep in stage_.deps):
+                        blocked = [dep for dep in stage_.deps if dep in self.errors and not self.stages[dep].per_ticker]
+                        del remaining[name]
+                        if blocked:
+                            self.errors[name] = [(AGGREGATE_UNIT, f"falló la etapa previa {blocked[0]}")]
+                            self.results[name] = {}
+                            done.add(name)
+                            continue
+                        run_stage = self._run_stage
+                        if self.profiler is not None and self.profiler.wants(name):
+                            run_stage = self._run_stage_profiled
+                        futures[executor.submit(run_stage, stage_, tickers, checkpoints)] = name
+                if not futures:
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = futures.pop(future)
+                    try:
+                        future.result()
+                    except StageFailed as e:
+                        self.errors.setdefault(name, [(AGGREGATE_UNIT, str(e))])
+                        print(f"❌ Etapa {name} falló: {e}")
+                    except Exception as e:
+                        self.errors[name] = [(AGGREGATE_UNIT, f"{type(e).__name__}: {e}")]
+                        self.results.setdefault(name, {})
+                        print(f"❌ Etapa {name} falló: {e}")
+                    done.add(name)
+        if self.errors:
+            print(f"⚠️ Corrida {self.run_id} incompleta; etapas con errores: {', '.join(self.errors)}. "
+                  f"Volver a ejecutar para reanudar.")
+        return self.results
+
+###############################################
+# CLI
+###############################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["status", "reset"])
+    parser.add_argument("--run-id", default=date.today().isoformat())
+    parser.add_argument("--stage", help="Etapa a reiniciar (reset)")
+    args = parser.parse_args()
+
+    store = DBCheckpointStore()
+    if args.command == "reset":
+        if not args.stage:
+            parser.error("reset requiere --stage")
+        print(f"{store.reset(args.run_id, args.stage)} checkpoints eliminados.")
+        return
+    print(f"Corrida {args.run_id}")
+    print(f"{'etapa':<14} {'estado':<8} {'unidades':>9} {'segundos':>9}  último error")
+    for stage_name, status, count, seconds, _, error in store.summary(args.run_id):
+        print(f"{stage_name:<14} {status:<8} {count:>9} {float(seconds or 0):>9.1f}  {error or ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Perfilado bajo demanda de etapas del pipeline. Con PROFILE_STAGES (o
+`python main.py --profile news,llm`) cada etapa elegida corre envuelta en:
+
+- cpu: cProfile (<etapa>.pstats y <etapa>.txt con el top por tiempo
+  acumulado) más un muestreo de la pila del hilo de la etapa cada
+  PROFILE_SAMPLE_MS, en formato de pilas colapsadas (<etapa>.collapsed)
+  para flamegraph.pl / speedscope.
+- memory: tracemalloc, con el top de asignaciones que crecieron durante la
+  etapa (<etapa>.memory.txt), el pico y las mismas asignaciones como pilas
+  colapsadas ponderadas por bytes (<etapa>.memory.collapsed).
+
+Todo se escribe en PROFILE_DIR/<run_id>/. Si no se pidió ninguna etapa no
+se crea el perfilador y el pipeline no agrega nada a su ejecución.
+
+cProfile y el muestreo miran solo el hilo de la etapa (no los hilos que ella
+lance); tracemalloc es de todo el proceso, así que las etapas que corren en
+paralelo se ven también en la memoria de las demás.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+###############################################
+# CONFIGURACIÓN DEL PERFILADO
+###############################################
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(".cache", "profiles"))
+# Etapas separadas por coma ("all" para todas) y modos: cpu, memory
+PROFILE_STAGES = os.getenv("PROFILE_STAGES", "")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cpu")
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "40"))
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+# Profundidad de las pilas que guarda tracemalloc (más profundidad, más overhead)
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "25"))
+
+MODES = ("cpu", "memory")
+
+def _split(value):
+    return {item.strip() for item in (value or "").split(",") if item.strip()}
+
+###############################################
+# MUESTREO DE PILAS (FLAMEGRAPH)
+###############################################
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Toma la pila de un hilo cada `interval` segundos con sys._current_frames()
+    y cuenta cuántas veces aparece cada pila. Cada muestra vale `interval`.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+###############################################
+# PERFILADOR DE ETAPAS
+###############################################
+class StageProfiler:
+    def __init__(self, stages, modes=("cpu",), directory=PROFILE_DIR, top=PROFILE_TOP):
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise ValueError(f"Modos de perfilado desconocidos: {', '.join(sorted(unknown))}")
+        self.stages = set(stages)
+        self.modes = set(modes)
+        self.directory = directory
+        self.top = top
+        self._memory_lock = threading.Lock()
+        self._memory_users = 0
+
+    def wants(self, stage_name):
+        return "all" in self.stages or stage_name in self.stages
+
+    def _path(self, stage_name, suffix):
+        return os.path.join(self.directory, f"{stage_name}{suffix}")
+
+    @contextmanager
+    def _cpu(self, stage_name):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+: un solo cProfile activo por proceso (otra etapa en paralelo)
+            print(f"⚠️ No se pudo perfilar la CPU de {stage_name}: {e}")
+            yield
+            return
+        sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_MS / 1000).start()
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            sampler.stop()
+            seconds = time.perf_counter() - started_at
+            profiler.dump_stats(self._path(stage_name, ".pstats"))
+            report = io.StringIO()
+            report.write(f"Etapa {stage_name}: {seconds:.2f}s de reloj, {sum(sampler.stacks.values())} muestras "
+                         f"cada {PROFILE_SAMPLE_MS:g} ms\n\n")
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.top)
+            with open(self._path(stage_name, ".txt"), "w", encoding="utf-8") as f:
+                f.write(report.getvalue())
+            with open(self._path(stage_name, ".collapsed"), "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+
+    @contextmanager
+    def _memory(self, stage_name):
+        with self._memory_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._memory_users += 1
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            with self._memory_lock:
+                after = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                self._memory_users -= 1
+                if self._memory_users == 0:
+                    tracemalloc.stop()
+            self._write_memory(stage_name, before, after, current, peak)
+
+    def _write_memory(self, stage_name, before, after, current, peak):
+        # Fuera lo que asigna el propio perfilado (snapshots, pstats del modo cpu)
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__, all_frames=True)]
+        before, after = before.filter_traces(filters), after.filter_traces(filters)
+        by_line = after.compare_to(before, "lineno")
+        growth = sum(stat.size_diff for stat in by_line)
+        with open(self._path(stage_name, ".memory.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Etapa {stage_name}: {growth / 2**20:+.1f} MiB retenidos, pico {peak / 2**20:.1f} MiB, "
+                    f"en uso al terminar {current / 2**20:.1f} MiB\n\n")
+            for stat in by_line[:self.top]:
+                f.write(f"{stat}\n")
+        with open(self._path(stage_name, ".memory.collapsed"), "w", encoding="utf-8") as f:
+            for stat in after.compare_to(before, "traceback"):
+                if stat.size_diff <= 0:
+                    continue
+                frames = ";".join(f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                                  for frame in reversed(stat.traceback))
+                f.write(f"{frames} {stat.size_diff}\n")
+
+    @contextmanager
+    def profile(self, stage_name):
+        os.makedirs(self.directory, exist_ok=True)
+        with ExitStack() as stack:
+            if "memory" in self.modes:
+                stack.enter_context(self._memory(stage_name))
+            if "cpu" in self.modes:
+                stack.enter_context(self._cpu(stage_name))
+            yield
+        print(f"🔬 Perfil de {stage_name} en {self.directory}/ ({', '.join(sorted(self.modes))}).")
+
+
+def profiler_from_env(run_id, stages=None, modes=None):
+    """
+    Perfilador para la corrida, o None si no se pidió ninguna etapa (por
+    argumento o PROFILE_STAGES). Los modos salen de `modes` o PROFILE_MODE.
+    """
+    stages = _split(stages) if stages is not None else _split(PROFILE_STAGES)
+    if not stages:
+        return None
+    modes = _split(modes) if modes is not None else _split(PROFILE_MODE)
+    return StageProfiler(stages, modes or {"cpu"}, os.path.join(PROFILE_DIR, run_id))
@@ -0,0 +1,171 @@
+from collections import namedtuple
+from datetime import datetime
+import math
+import os
+import re
+import pandas as pd
+
+###############################################
+# CONFIGURACIÓN DEL PRESUPUESTO DE TOKENS
+###############################################
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+MAX_NEWS_PER_TICKER = int(os.getenv("PROMPT_MAX_NEWS_PER_TICKER", "3"))
+MAX_TITLE_CHARS = 110
+# Estimación conservadora cuando tiktoken no está instalado (texto en español)
+CHARS_PER_TOKEN = 3.5
+
+LEVEL_CODES = {
+    "strong buy": "CF",
+    "buy": "C",
+    "neutral": "N",
+    "sell": "V",
+    "strong sell": "VF",
+}
+LEVEL_STRENGTH = {"strong buy": 2, "buy": 1, "neutral": 0, "sell": 1, "strong sell": 2}
+
+TABLE_LEGEND = (
+    "Tabla (columnas separadas por |): ticker|global|tecnico|medias|rsi|macd|precio. "
+    "Códigos: CF=compra fuerte, C=compra, N=neutral, V=venta, VF=venta fuerte.\n"
+    "Noticias: [id] ticker fecha titular. Al citar una noticia usá su [id].\n"
+)
+
+_encoding = None
+_encoding_loaded = False
+
+###############################################
+# CONTEO DE TOKENS
+###############################################
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+def count_tokens(text):
+    """
+    Cuenta los tokens de un texto con tiktoken si está disponible; si no,
+    usa una estimación por cantidad de caracteres.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def log_token_usage(provider, prompt_tokens, completion_tokens):
+    print(f"📊 Tokens ({provider}): prompt={prompt_tokens}, completion={completion_tokens}, "
+          f"total={(prompt_tokens or 0) + (completion_tokens or 0)}")
+
+###############################################
+# CODIFICACIÓN COMPACTA DEL ANÁLISIS
+###############################################
+CompactPrompt = namedtuple("CompactPrompt", ["text", "links", "prompt_tokens", "news_included", "news_dropped"])
+
+def encode_analysis_table(df):
+    lines = ["ticker|global|tecnico|medias|rsi|macd|precio"]
+    for row in df.itertuples(index=False):
+        lines.append("|".join([
+            row.ticker,
+            LEVEL_CODES.get(row.total_summary, row.total_summary),
+            LEVEL_CODES.get(row.technical_indicators_summary, row.technical_indicators_summary),
+            LEVEL_CODES.get(row.moving_averages_summary, row.moving_averages_summary),
+            LEVEL_CODES.get(row.rsi_action, row.rsi_action),
+            LEVEL_CODES.get(row.macd_action, row.macd_action),
+            f"{float(row.price):.2f}",
+        ]))
+    return "\n".join(lines)
+
+def rank_news(df, news_by_ticker, max_per_ticker=MAX_NEWS_PER_TICKER):
+    """
+    Ordena las noticias por relevancia: primero las de tickers con señales
+    más fuertes, luego las más recientes. Descarta links repetidos.
+    """
+    strength = {row.ticker: LEVEL_STRENGTH.get(row.total_summary, 0) for row in df.itertuples(index=False)}
+    now = datetime.now()
+    candidates = []
+    seen_links = set()
+    for ticker, news in news_by_ticker.items():
+        for position, item in enumerate(news[:max_per_ticker]):
+            if item["link"] in seen_links:
+                continue
+            seen_links.add(item["link"])
+            published = pd.to_datetime(item["published_at"])
+            age_days = (now - published.to_pydatetime().replace(tzinfo=None)).days if pd.notna(published) else 365
+            candidates.append((-strength.get(ticker, 0), age_days, position, ticker, item))
+    candidates.sort(key=lambda c: c[:3])
+    return [(ticker, item) for *_, ticker, item in candidates]
+
+def encode_news_line(news_id, ticker, item):
+    title = item["title"]
+    if len(title) > MAX_TITLE_CHARS:
+        title = title[:MAX_TITLE_CHARS - 1].rstrip() + "…"
+    published = pd.to_datetime(item["published_at"])
+    date_text = published.strftime('%m-%d') if pd.notna(published) else "--"
+    return f"[{news_id}] {ticker} {date_text} {title}"
+
+def build_compact_prompt(df, news_by_ticker, template, token_budget=None, id_prefix="N"):
+    """
+    Arma el prompt con el análisis en formato de tabla y las noticias sin URLs,
+    agregando noticias por orden de relevancia hasta agotar el presupuesto de
+    tokens. Las URLs quedan en `links` para volver a adjuntarlas después.
+    """
+    token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+    table = encode_analysis_table(df)
+    data_block = TABLE_LEGEND + table + "\n"
+    used = count_tokens(template(data_block + "Noticias:\n"))
+    if used > token_budget:
+        print(f"⚠️ La tabla de análisis ocupa {used} tokens y supera el presupuesto de {token_budget}.")
+
+    news_lines = []
+    links = {}
+    ranked = rank_news(df, news_by_ticker)
+    for ticker, item in ranked:
+        news_id = f"{id_prefix}{len(news_lines) + 1}"
+        line = encode_news_line(news_id, ticker, item)
+        line_tokens = count_tokens(line + "\n")
+        if used + line_tokens > token_budget:
+            break
+        news_lines.append(line)
+        links[news_id] = (item["title"], item["link"])
+        used += line_tokens
+
+    text = template(data_block + "Noticias:\n" + "\n".join(news_lines) + "\n")
+    prompt_tokens = count_tokens(text)
+    dropped = len(ranked) - len(news_lines)
+    print(f"📝 Prompt compacto: {prompt_tokens} tokens (presupuesto {token_budget}), "
+          f"{len(news_lines)} noticias incluidas, {dropped} descartadas.")
+    return CompactPrompt(text, links, prompt_tokens, len(news_lines), dropped)
+
+###############################################
+# REINSERCIÓN DE LINKS EN LA RESPUESTA DEL LLM
+###############################################
+NEWS_REFERENCE_RE = re.compile(r"\[([A-Z]{1,2}\d+)\]")
+
+def find_references(text):
+    return set(NEWS_REFERENCE_RE.findall(text))
+
+def sources_section(links, referenced):
+    """
+    Devuelve las líneas de la sección de fuentes con las URLs de las
+    noticias citadas por el modelo, en el orden en que fueron numeradas.
+    """
+    cited = [news_id for news_id in links if news_id in referenced]
+    if not cited:
+        return []
+    lines = ["#### Fuentes"]
+    for news_id in cited:
+        title, link = links[news_id]
+        lines.append(f"- [{news_id}] {title} - {link}")
+    return lines
+
+def reattach_links(text, links):
+    lines = sources_section(links, find_references(text))
+    if not lines:
+        return text
+    return text + "\n\n" + "\n".join(lines)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Proveedores de datos externos intercambiables. Los precios salen de
+PRICE_PROVIDER:
+
+- yfinance (por defecto): descarga real.
+- synthetic: velas determinísticas generadas a partir del ticker, sin red.
+- recorded: CSVs por ticker en PRICE_RECORDED_DIR, grabados antes con
+  `python providers.py record AAPL MSFT ...` (o con --all).
+
+Las noticias se piden a NEWS_URL_TEMPLATE y DeepSeek a DEEPSEEK_BASE_URL
+(llm_providers.py), así una corrida puede apuntar a los servicios locales
+de fake_services.py; el correo ya se configura con SMTP_SERVER/SMTP_PORT.
+"""
+import argparse
+import functools
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+from datetime import date, timedelta
+
+###############################################
+# CONFIGURACIÓN DE PROVEEDORES
+###############################################
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "yfinance")
+PRICE_RECORDED_DIR = os.getenv("PRICE_RECORDED_DIR", os.path.join(".cache", "recorded_prices"))
+# Último día de las velas sintéticas (AAAA-MM-DD); por defecto, hoy
+SYNTHETIC_PRICES_END = os.getenv("SYNTHETIC_PRICES_END")
+NEWS_URL_TEMPLATE = os.getenv("NEWS_URL_TEMPLATE", "https://finance.yahoo.com/quote/{ticker}/news")
+
+PERIOD_DAYS = {"1mo": 31, "3mo": 92, "6mo": 183, "1y": 366, "2y": 731, "5y": 1827}
+INTERVAL_SECONDS = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600}
+# Historia intradiaria que se pide al arrancar (yfinance guarda 7 días de velas de 1m)
+INTRADAY_HISTORY_PERIOD = {"1m": "1d", "2m": "5d", "5m": "5d", "15m": "5d", "30m": "1mo", "60m": "1mo"}
+INTRADAY_HISTORY_BARS = int(os.getenv("INTRADAY_HISTORY_BARS", "390"))
+
+# Velas intradiarias de varios tickers alineadas por tiempo: times son segundos
+# epoch UTC (T,) y cada campo una matriz (T, len(tickers)) con NaN donde no hay vela.
+IntradayBars = namedtuple("IntradayBars", ["times", "tickers", "open", "high", "low", "close", "volume"])
+
+def _date_range(period=None, start=None, end=None):
+    end = date.fromisoformat(end) if end else date.today()
+    if start:
+        return date.fromisoformat(str(start)[:10]), end
+    return end - timedelta(days=PERIOD_DAYS.get(period or "1y", 366)), end
+
+###############################################
+# PRECIOS
+###############################################
+class YFinancePrices:
+    name = "yfinance"
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        import yfinance as yf
+
+        if period is None and start is None:
+            period = "1y"
+        data = yf.download(list(tickers), interval="1d", group_by="ticker", progress=False,
+                           period=period, start=start, **kwargs)
+        if data.empty:
+            return {}
+        frames = {}
+        for ticker in tickers:
+            if ticker in data.columns.get_level_values(0):
+                frames[ticker] = data[ticker].dropna(how="all")
+        return frames
+
+    def intraday(self, tickers, interval="1m", since=None, until=None):
+        """
+        Velas de `interval` posteriores a `since` (segundos epoch) y cerradas
+        antes de `until`; sin `since`, la historia de INTRADAY_HISTORY_PERIOD.
+        """
+        import numpy as np
+        import pandas as pd
+        import yfinance as yf
+
+        tickers = list(tickers)
+        kwargs = {"start": pd.Timestamp(since, unit="s", tz="UTC")} if since else \
+            {"period": INTRADAY_HISTORY_PERIOD.get(interval, "1d")}
+        data = yf.download(tickers, interval=interval, group_by="column", progress=False, **kwargs)
+        if data.empty:
+            empty = np.empty((0, len(tickers)))
+            return IntradayBars(np.empty(0, dtype=np.int64), tickers, empty, empty, empty, empty, empty)
+        index = data.index.tz_convert("UTC") if data.index.tz is not None else data.index.tz_localize("UTC")
+        times = index.as_unit("s").asi8
+        step = INTERVAL_SECONDS[interval]
+        keep = (times + step <= (until or time.time()))
+        if since:
+            keep &= times > since
+        fields = [data[field].reindex(columns=tickers).to_numpy(dtype=float)[keep]
+                  for field in ("Open", "High", "Low", "Close", "Volume")]
+        return IntradayBars(times[keep], tickers, *fields)
+
+
+@functools.lru_cache(maxsize=8)
+def _business_days(last_day):
+    # La serie arranca siempre en la misma fecha para que un pedido incremental
+    # (start=...) devuelva las mismas velas que el año completo. bdate_range es
+    # lento y el índice es el mismo para todos los tickers: se arma una vez.
+    import pandas as pd
+
+    return pd.bdate_range(date(2000, 1, 3), last_day)
+
+
+class SyntheticPrices:
+    """
+    Paseo aleatorio geométrico por ticker con semilla fija (crc32 del
+    símbolo): el mismo ticker da siempre las mismas velas para la misma
+    fecha, sin importar el orden ni el tamaño del lote.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, end=SYNTHETIC_PRICES_END):
+        self.end = end
+
+    def frame(self, ticker, first_day, last_day):
+        import numpy as np
+        import pandas as pd
+
+        index = _business_days(last_day)
+        rng = np.random.default_rng(zlib.crc32(ticker.encode("utf-8")))
+        days = len(index)
+        base = 5 + (zlib.crc32(ticker[::-1].encode("utf-8")) % 500)
+        close = base * np.exp(np.cumsum(rng.normal(0.0002, 0.02, days)))
+        spread = np.abs(rng.normal(0, 0.01, days)) * close
+        frame = pd.DataFrame({
+            "Open": close * (1 + rng.normal(0, 0.005, days)),
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(10_000, 5_000_000, days),
+        }, index=index)
+        frame.index.name = "Date"
+        return frame[frame.index >= pd.Timestamp(first_day)]
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        first_day, last_day = _date_range(period, start, self.end)
+        return {ticker: self.frame(ticker, first_day, last_day) for ticker in tickers}
+
+    def intraday(self, tickers, interval="1m", since=None, until=None):
+        """
+        Velas intradiarias sin estado: cada precio es una función del ticker
+        y del minuto (dos ondas con fase por ticker más ruido por hash), así
+        que cualquier ventana se genera vectorizada y es reproducible.
+        """
+        import numpy as np
+
+        tickers = list(tickers)
+        step = INTERVAL_SECONDS[interval]
+        last = int((until or time.time()) // step) * step - step
+        first = since + step if since else last - (INTRADAY_HISTORY_BARS - 1) * step
+        first = -(-first // step) * step
+        times = np.arange(first, last + 1, step, dtype=np.int64)
+        seeds = np.array([zlib.crc32(t.encode("utf-8")) for t in tickers], dtype=np.uint64)
+        close = _synthetic_path(seeds, times // step)
+        open_ = _synthetic_path(seeds, times // step - 1)
+        spread = close * 0.0015 * _hash_uniform(seeds, times // step, 1)
+        volume = 1_000 + np.floor(50_000 * _hash_uniform(seeds, times // step, 2))
+        return IntradayBars(times, tickers, open_, np.maximum(open_, close) + spread,
+                            np.minimum(open_, close) - spread, close, volume)
+
+
+def _hash_uniform(seeds, steps, salt):
+    # Uniforme [0, 1) a partir de (ticker, paso) con un hash entero (splitmix64)
+    import numpy as np
+
+    with np.errstate(over="ignore"):
+        h = (steps.astype(np.uint64)[:, None] * np.uint64(0x9E3779B97F4A7C15)) ^ (seeds[None, :] + np.uint64(salt))
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+
+def _synthetic_path(seeds, steps):
+    import numpy as np
+
+    base = 5.0 + (seeds % np.uint64(500)).astype(np.float64)
+    period = 60.0 + (seeds % np.uint64(240)).astype(np.float64)
+    phase = (seeds % np.uint64(997)).astype(np.float64) / 997 * 2 * np.pi
+    x = steps.astype(np.float64)[:, None]
+    wave = 0.02 * np.sin(2 * np.pi * x / period + phase) + 0.006 * np.sin(2 * np.pi * x * 7 / period + 2 * phase)
+    return base * (1 + wave + 0.002 * (2 * _hash_uniform(seeds, steps, 0) - 1))
+
+
+class RecordedPrices:
+    """Velas grabadas en <directorio>/<ticker>.csv; los tickers sin archivo se omiten."""
+
+    name = "recorded"
+
+    def __init__(self, directory=PRICE_RECORDED_DIR):
+        self.directory = directory
+
+    def path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.csv")
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        import pandas as pd
+
+        first_day, _ = _date_range(period, start)
+        frames = {}
+        for ticker in tickers:
+            if not os.path.exists(self.path(ticker)):
+                continue
+            frame = pd.read_csv(self.path(ticker), index_col=0, parse_dates=True)
+            if start is not None or period is not None:
+                frame = frame[frame.index >= pd.Timestamp(first_day)]
+            frames[ticker] = frame
+        return frames
+
+    def record(self, tickers, source=None, period="1y"):
+        os.makedirs(self.directory, exist_ok=True)
+        frames = (source or YFinancePrices()).download(tickers, period=period)
+        for ticker, frame in frames.items():
+            frame.to_csv(self.path(ticker))
+        return len(frames)
+
+
+PRICE_PROVIDERS = {"yfinance": YFinancePrices, "synthetic": SyntheticPrices, "recorded": RecordedPrices}
+
+_price_provider = None
+_price_provider_lock = threading.Lock()
+
+def get_price_provider():
+    global _price_provider
+    with _price_provider_lock:
+        if _price_provider is None:
+            if PRICE_PROVIDER not in PRICE_PROVIDERS:
+                raise ValueError(f"PRICE_PROVIDER desconocido: {PRICE_PROVIDER}")
+            _price_provider = PRICE_PROVIDERS[PRICE_PROVIDER]()
+        return _price_provider
+
+def news_url(ticker):
+    return NEWS_URL_TEMPLATE.format(ticker=ticker)
+
+###############################################
+# CLI
+###############################################
+def main():
+    parser = argparse.ArgumentParser(description="Grabar precios de yfinance para PRICE_PROVIDER=recorded")
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("tickers", nargs="*")
+    parser.add_argument("--all", action="store_true", help="Grabar todo el universo (UNIVERSE_SOURCE)")
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--dir", default=PRICE_RECORDED_DIR)
+    args = parser.parse_args()
+    tickers = args.tickers
+    if args.all:
+        from tickers import get_universe
+
+        tickers = get_universe().tickers
+    if not tickers:
+        parser.error("indicar tickers o --all")
+    count = RecordedPrices(args.dir).record(tickers, period=args.period)
+    print(f"{count}/{len(tickers)} tickers grabados en {args.dir}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from llm_providers import STREAMING_PROVIDERS, complete_with_fallback
+from llm_telemetry import record_llm_call
+from prompt_builder import build_compact_prompt, log_token_usage, reattach_links
+
+###############################################
+# CONFIGURACIÓN DE REPORTES POR REGIÓN
+###############################################
+REGION_TITLES = {
+    "usa": "Mercado de USA",
+    "argentina": "Mercado de Argentina",
+    "crypto": "Criptomonedas",
+}
+# Prefijo de los ids de noticias para que no choquen entre secciones
+REGION_NEWS_PREFIX = {"usa": "U", "argentina": "A", "crypto": "C"}
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(".cache", "report_sections"))
+REGION_TOKEN_BUDGET = int(os.getenv("REGION_TOKEN_BUDGET", "3000"))
+REPORT_MAX_WORKERS = int(os.getenv("REPORT_MAX_WORKERS", "3"))
+REPORT_MERGE = os.getenv("REPORT_MERGE", "template")
+
+BUY_LEVELS = ("buy", "strong buy")
+SELL_LEVELS = ("sell", "strong sell")
+
+def section_prompt_template(title):
+    def template(data_block):
+        return (
+            f"Con base en los siguientes datos diarios del {title}, "
+            "genera la sección del reporte para ese mercado, que incluya:\n"
+            " - El estado general de ese mercado.\n"
+            " - Recomendaciones claras de compra y venta para el día.\n"
+            " - Análisis de tendencias y factores técnicos (incluyendo indicadores, medias móviles, RSI, MACD, etc.).\n"
+            " - Si no hay buenas señales de compra o de venta para ese dia, aclararlo.\n"
+            f"Comenzá la sección con el título '### {title}' y usá '####' para los subtítulos.\n"
+            "Datos:\n" + data_block +
+            "\nLa sección debe ser concisa, clara y útil para tomar decisiones de inversión diaria."
+        )
+    return template
+
+###############################################
+# CACHÉ DE SECCIONES EN DISCO
+###############################################
+def section_cache_key(region, prompt, providers):
+    digest = hashlib.sha256()
+    digest.update(region.encode("utf-8"))
+    digest.update(",".join(p.model for p in providers).encode("utf-8"))
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cached_section(region, key):
+    path = os.path.join(REPORT_CACHE_DIR, f"{region}-{key}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer la caché de {region}: {e}")
+        return None
+
+def store_cached_section(region, key, section):
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    # Solo se conserva la última versión de cada región
+    for name in os.listdir(REPORT_CACHE_DIR):
+        if name.startswith(f"{region}-") and name != f"{region}-{key}.json":
+            os.remove(os.path.join(REPORT_CACHE_DIR, name))
+    path = os.path.join(REPORT_CACHE_DIR, f"{region}-{key}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(section, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+###############################################
+# GENERACIÓN CONCURRENTE DE SECCIONES
+###############################################
+def generate_section(region, prompt, providers=None):
+    """
+    Genera (o recupera de la caché) la sección de una región. La clave de la
+    caché es el hash del prompt, así que solo se regenera si cambian sus datos.
+    """
+    providers = providers or STREAMING_PROVIDERS
+    key = section_cache_key(region, prompt.text, providers)
+    cached = load_cached_section(region, key)
+    if cached is not None:
+        print(f"♻️ Sección {region} recuperada de la caché.")
+        record_llm_call(cached.get("provider", "cache"), cached.get("model", ""), prompt.text,
+                        prompt_tokens=prompt.prompt_tokens, cache_hit=True, purpose=f"seccion:{region}")
+        return cached
+    print(f"🤖 Generando sección {region}...")
+    text, provider, stats = complete_with_fallback(prompt.text, providers, purpose=f"seccion:{region}")
+    log_token_usage(f"{provider.name}/{region}", prompt.prompt_tokens, stats.completion_tokens)
+    section = {
+        "region": region,
+        "text": reattach_links(text.strip(), prompt.links),
+        "label": provider.label,
+        "provider": provider.name,
+        "model": provider.model,
+    }
+    store_cached_section(region, key, section)
+    return section
+
+def summarize_signals(df, tickers):
+    region_df = df[df['ticker'].isin(tickers)]
+    buys = int(region_df['total_summary'].isin(BUY_LEVELS).sum())
+    sells = int(region_df['total_summary'].isin(SELL_LEVELS).sum())
+    neutral = len(region_df) - buys - sells
+    return buys, sells, neutral
+
+def generate_merge_summary(sections, providers=None):
+    """
+    Pide al LLM un resumen breve del estado general a partir de las secciones
+    ya generadas. También se cachea por contenido.
+    """
+    providers = providers or STREAMING_PROVIDERS
+    joined = "\n\n".join(section["text"] for section in sections)
+    prompt = (
+        "A partir de las siguientes secciones de un reporte diario de mercados, "
+        "escribe un resumen del estado general del mercado en no más de cinco viñetas "
+        "que empiecen con '- '. No repitas las recomendaciones individuales.\n\n" + joined
+    )
+    key = section_cache_key("resumen", prompt, providers)
+    cached = load_cached_section("resumen", key)
+    if cached is not None:
+        record_llm_call(cached.get("provider", "cache"), cached.get("model", ""), prompt,
+                        cache_hit=True, purpose="resumen")
+        return cached["text"]
+    text, provider, _ = complete_with_fallback(prompt, providers, purpose="resumen")
+    store_cached_section("resumen", key, {"region": "resumen", "text": text.strip(), "label": provider.label,
+                                          "provider": provider.name, "model": provider.model})
+    return text.strip()
+
+def merge_sections(df, regions, sections, summary=None):
+    lines = ["### Estado general del mercado"]
+    if summary:
+        lines.append(summary)
+    for region, tickers in regions.items():
+        buys, sells, neutral = summarize_signals(df, tickers)
+        lines.append(f"- **{REGION_TITLES.get(region, region)}:** {buys} señales de compra, "
+                     f"{sells} de venta y {neutral} neutrales.")
+    labels = []
+    for region in regions:
+        section = sections.get(region)
+        lines.append("")
+        if section is None:
+            lines.append(f"### {REGION_TITLES.get(region, region)}")
+            lines.append("No se pudo generar la sección para este mercado.")
+            continue
+        lines.append(section["text"])
+        if section["label"] not in labels:
+            labels.append(section["label"])
+    return "\n".join(lines) + f"\n\n(Generado con {', '.join(labels)})"
+
+def generate_regional_report(df, regions, news_by_ticker):
+    """
+    Genera una sección por región en paralelo (USA, Argentina, cripto) y las
+    une con una plantilla determinística, o con un resumen breve del LLM si
+    REPORT_MERGE=llm.
+    """
+    prompts = {}
+    for region, tickers in regions.items():
+        region_df = df[df['ticker'].isin(tickers)]
+        if region_df.empty:
+            print(f"No hay datos de análisis para la región {region}.")
+            continue
+        region_news = {ticker: news_by_ticker.get(ticker, []) for ticker in tickers}
+        prompts[region] = build_compact_prompt(
+            region_df, region_news, section_prompt_template(REGION_TITLES.get(region, region)),
+            token_budget=REGION_TOKEN_BUDGET, id_prefix=REGION_NEWS_PREFIX.get(region, "N")
+        )
+
+    sections = {}
+    with ThreadPoolExecutor(max_workers=REPORT_MAX_WORKERS) as executor:
+        futures = {
+            region: executor.submit(generate_section, region, prompt)
+            for region, prompt in prompts.items()
+        }
+        for region, future in futures.items():
+            try:
+                sections[region] = future.result()
+            except Exception as e:
+                print(f"Error al generar la sección {region}: {e}")
+
+    if not sections:
+        raise RuntimeError("No se pudo generar ninguna sección del reporte")
+
+    summary = None
+    if REPORT_MERGE == "llm":
+        try:
+            summary = generate_merge_summary([sections[r] for r in regions if r in sections])
+        except Exception as e:
+            print(f"Error al generar el resumen general: {e}")
+    return merge_sections(df, regions, sections, summary)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+import os
+import time
+import pandas as pd
+from db import get_engine
+from llm_providers import DEEPSEEK_BASE_URL, SYSTEM_PROMPT, STREAMING_PROVIDERS, StreamStats, iter_lines
+from report_pdf import PDFReportWriter, create_pdf_report
+from prompt_builder import (build_compact_prompt, count_tokens, find_references, log_token_usage,
+                            reattach_links, sources_section)
+from regional_reports import generate_regional_report
+from llm_telemetry import flush_telemetry, record_llm_call, record_stream
+from metrics import timed
+from tickers import group_tickers
+
+###############################################
+# FUNCIONES PARA GENERAR REPORTE DIARIO
+###############################################
+def fetch_stock_analysis_for_today():
+    query = """
+    SELECT ticker, analysis_date, total_summary, technical_indicators_summary, 
+           moving_averages_summary, rsi_action, macd_action, price
+    FROM stock_analysis
+    WHERE analysis_date::date = %s
+    ORDER BY ticker;
+    """
+    today = date.today()
+    df = pd.read_sql(query, get_engine(), params=(today,))
+    return df
+
+def fetch_latest_news(ticker, limit=5):
+    query = """
+    SELECT title, link, published_at
+    FROM news
+    WHERE ticker = %s
+    ORDER BY published_at DESC
+    LIMIT %s;
+    """
+    with get_engine().connect() as conn:
+        news_df = pd.read_sql(query, conn, params=(ticker, limit))
+    return news_df
+
+def fetch_latest_news_by_ticker(tickers, limit=5):
+    """
+    Obtiene las últimas 'limit' noticias de todos los tickers en una sola consulta.
+    """
+    query = """
+    SELECT ticker, title, link, published_at
+    FROM (
+        SELECT ticker, title, link, published_at,
+               ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY published_at DESC) AS rn
+        FROM news
+        WHERE ticker = ANY(%s)
+    ) ranked
+    WHERE rn <= %s
+    ORDER BY ticker, published_at DESC;
+    """
+    with get_engine().connect() as conn:
+        news_df = pd.read_sql(query, conn, params=(list(tickers), limit))
+    news_by_ticker = {ticker: [] for ticker in tickers}
+    for row in news_df.itertuples(index=False):
+        news_by_ticker[row.ticker].append(
+            {"title": row.title, "link": row.link, "published_at": row.published_at}
+        )
+    return news_by_ticker
+
+def generate_daily_report_text(df):
+    report = "Reporte Diario de Mercados\n"
+    report += f"Fecha: {datetime.now().strftime('%Y-%m-%d')}\n\n"
+    report += "Resumen de Análisis:\n"
+    for _, row in df.iterrows():
+        ticker = row['ticker']
+        report += f"- {ticker}:\n"
+        report += f"   Recomendación Global: {row['total_summary']} " \
+                  f"(Técnico: {row['technical_indicators_summary']}, " \
+                  f"Medias: {row['moving_averages_summary']}).\n"
+        report += f"   RSI: {row['rsi_action']}, MACD: {row['macd_action']}. Precio: {row['price']}\n"
+        news_df = fetch_latest_news(ticker, limit=5)
+        if not news_df.empty:
+            report += "   Últimas Noticias:\n"
+            for _, news in news_df.iterrows():
+                published = pd.to_datetime(news['published_at']).strftime('%Y-%m-%d')
+                report += f"      * {news['title']} - {news['link']} (Publicado: {published})\n"
+        else:
+            report += "   No se encontraron noticias recientes.\n"
+        report += "\n"
+    return report
+
+def build_report_prompt(base_report):
+    return (
+        "Con base en los siguientes datos diarios, "
+        "genera un reporte que incluya:\n"
+        " - El estado general del mercado.\n"
+        " - Recomendaciones claras de compra y venta para el día.\n"
+        " - Análisis de tendencias y factores técnicos (incluyendo indicadores, medias móviles, RSI, MACD, etc.).\n"
+        " - Para estos items, hacer una seccion del mercado de USA, otra seccion para el mercado de Argentina y otra para cripto. Si no hay buenas señales de compra o de venta para ese dia, aclararlo.\n"
+        "Datos:\n" + base_report +
+        "\nEl reporte debe ser conciso, claro y útil para tomar decisiones de inversión diaria."
+    )
+
+def save_prompt(prompt, filename="prompt.txt"):
+    # Guardar el contenido de prompt en un archivo de texto
+    with open(filename, "w") as file:
+        file.write(prompt)
+
+def build_daily_prompt(df, news_by_ticker=None):
+    """
+    Devuelve el prompt del día y el mapa de links de noticias a reinsertar.
+    Por defecto usa el formato compacto con presupuesto de tokens;
+    PROMPT_FORMAT=verbose mantiene el texto completo con URLs.
+    """
+    if os.getenv("PROMPT_FORMAT", "compact") == "verbose":
+        prompt = build_report_prompt(generate_daily_report_text(df))
+        print(f"📝 Prompt detallado: {count_tokens(prompt)} tokens.")
+        return prompt, {}
+    if news_by_ticker is None:
+        news_by_ticker = fetch_latest_news_by_ticker(df['ticker'].tolist(), limit=5)
+    compact = build_compact_prompt(df, news_by_ticker, build_report_prompt)
+    return compact.text, compact.links
+
+@timed("generate_final_report")
+def generate_final_report(df, news_by_ticker=None):
+    prompt, links = build_daily_prompt(df, news_by_ticker)
+    save_prompt(prompt)
+
+    import openai
+    from openai import OpenAI
+
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    client = OpenAI(api_key=api_key, base_url=DEEPSEEK_BASE_URL)
+    started_at = time.perf_counter()
+    fallback_reason = None
+
+    try:
+        response = client.chat.completions.create(
+            model="deepseek-chat",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            stream=False
+        )
+
+        if not response:
+            raise ValueError("Respuesta de OpenAI vacía o None")
+        
+        usage = response.usage
+        prompt_tokens = usage.prompt_tokens if usage else count_tokens(prompt)
+        completion_tokens = usage.completion_tokens if usage else None
+        log_token_usage("deepseek", prompt_tokens, completion_tokens)
+        record_llm_call("deepseek", "deepseek-chat", prompt, prompt_tokens, completion_tokens,
+                        latency=time.perf_counter() - started_at)
+        final_report = reattach_links(response.choices[0].message.content, links)
+        return final_report + "\n\n(Generado con Deepseek AI)"
+    except openai.APIConnectionError as e:
+        print("The server could not be reached")
+        print(e.__cause__)  # an underlying Exception, likely raised within httpx.
+        fallback_reason = f"deepseek: APIConnectionError: {e.__cause__}"
+    except openai.RateLimitError:
+        print("A 429 status code was received; we should back off a bit.")
+        fallback_reason = "deepseek: RateLimitError"
+    except openai.APIStatusError as e:
+        print("Another non-200-range status code was received")
+        print(e.status_code)
+        print(e.response)
+        fallback_reason = f"deepseek: APIStatusError {e.status_code}"
+    except ValueError as e:
+        print(f"Error de validación: {e}")
+        fallback_reason = f"deepseek: {e}"
+    except Exception as e:
+        print(f"Error inesperado: {e}")
+        fallback_reason = f"deepseek: {type(e).__name__}: {e}"[:200]
+
+    record_llm_call("deepseek", "deepseek-chat", prompt, count_tokens(prompt),
+                    latency=time.perf_counter() - started_at, status="error")
+    return generate_with_gemini(prompt, links, fallback_reason)
+    
+def generate_with_gemini(prompt, links=None, fallback_reason=None):
+    from google import genai
+
+    api_key = os.getenv("GEMINI_KEY")
+    client = genai.Client(api_key=api_key)
+    started_at = time.perf_counter()
+    response = client.models.generate_content(
+        model="gemini-2.0-flash", contents=SYSTEM_PROMPT + prompt
+    )
+    usage = response.usage_metadata
+    prompt_tokens = usage.prompt_token_count if usage else count_tokens(prompt)
+    completion_tokens = usage.candidates_token_count if usage else None
+    log_token_usage("gemini", prompt_tokens, completion_tokens)
+    record_llm_call("gemini", "gemini-2.0-flash", prompt, prompt_tokens, completion_tokens,
+                    latency=time.perf_counter() - started_at, fallback_reason=fallback_reason)
+    return reattach_links(response.text, links or {}) + "\n\n(Generado con Gemini AI)"
+
+def generate_report_pdf_streaming(df, output_filename="reporte_diario.pdf", news_by_ticker=None):
+    return stream_report_pdf(df, output_filename, news_by_ticker)[0]
+
+def stream_report_pdf(df, output_filename="reporte_diario.pdf", news_by_ticker=None):
+    """
+    Genera el reporte con el LLM en modo streaming y va renderizando el PDF
+    línea por línea a medida que llegan los tokens, en lugar de esperar la
+    respuesta completa. Si un proveedor falla se descarta el PDF parcial y
+    se reintenta con el siguiente. Devuelve la ruta del PDF y el texto
+    recibido (para el checkpoint de la etapa llm).
+    """
+    prompt, links = build_daily_prompt(df, news_by_ticker)
+    save_prompt(prompt)
+    prompt_tokens = count_tokens(prompt)
+
+    fallback_reason = None
+    for provider in STREAMING_PROVIDERS:
+        print(f"🤖 Generando reporte en streaming con {provider.label}...")
+        writer = PDFReportWriter()
+        stats = StreamStats(provider.name, provider.model)
+        referenced = set()
+        lines = []
+        try:
+            for line in iter_lines(stats.track(provider.stream(prompt))):
+                referenced |= find_references(line)
+                writer.add_line(line)
+                lines.append(line)
+        except Exception as e:
+            print(f"Error en streaming con {provider.label}: {e}")
+            record_stream(stats, prompt, prompt_tokens, "error", fallback_reason)
+            fallback_reason = f"{provider.name}: {type(e).__name__}: {e}"[:200]
+            continue
+        if stats.first_token_at is None:
+            print(f"Respuesta vacía de {provider.label}")
+            record_stream(stats, prompt, prompt_tokens, "empty", fallback_reason)
+            fallback_reason = f"{provider.name}: respuesta vacía"
+            continue
+        print(f"⏱️ {stats.summary()}")
+        log_token_usage(provider.name, prompt_tokens, stats.completion_tokens)
+        record_stream(stats, prompt, prompt_tokens, "ok", fallback_reason)
+        tail = list(sources_section(links, referenced)) + ["", f"(Generado con {provider.label})"]
+        for line in tail:
+            writer.add_line(line)
+        lines.extend(tail)
+        return writer.save(output_filename), "\n".join(lines)
+
+    raise RuntimeError("Ningún proveedor de LLM pudo generar el reporte")
+
+
+###############################################
+# ARMADO UNIFICADO DE LOS REPORTES (TEXTO + GRÁFICOS)
+###############################################
+def news_from_run(news_lists, limit=5):
+    """
+    Convierte las noticias obtenidas en esta corrida (tuplas de get_news_yahoo)
+    al formato por ticker que usa el generador de prompts.
+    """
+    news_by_ticker = {}
+    for news in news_lists:
+        for ticker, title, link, published_at in news:
+            news_by_ticker.setdefault(ticker, []).append(
+                {"title": title, "link": link, "published_at": published_at}
+            )
+    for ticker, items in news_by_ticker.items():
+        items.sort(key=lambda item: pd.Timestamp(item["published_at"]), reverse=True)
+        del items[limit:]
+    return news_by_ticker
+
+@timed("generate_report_text")
+def generate_report_text(df, news_by_ticker=None, regions=None):
+    """
+    Texto completo del reporte (markdown) con el LLM, sin renderizarlo. Lo
+    usa la etapa llm del pipeline para guardarlo en checkpoint; con REPORT_MODE
+    "streaming" la etapa llm usa stream_report_pdf, que arma el PDF mientras llega el texto.
+    """
+    try:
+        if os.getenv("REPORT_MODE", "regional") == "regional":
+            if news_by_ticker is None:
+                news_by_ticker = fetch_latest_news_by_ticker(df['ticker'].tolist(), limit=5)
+            return generate_regional_report(df, regions or group_tickers(df["ticker"]), news_by_ticker)
+        return generate_final_report(df, news_by_ticker)
+    finally:
+        flush_telemetry()
+
+def generate_text_report_pdf(df, news_by_ticker=None, regions=None, output_filename="reporte_diario.pdf"):
+    # REPORT_MODE: "regional" (secciones en paralelo), "streaming" o "single"
+    if os.getenv("REPORT_MODE", "regional") == "streaming":
+        try:
+            return generate_report_pdf_streaming(df, output_filename, news_by_ticker)
+        finally:
+            flush_telemetry()
+    return create_pdf_report(generate_report_text(df, news_by_ticker, regions), output_filename)
+
+def generate_charts_pdf(price_frames, output_filename="stock_analysis.pdf"):
+    from charts import build_charts_pdf, compute_chart_series
+    from chart_cache import render_charts_cached
+
+    items = [(ticker, compute_chart_series(data)) for ticker, data in price_frames.items() if not data.empty]
+    if not items:
+        print("No hay datos de precios para generar gráficos.")
+        return None
+    return build_charts_pdf(render_charts_cached(items), output_filename)
+
+def download_price_frames(tickers, **download_kwargs):
+    """
+    Descarga precios diarios de varios tickers en una sola llamada al
+    proveedor de PRICE_PROVIDER (por defecto yfinance, un año). Lo usan el
+    armado sin datos de la corrida actual y la caché de precios del modo
+    daemon, que pasa `start` para bajar solo las ruedas nuevas.
+    """
+    from providers import get_price_provider
+
+    return get_price_provider().download(list(tickers), **download_kwargs)
+
+def build_reports(df, price_frames=None, news_by_ticker=None, regions=None,
+                  text_filename="reporte_diario.pdf", charts_filename="stock_analysis.pdf"):
+    """
+    Punto de entrada único para armar el PDF de texto del LLM y el PDF de
+    gráficos con los datos en memoria de la corrida actual. Los gráficos se
+    renderizan mientras se espera la respuesta del LLM. Si no se pasan
+    precios se descargan; si no se pasan noticias se leen de la DB.
+    """
+    charts_enabled = os.getenv("CHART_REPORT", "1") == "1"
+    if charts_enabled and price_frames is None:
+        price_frames = download_price_frames(df['ticker'].tolist())
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        charts_future = executor.submit(generate_charts_pdf, price_frames, charts_filename) if charts_enabled else None
+        text_pdf = generate_text_report_pdf(df, news_by_ticker, regions, text_filename)
+        charts_pdf = None
+        if charts_future is not None:
+            try:
+                charts_pdf = charts_future.result()
+            except Exception as e:
+                print(f"Error al generar el PDF de gráficos: {e}")
+    return [path for path in (text_pdf, charts_pdf) if path]
+
+def main():
+    # Uso independiente: lee el análisis del día desde la DB
+    print("Generando reporte diario...")
+    df = fetch_stock_analysis_for_today()
+    if df.empty:
+        print("No hay datos de análisis para la fecha de hoy.")
+        return
+    build_reports(df)
+
+if __name__ == "__main__":
+    main()
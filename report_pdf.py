@@ -0,0 +1,59 @@
+from datetime import datetime
+import os
+from fpdf import FPDF
+from markdown_pdf import MarkdownRenderer, parse_markdown
+from metrics import add_bytes, timed
+from pdf_output import add_report_fonts
+
+###############################################
+# RENDERIZADO DEL REPORTE DIARIO EN PDF
+###############################################
+class PDFReportWriter:
+    """
+    Construye el PDF del reporte de forma incremental: cada línea completa se
+    renderiza apenas llega, de modo que el PDF se arma mientras el LLM todavía
+    está generando el resto del texto. El markdown lo interpreta
+    markdown_pdf.MarkdownRenderer.
+    """
+
+    def __init__(self, title="Reporte Diario de Mercados"):
+        self.pdf = FPDF()
+        self.pdf.set_auto_page_break(auto=True, margin=15)
+        add_report_fonts(self.pdf)
+        self.lines_written = 0
+
+        # Portada
+        self.pdf.add_page()
+        self.pdf.set_font("DejaVu", "B", 16)
+        self.pdf.cell(0, 10, title, ln=True, align="C")
+        self.pdf.set_font("DejaVu", "", 12)
+        self.pdf.cell(0, 10, f"Fecha: {datetime.now().strftime('%Y-%m-%d')}", ln=True, align="C")
+        self.pdf.ln(10)
+
+        self.renderer = MarkdownRenderer(self.pdf)
+
+    def add_line(self, raw_line):
+        self.lines_written += 1
+        self.renderer.feed(raw_line)
+
+    def add_text(self, report_text):
+        # El documento completo se tokeniza de una sola vez
+        blocks = parse_markdown(report_text)
+        self.lines_written += len(report_text.splitlines())
+        self.renderer.render(blocks)
+
+    def save(self, output_filename="reporte_diario.pdf"):
+        self.renderer.flush()
+        self.pdf.ln(5)
+        self.pdf.output(output_filename)
+        print(f"Reporte guardado en '{output_filename}'.")
+        return output_filename
+
+
+@timed("create_pdf_report")
+def create_pdf_report(report_text, output_filename="reporte_diario.pdf"):
+    writer = PDFReportWriter()
+    writer.add_text(report_text)
+    writer.save(output_filename)
+    add_bytes(os.path.getsize(output_filename))
+    return output_filename
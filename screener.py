@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Screener en memoria sobre los últimos indicadores de todo el universo: una
+fila por ticker de latest_indicators (la guarda analyze_ticker en cada
+corrida) más los metadatos del registro de tickers, en columnas de NumPy.
+
+Los filtros son expresiones con la sintaxis de Python sobre las columnas:
+
+    region == 'argentina' and rsi < 30 and price > ma200
+    total_summary >= 'buy' and asset_class in ('equity', 'crypto')
+    abs(macd_hist) < 0.5 or price_vs_ma200 > 0.1
+
+Cada expresión se compila una vez a operaciones vectorizadas (sin eval):
+solo se aceptan columnas, números, textos, comparaciones, and/or/not,
++ - * / y abs(). Los niveles (strong sell < sell < neutral < buy < strong
+buy) se comparan por orden. El orden es una lista de columnas separadas
+por coma, con "-" adelante para ir de mayor a menor; los NaN van al final.
+
+refresh() trae solo las filas de latest_indicators que cambiaron desde la
+última carga; la API lo llama cuando el pipeline avisa resultados nuevos.
+
+Uso: python screener.py "region == 'argentina' and rsi < 30 and price > ma200" [--sort -total_score] [--limit 20]
+     python screener.py bench [--tickers 10000]
+"""
+import argparse
+import ast
+import functools
+import os
+import threading
+import time
+from collections import namedtuple
+from tickers import get_universe
+
+###############################################
+# COLUMNAS
+###############################################
+SCREENER_LIMIT = int(os.getenv("SCREENER_LIMIT", "50"))
+SCREENER_MAX_LIMIT = int(os.getenv("SCREENER_MAX_LIMIT", "1000"))
+# Solapamiento al traer cambios: una fila confirmada tarde con un updated_at anterior no se pierde
+SCREENER_REFRESH_OVERLAP_SECONDS = int(os.getenv("SCREENER_REFRESH_OVERLAP_SECONDS", "300"))
+
+LEVELS = ("strong sell", "sell", "neutral", "buy", "strong buy")
+NUMERIC_COLUMNS = ("price", "rsi", "macd", "macd_signal", "ma50", "ma200", "score_rsi", "score_macd",
+                   "score_ma", "tech_score", "total_score")
+LEVEL_COLUMNS = ("total_summary", "technical_indicators_summary", "moving_averages_summary",
+                 "rsi_action", "macd_action")
+CATEGORY_COLUMNS = ("region", "exchange", "asset_class", "currency", "calendar")
+# Columnas calculadas a partir de las guardadas
+DERIVED_COLUMNS = ("macd_hist", "price_vs_ma50", "price_vs_ma200")
+ALIASES = {"tech_summary": "technical_indicators_summary", "ma_summary": "moving_averages_summary"}
+COLUMNS = ("ticker",) + NUMERIC_COLUMNS + DERIVED_COLUMNS + LEVEL_COLUMNS + CATEGORY_COLUMNS + ("analysis_date",)
+DEFAULT_FIELDS = ("ticker", "region", "price", "rsi", "ma200", "total_summary", "total_score")
+
+# rows: dicts con las columnas pedidas; matched: cuántos tickers pasaron el filtro
+ScreenResult = namedtuple("ScreenResult", ["rows", "matched", "total", "elapsed_ms"])
+
+###############################################
+# EXPRESIONES
+###############################################
+_COMPARE = {ast.Lt: "less", ast.LtE: "less_equal", ast.Gt: "greater", ast.GtE: "greater_equal",
+            ast.Eq: "equal", ast.NotEq: "not_equal"}
+_ARITHMETIC = {ast.Add: "add", ast.Sub: "subtract", ast.Mult: "multiply", ast.Div: "divide"}
+
+def _column_name(name):
+    name = ALIASES.get(name, name)
+    if name not in COLUMNS or name in ("ticker", "analysis_date"):
+        raise ValueError(f"Columna desconocida: {name} (columnas: {', '.join(COLUMNS[1:-1])})")
+    return name
+
+def _compile(node):
+    """Convierte un nodo del AST en una función (screener) -> array o constante."""
+    import numpy as np
+
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+    if isinstance(node, ast.Name):
+        name = _column_name(node.id)
+        if name in LEVEL_COLUMNS or name in CATEGORY_COLUMNS:
+            # Internamente son códigos: solo tienen sentido comparados con un texto
+            raise ValueError(f"{name} solo se usa como {name} == 'texto' o {name} in ('a', 'b')")
+        return lambda s: s.column(name)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return lambda s, value=node.value: value
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        raise ValueError(f"Los textos solo se comparan con un nivel o una categoría (region == 'usa'): "
+                         f"{ast.unparse(node)}")
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda s: functools.reduce(combine, (part(s) for part in parts))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = _compile(node.operand)
+        return lambda s: np.logical_not(operand(s))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _compile(node.operand)
+        return lambda s: np.negative(operand(s))
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+        left, right = _compile(node.left), _compile(node.right)
+        op = getattr(np, _ARITHMETIC[type(node.op)])
+        return lambda s: op(left(s), right(s))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "abs" \
+            and len(node.args) == 1 and not node.keywords:
+        operand = _compile(node.args[0])
+        return lambda s: np.abs(operand(s))
+    if isinstance(node, ast.Compare):
+        # a < b < c es (a < b) and (b < c)
+        operands = [node.left] + node.comparators
+        checks = [_comparison(left, op, right) for left, op, right in zip(operands, node.ops, operands[1:])]
+        return lambda s: functools.reduce(np.logical_and, (check(s) for check in checks))
+    raise ValueError(f"Expresión no soportada: {ast.unparse(node)}")
+
+def _constant(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        return -node.operand.value
+    raise ValueError(f"Se esperaba una constante: {ast.unparse(node)}")
+
+def _comparison(left, op, right):
+    import numpy as np
+
+    if isinstance(op, (ast.In, ast.NotIn)):
+        if not isinstance(left, ast.Name) or not isinstance(right, (ast.Tuple, ast.List)):
+            raise ValueError("in se usa como columna in ('a', 'b')")
+        name = _column_name(left.id)
+        values = [_constant(item) for item in right.elts]
+        textual = name in LEVEL_COLUMNS or name in CATEGORY_COLUMNS
+        if any(isinstance(value, str) != textual for value in values):
+            raise ValueError(f"{name} in (...) lleva {'textos' if textual else 'números'}")
+        negate = isinstance(op, ast.NotIn)
+
+        def member(s):
+            hits = np.isin(s.column(name), [s.encode(name, value) for value in values])
+            return ~hits if negate else hits
+        return member
+    if type(op) not in _COMPARE:
+        raise ValueError(f"Comparación no soportada: {type(op).__name__}")
+    # Los textos se pasan al código de la columna con la que se comparan
+    if isinstance(right, ast.Constant) and isinstance(right.value, str) and isinstance(left, ast.Name):
+        name, text = _column_name(left.id), right.value
+        compare = getattr(np, _COMPARE[type(op)])
+        return lambda s: compare(s.column(name), s.encode(name, text, ordered=not isinstance(op, (ast.Eq, ast.NotEq))))
+    if isinstance(left, ast.Constant) and isinstance(left.value, str):
+        raise ValueError("Con textos, la columna va a la izquierda: region == 'usa'")
+    lhs, rhs = _compile(left), _compile(right)
+    compare = getattr(np, _COMPARE[type(op)])
+    return lambda s: compare(lhs(s), rhs(s))
+
+@functools.lru_cache(maxsize=256)
+def compile_filter(expression):
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Expresión inválida: {e.msg}") from None
+    return _compile(tree)
+
+@functools.lru_cache(maxsize=256)
+def parse_sort(expression):
+    keys = []
+    for part in (expression or "").split(","):
+        part = part.strip()
+        if part:
+            descending = part.startswith("-")
+            name = part.lstrip("+-").strip()
+            keys.append((name if name == "ticker" else _column_name(name), descending))
+    return tuple(keys)
+
+###############################################
+# SCREENER
+###############################################
+class Screener:
+    """
+    Columnas de largo `capacity` (crece al doble cuando hace falta); las
+    filas [0, size) son los tickers cargados, en el orden en que llegaron.
+    Los niveles se guardan como -2..2 y las categorías como índices en
+    self.categories[columna].
+    """
+
+    def __init__(self, capacity=1024):
+        import numpy as np
+
+        self.size = 0
+        self.tickers = []
+        self.positions = {}
+        self.categories = {name: [] for name in CATEGORY_COLUMNS}
+        self._codes = {name: {} for name in CATEGORY_COLUMNS}
+        self._data = {name: np.full(capacity, np.nan) for name in NUMERIC_COLUMNS}
+        self._data.update({name: np.zeros(capacity, dtype=np.int8) for name in LEVEL_COLUMNS})
+        self._data.update({name: np.zeros(capacity, dtype=np.int32) for name in CATEGORY_COLUMNS})
+        self._data["analysis_date"] = np.zeros(capacity, dtype="datetime64[s]")
+        self._derived = {}
+        self.version = 0
+        self.updated_until = None
+        self._lock = threading.Lock()
+
+    # --- columnas ---
+    def column(self, name):
+        if name in DERIVED_COLUMNS:
+            if name not in self._derived:
+                import numpy as np
+
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    if name == "macd_hist":
+                        self._derived[name] = self.column("macd") - self.column("macd_signal")
+                    else:
+                        ma = self.column(name.removeprefix("price_vs_"))
+                        self._derived[name] = self.column("price") / ma - 1
+            return self._derived[name]
+        return self._data[name][:self.size]
+
+    def encode(self, name, value, ordered=False):
+        """Valor de la columna `name` que corresponde a `value` (un nivel o una categoría)."""
+        if name in LEVEL_COLUMNS:
+            if value not in LEVELS:
+                raise ValueError(f"Nivel desconocido: {value!r} (niveles: {', '.join(LEVELS)})")
+            return LEVELS.index(value) - 2
+        if name in CATEGORY_COLUMNS:
+            if ordered:
+                raise ValueError(f"{name} solo se compara con == != in")
+            # Una categoría que no existe no coincide con ninguna fila
+            return self._codes[name].get(value, -1)
+        if isinstance(value, str):
+            raise ValueError(f"{name} es numérica, no se compara con {value!r}")
+        return value
+
+    def _category_code(self, name, value):
+        codes = self._codes[name]
+        if value not in codes:
+            codes[value] = len(self.categories[name])
+            self.categories[name].append(value)
+        return codes[value]
+
+    def _grow(self, needed):
+        import numpy as np
+
+        capacity = len(self._data["price"])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, values in self._data.items():
+            grown = np.full(capacity, np.nan) if values.dtype.kind == "f" else np.zeros(capacity, dtype=values.dtype)
+            grown[:len(values)] = values
+            self._data[name] = grown
+
+    # --- carga ---
+    def upsert(self, rows):
+        """
+        Reemplaza o agrega filas (dicts con ticker y las columnas de
+        latest_indicators). Las columnas se escriben de a una, vectorizadas.
+        """
+        import numpy as np
+
+        if not rows:
+            return 0
+        universe = get_universe()
+        positions = []
+        with self._lock:
+            for row in rows:
+                position = self.positions.get(row["ticker"])
+                if position is None:
+                    position = self.positions[row["ticker"]] = len(self.tickers)
+                    self.tickers.append(row["ticker"])
+                positions.append(position)
+            self._grow(len(self.tickers))
+            positions = np.array(positions)
+            for name in NUMERIC_COLUMNS:
+                self._data[name][positions] = np.array([row[name] for row in rows], dtype=float)
+            for name in LEVEL_COLUMNS:
+                self._data[name][positions] = [LEVELS.index(row[name]) - 2 if row[name] in LEVELS else 0
+                                               for row in rows]
+            symbols = [universe.lookup(row["ticker"]) for row in rows]
+            for name in CATEGORY_COLUMNS:
+                self._data[name][positions] = [self._category_code(name, getattr(symbol, name)) for symbol in symbols]
+            self._data["analysis_date"][positions] = np.array([row["analysis_date"] for row in rows],
+                                                              dtype="datetime64[s]")
+            self.size = len(self.tickers)
+            self._derived = {}
+            self.version += 1
+        return len(rows)
+
+    def refresh(self):
+        """Trae de latest_indicators las filas nuevas o cambiadas desde la última carga."""
+        from db import pooled_connection
+        from main import LATEST_INDICATOR_FIELDS, ensure_tables
+
+        query = f"SELECT ticker, {', '.join(LATEST_INDICATOR_FIELDS)}, updated_at FROM latest_indicators"
+        params = ()
+        if self.updated_until is not None:
+            query += " WHERE updated_at >= %s - make_interval(secs => %s)"
+            params = (self.updated_until, SCREENER_REFRESH_OVERLAP_SECONDS)
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            ensure_tables(cur)
+            conn.commit()
+            cur.execute(query, params)
+            fields = ["ticker"] + LATEST_INDICATOR_FIELDS + ["updated_at"]
+            rows = [dict(zip(fields, values)) for values in cur.fetchall()]
+            conn.commit()
+            cur.close()
+        if rows:
+            self.updated_until = max(row["updated_at"] for row in rows)
+        return self.upsert(rows)
+
+    # --- consultas ---
+    def _sort_order(self, indices, keys):
+        import numpy as np
+
+        if not keys:
+            return indices
+        columns = []
+        for name, descending in reversed(keys):
+            if name == "ticker":
+                values = np.argsort(np.argsort(np.array(self.tickers, dtype=object)[indices])).astype(float)
+            elif name in CATEGORY_COLUMNS:
+                # Las categorías se ordenan por su texto, no por el orden de llegada
+                ranks = np.argsort(np.argsort(np.array(self.categories[name], dtype=object)))
+                values = ranks[self.column(name)[indices]].astype(float)
+            else:
+                values = self.column(name)[indices].astype(float)
+            missing = np.isnan(values)
+            columns.extend([-values if descending else values, missing])
+        # lexsort ordena por la última clave primero: para cada columna, primero "es NaN" y después el valor
+        return indices[np.lexsort(columns)]
+
+    def _value(self, name, position):
+        if name == "ticker":
+            return self.tickers[position]
+        value = self.column(name)[position]
+        if name in LEVEL_COLUMNS:
+            return LEVELS[int(value) + 2]
+        if name in CATEGORY_COLUMNS:
+            return self.categories[name][int(value)]
+        if name == "analysis_date":
+            return str(value)
+        value = float(value)
+        return None if value != value else round(value, 4)
+
+    def query(self, where=None, sort=None, limit=SCREENER_LIMIT, fields=DEFAULT_FIELDS):
+        import numpy as np
+
+        started_at = time.perf_counter()
+        fields = [name if name in ("ticker", "analysis_date") else _column_name(name) for name in fields]
+        keys = parse_sort(sort)
+        condition = compile_filter(where) if where else None
+        with self._lock:
+            if condition is None:
+                indices = np.arange(self.size)
+            else:
+                try:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        mask = condition(self)
+                except TypeError as e:
+                    # Combinaciones de tipos que NumPy no sabe operar: son errores del filtro, no del servidor
+                    raise ValueError(f"Filtro inválido: {e}") from None
+                if np.ndim(mask) == 0:
+                    raise ValueError("El filtro tiene que usar alguna columna")
+                if mask.dtype != bool:
+                    raise ValueError("El filtro tiene que ser una comparación (p. ej. rsi < 30)")
+                indices = np.flatnonzero(mask)
+            ordered = self._sort_order(indices, keys)
+            if limit is not None:
+                ordered = ordered[:limit]
+            rows = [{name: self._value(name, position) for name in fields} for position in ordered.tolist()]
+            total = self.size
+        return ScreenResult(rows, len(indices), total, (time.perf_counter() - started_at) * 1000)
+
+###############################################
+# CLI
+###############################################
+def synthetic_rows(count, seed=0):
+    """Filas de latest_indicators inventadas para el universo sintético de loadtest.py."""
+    import numpy as np
+    from datetime import datetime
+    from loadtest import synthetic_universe
+
+    rng = np.random.default_rng(seed)
+    price = rng.lognormal(3, 1, count)
+    ma200 = price * rng.normal(1, 0.1, count)
+    scores = rng.integers(-2, 3, (count, 3))
+    rows = []
+    for i, ticker in enumerate(synthetic_universe(count)):
+        tech = (scores[i, 0] + scores[i, 1]) / 2
+        total = (tech + scores[i, 2]) / 2
+        rows.append({
+            "ticker": ticker, "analysis_date": datetime.now(), "price": price[i], "rsi": rng.uniform(5, 95),
+            "macd": rng.normal(), "macd_signal": rng.normal(), "ma50": price[i] * rng.normal(1, 0.05),
+            "ma200": ma200[i], "score_rsi": scores[i, 0], "score_macd": scores[i, 1], "score_ma": scores[i, 2],
+            "tech_score": tech, "total_score": total,
+            "total_summary": LEVELS[int(np.clip(np.round(total), -2, 2)) + 2],
+            "technical_indicators_summary": LEVELS[int(np.clip(np.round(tech), -2, 2)) + 2],
+            "moving_averages_summary": LEVELS[scores[i, 2] + 2], "rsi_action": LEVELS[scores[i, 0] + 2],
+            "macd_action": LEVELS[scores[i, 1] + 2],
+        })
+    return rows
+
+BENCH_QUERIES = [
+    ("region == 'argentina' and rsi < 30 and price > ma200", "-total_score"),
+    ("total_summary >= 'buy' and asset_class in ('equity', 'crypto')", "rsi"),
+    ("abs(macd_hist) < 0.5 or price_vs_ma50 > 0.05", "-price_vs_ma200,ticker"),
+    ("region != 'usa' and 20 < rsi < 40", "region,-rsi"),
+]
+
+def _bench(count):
+    screener = Screener()
+    rows = synthetic_rows(count)
+    started_at = time.perf_counter()
+    screener.upsert(rows)
+    print(f"{count} tickers cargados en {(time.perf_counter() - started_at) * 1000:.1f} ms.")
+    for where, sort in BENCH_QUERIES:
+        screener.query(where, sort)
+        timings = sorted(screener.query(where, sort).elapsed_ms for _ in range(50))
+        result = screener.query(where, sort)
+        print(f"  {result.matched:>5} de {result.total}: p50 {timings[25]:.2f} ms  {where}  [{sort}]")
+    started_at = time.perf_counter()
+    screener.upsert(synthetic_rows(count // 10, seed=1))
+    print(f"Actualización de {count // 10} filas en {(time.perf_counter() - started_at) * 1000:.1f} ms.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("where", nargs="?", help="Filtro, o 'bench'")
+    parser.add_argument("--sort", default="-total_score")
+    parser.add_argument("--limit", type=int, default=SCREENER_LIMIT)
+    parser.add_argument("--fields", default=",".join(DEFAULT_FIELDS))
+    parser.add_argument("--tickers", type=int, default=10000, help="Tickers sintéticos (bench)")
+    args = parser.parse_args()
+    if args.where == "bench":
+        _bench(args.tickers)
+        return
+    screener = Screener()
+    screener.refresh()
+    try:
+        result = screener.query(args.where, args.sort, args.limit, args.fields.split(","))
+    except ValueError as e:
+        raise SystemExit(f"❌ {e}")
+    fields = args.fields.split(",")
+    widths = {name: max([len(name)] + [len(str(row[name])) for row in result.rows]) for name in fields}
+    print("  ".join(name.ljust(widths[name]) for name in fields))
+    for row in result.rows:
+        print("  ".join(str(row[name]).ljust(widths[name]) for name in fields))
+    print(f"{result.matched} de {result.total} tickers ({result.elapsed_ms:.2f} ms).")
+
+if __name__ == "__main__":
+    main()
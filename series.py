@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Series de precio e indicadores (cierre, medias de 50 y 200, RSI, MACD)
+reducidas al ancho en píxeles del gráfico, para el dashboard. La API las
+sirve en /v1/series/{ticker} (ver api.py).
+
+Cada serie se reduce con LTTB (Largest-Triangle-Three-Buckets, conserva la
+forma) o con mínimo/máximo por columna (conserva picos y valles). Para que
+el costo no dependa del largo de la historia, al cargar un ticker se arma
+una pirámide de niveles de zoom: el nivel k guarda el mínimo y el máximo de
+cada bloque de 2^k puntos. Un pedido toma el nivel más grueso que todavía
+tiene al menos dos puntos por píxel en el rango pedido y reduce solo ese
+tramo, así un gráfico de 800 px cuesta lo mismo con 1.000 o con 500.000
+velas.
+
+Fuentes: las velas diarias ("1d") salen del proveedor de precios
+(PRICE_PROVIDER, SERIES_HISTORY_PERIOD de historia); los demás intervalos,
+de la tabla price_bars que llena streaming.py.
+
+Uso: python series.py show TICKER [--width 800] [--method lttb] [--interval 1d]
+     python series.py bench [--points 10000,100000,1000000] [--width 800]
+"""
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+###############################################
+# CONFIGURACIÓN DE SERIES
+###############################################
+SERIES_HISTORY_PERIOD = os.getenv("SERIES_HISTORY_PERIOD", "5y")
+# Velas intradiarias que se leen de price_bars por ticker
+SERIES_MAX_BARS = int(os.getenv("SERIES_MAX_BARS", "500000"))
+SERIES_MAX_WIDTH = int(os.getenv("SERIES_MAX_WIDTH", "4000"))
+SERIES_DEFAULT_WIDTH = int(os.getenv("SERIES_DEFAULT_WIDTH", "800"))
+# Tickers con la pirámide armada en memoria (se descartan los menos usados)
+SERIES_CACHE_TICKERS = int(os.getenv("SERIES_CACHE_TICKERS", "500"))
+# Las series intradiarias se releen pasado este tiempo; las diarias, cuando la API recarga su foto
+SERIES_TTL_SECONDS = float(os.getenv("SERIES_TTL_SECONDS", "300"))
+
+SERIES_FIELDS = ("close", "ma50", "ma200", "rsi", "macd", "signal", "hist")
+SERIES_INTERVALS = ("1m", "2m", "5m", "15m", "30m", "60m", "1h", "4h", "1d")
+METHODS = ("lttb", "minmax")
+# Los niveles de la pirámide se dejan de armar por debajo de esta cantidad de puntos
+MIN_LEVEL_POINTS = 256
+
+# times: segundos epoch (int64); values: {campo: array} del mismo largo
+TickerSeries = namedtuple("TickerSeries", ["ticker", "interval", "times", "values"])
+
+###############################################
+# REDUCCIÓN
+###############################################
+def lttb(x, y, count):
+    """
+    Índices de los `count` puntos que elige Largest-Triangle-Three-Buckets:
+    el primero, el último y, en cada bloque intermedio, el que forma el
+    triángulo de mayor área con el punto elegido antes y el promedio del
+    bloque siguiente.
+    """
+    import numpy as np
+
+    size = len(x)
+    if count >= size or count < 3:
+        return np.arange(size) if count >= size else np.array([0, size - 1][:max(count, 0)])
+    edges = np.linspace(1, size - 1, count - 1).astype(np.int64)
+    sizes = np.diff(edges)
+    # Promedio de cada bloque; el "siguiente" del último bloque es el punto final
+    avg_x = np.r_[np.add.reduceat(x[:-1], edges[:-1])[1:] / sizes[1:], x[-1]]
+    avg_y = np.r_[np.add.reduceat(y[:-1], edges[:-1])[1:] / sizes[1:], y[-1]]
+    # Los bloques son chicos (la pirámide deja pocos puntos por píxel): el bucle en Python
+    # sobre listas es más rápido que operaciones de NumPy por bloque
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+    chosen = [0]
+    a = 0
+    for i, (ax, ay) in enumerate(zip(avg_x.tolist(), avg_y.tolist())):
+        px, py = xs[a], ys[a]
+        best, a = -1.0, bounds[i]
+        for j in range(bounds[i], bounds[i + 1]):
+            area = abs((px - ax) * (ys[j] - py) - (px - xs[j]) * (ay - py))
+            if area > best:
+                best, a = area, j
+        chosen.append(a)
+    chosen.append(size - 1)
+    return np.array(chosen, dtype=np.int64)
+
+def minmax(y, count):
+    """
+    Índices del mínimo y el máximo de cada uno de count/2 bloques, en orden
+    de tiempo: con dos puntos por píxel el trazo conserva todos los picos.
+    """
+    import numpy as np
+
+    size = len(y)
+    buckets = max(1, count // 2)
+    if size <= 2 * buckets:
+        return np.arange(size)
+    edges = np.linspace(0, size, buckets + 1).astype(np.int64)
+    group = np.repeat(np.arange(buckets), np.diff(edges))
+    positions = []
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == reduce.reduceat(y, edges[:-1])[group])
+        # Primer punto de cada bloque que alcanza el extremo (hits viene ordenado por bloque)
+        hit_groups = group[hits]
+        positions.append(hits[np.r_[True, hit_groups[1:] != hit_groups[:-1]]])
+    pairs = np.sort(np.column_stack(positions), axis=1).ravel()
+    return pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+
+###############################################
+# PIRÁMIDE DE ZOOM
+###############################################
+class ZoomPyramid:
+    """
+    Una serie sin NaN y sus niveles de zoom: levels[k] son los índices (en
+    la serie completa) del mínimo y el máximo de cada bloque de 2^k puntos.
+    """
+
+    def __init__(self, times, values):
+        import numpy as np
+
+        finite = np.isfinite(values)
+        self.times = times[finite]
+        self.values = values[finite]
+        self.levels = [np.arange(len(self.values))]
+        block = 2
+        while len(self.values) / block * 2 >= MIN_LEVEL_POINTS:
+            self.levels.append(minmax(self.values, 2 * -(-len(self.values) // block)))
+            block *= 2
+
+    def query(self, start, end, width, method="lttb"):
+        """(times, values) de [start, end] (segundos epoch, None = sin límite) reducidos a ~width puntos."""
+        import numpy as np
+
+        lo = 0 if start is None else int(np.searchsorted(self.times, start, side="left"))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, end, side="right"))
+        count = hi - lo
+        if count <= width:
+            chosen = np.arange(lo, hi)
+        else:
+            # Nivel más grueso con al menos dos puntos por píxel en el rango
+            level = min(max(int(np.log2(count / width)), 0), len(self.levels) - 1)
+            indices = self.levels[level]
+            indices = indices[np.searchsorted(indices, lo):np.searchsorted(indices, hi)]
+            if len(indices) <= width:
+                chosen = indices
+            elif method == "lttb":
+                chosen = indices[lttb(self.times[indices].astype(float), self.values[indices], width)]
+            else:
+                chosen = indices[minmax(self.values[indices], width)]
+        return self.times[chosen], self.values[chosen]
+
+class ZoomedSeries:
+    """Pirámides de los campos de un ticker, armadas una sola vez al cargarlo."""
+
+    def __init__(self, series):
+        self.ticker = series.ticker
+        self.interval = series.interval
+        self.points = len(series.times)
+        self.first = int(series.times[0]) if self.points else None
+        self.last = int(series.times[-1]) if self.points else None
+        self.loaded_at = time.monotonic()
+        self.pyramids = {field: ZoomPyramid(series.times, values) for field, values in series.values.items()}
+        # Respuestas ya codificadas de esta serie (ver api.py)
+        self.payloads = {}
+
+    def query(self, fields, start=None, end=None, width=SERIES_DEFAULT_WIDTH, method="lttb"):
+        result = {}
+        for field in fields:
+            times, values = self.pyramids[field].query(start, end, width, method)
+            result[field] = {"t": times.tolist(), "v": [round(v, 4) for v in values.tolist()]}
+        return result
+
+###############################################
+# CARGA DE SERIES
+###############################################
+def series_from_frame(ticker, interval, frame):
+    import numpy as np
+    from charts import compute_chart_series
+
+    computed = compute_chart_series(frame)
+    times = computed["dates"].astype("datetime64[s]").astype(np.int64)
+    return TickerSeries(ticker, interval, times, {field: computed[field] for field in SERIES_FIELDS})
+
+def load_bars_frame(ticker, interval, limit=SERIES_MAX_BARS):
+    import pandas as pd
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT start_at, close FROM (
+                SELECT start_at, close FROM price_bars WHERE ticker = %s AND interval = %s
+                ORDER BY start_at DESC LIMIT %s
+            ) recent ORDER BY start_at
+        """, (ticker, interval, limit))
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+    index = pd.DatetimeIndex([row[0] for row in rows])
+    return pd.DataFrame({"Close": [float(row[1]) for row in rows]}, index=index)
+
+def load_series(ticker, interval="1d"):
+    if interval == "1d":
+        from providers import get_price_provider
+
+        frame = get_price_provider().download([ticker], period=SERIES_HISTORY_PERIOD).get(ticker)
+    else:
+        frame = load_bars_frame(ticker, interval)
+    if frame is None or frame.empty:
+        return None
+    return series_from_frame(ticker, interval, frame)
+
+class SeriesCache:
+    """
+    Series con zoom por (ticker, intervalo), las menos usadas se descartan
+    al pasar de `capacity`. Si varios hilos piden el mismo ticker a la vez
+    se carga una sola vez. Los tickers sin datos se recuerdan hasta el
+    próximo clear() para no volver a consultar al proveedor en cada pedido.
+    """
+
+    def __init__(self, capacity=SERIES_CACHE_TICKERS, ttl=SERIES_TTL_SECONDS, loader=load_series):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._missing = set()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry):
+        return entry.interval == "1d" or time.monotonic() - entry.loaded_at < self.ttl
+
+    def cached(self, ticker, interval="1d"):
+        """La serie si ya está cargada y vigente; no carga nada."""
+        with self._lock:
+            entry = self._entries.get((ticker, interval))
+            return entry if entry is not None and self._fresh(entry) else None
+
+    def missing(self, ticker, interval="1d"):
+        """True si la última carga de la serie no trajo datos."""
+        with self._lock:
+            return (ticker, interval) in self._missing
+
+    def get(self, ticker, interval="1d"):
+        key = (ticker, interval)
+        with self._lock:
+            if key in self._missing:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(key)
+                return entry
+            loading = self._loading.get(key)
+            owner = loading is None
+            if owner:
+                loading = self._loading[key] = threading.Event()
+        if not owner:
+            loading.wait()
+            with self._lock:
+                return self._entries.get(key)
+        try:
+            series = self.loader(ticker, interval)
+            entry = ZoomedSeries(series) if series is not None and len(series.times) else None
+            with self._lock:
+                if entry is not None:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.capacity:
+                        self._entries.popitem(last=False)
+                else:
+                    self._entries.pop(key, None)
+                    self._missing.add(key)
+            return entry
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._missing.clear()
+
+###############################################
+# CLI
+###############################################
+def _bench(point_counts, width):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    for points in point_counts:
+        times = 1_600_000_000 + 60 * np.arange(points, dtype=np.int64)
+        values = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, points)))
+        started_at = time.perf_counter()
+        pyramid = ZoomPyramid(times, values)
+        build_ms = (time.perf_counter() - started_at) * 1000
+        timings = {}
+        for method in METHODS:
+            started_at = time.perf_counter()
+            for i in range(20):
+                # Rangos de zoom distintos: toda la historia, la mitad, la décima parte
+                span = points // (1, 2, 10)[i % 3]
+                start = times[(i * 7919) % (points - span + 1)]
+                pyramid.query(start, start + 60 * span, width, method)
+            timings[method] = (time.perf_counter() - started_at) / 20 * 1000
+        print(f"{points:>9,} puntos: pirámide de {len(pyramid.levels)} niveles en {build_ms:.0f} ms; "
+              + ", ".join(f"{m} {t:.2f} ms/pedido" for m, t in timings.items()) + f" a {width} px")
+
+def main():
+    import json
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["show", "bench"])
+    parser.add_argument("ticker", nargs="?")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--width", type=int, default=SERIES_DEFAULT_WIDTH)
+    parser.add_argument("--method", default="lttb", choices=METHODS)
+    parser.add_argument("--fields", default="close,rsi,macd")
+    parser.add_argument("--points", default="10000,100000,1000000")
+    args = parser.parse_args()
+    if args.command == "bench":
+        _bench([int(p) for p in args.points.split(",")], args.width)
+        return
+    if not args.ticker:
+        parser.error("show requiere el ticker")
+    series = load_series(args.ticker, args.interval)
+    if series is None:
+        raise SystemExit(f"Sin datos para {args.ticker} ({args.interval}).")
+    zoomed = ZoomedSeries(series)
+    result = zoomed.query(args.fields.split(","), width=args.width, method=args.method)
+    print(f"{args.ticker} {args.interval}: {zoomed.points} velas -> "
+          + ", ".join(f"{field} {len(data['t'])}" for field, data in result.items()) + " puntos; "
+          + f"{len(json.dumps(result))} bytes de JSON.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Arranque en frío: validación de la configuración sin abrir conexiones y
+perfil de tiempos de importación.
+
+El perfil corre `python -X importtime -c "import <módulo>"` en un proceso
+nuevo (así no cuenta lo que ya está cargado en este), agrupa el tiempo
+acumulado de cada import directo del módulo y lo compara con
+STARTUP_TARGET_MS.
+
+Uso: python startup.py [--module main] [--top 15] [--check-config]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import namedtuple
+
+###############################################
+# CONFIGURACIÓN
+###############################################
+# Objetivo de arranque en frío: tiempo de `import main` medido con -X importtime
+STARTUP_TARGET_MS = float(os.getenv("STARTUP_TARGET_MS", "300"))
+
+# Variables numéricas: si tienen un valor inválido el proceso fallaría al
+# importar el módulo que las lee, recién en la etapa que lo necesita
+NUMERIC_SETTINGS = {
+    "DB_PORT": int,
+    "DB_POOL_MAX": int,
+    "DB_POOL_TIMEOUT": float,
+    "SMTP_PORT": int,
+    "SMTP_TIMEOUT": float,
+    "EMAIL_BATCH_SIZE": int,
+    "EMAIL_MAX_ATTEMPTS": int,
+    "EMAIL_BACKOFF_SECONDS": float,
+    "EMAIL_BACKOFF_MAX_SECONDS": float,
+    "EMAIL_DRAIN_TIMEOUT": float,
+    "PIPELINE_MAX_WORKERS": int,
+    "METRICS_RESERVOIR": int,
+    "INTRADAY_BATCH_SIZE": int,
+    "INTRADAY_DELAY_SECONDS": float,
+    "INTRADAY_HISTORY_BARS": int,
+    "ALERT_COOLDOWN_MINUTES": float,
+    "STREAM_RING_BARS": int,
+    "STREAM_LATENESS_SECONDS": float,
+    "STREAM_STORE_FLUSH_SECONDS": float,
+    "STREAM_STORE_MAX_PENDING": int,
+    "API_PORT": int,
+    "API_HISTORY_DAYS": int,
+    "API_NEWS_PER_TICKER": int,
+    "API_REFRESH_SECONDS": float,
+    "API_CACHE_MAX_AGE": int,
+    "API_GZIP_MIN_BYTES": int,
+    "API_RESPONSE_CACHE": int,
+    "SERIES_MAX_BARS": int,
+    "SERIES_MAX_WIDTH": int,
+    "SERIES_DEFAULT_WIDTH": int,
+    "SERIES_CACHE_TICKERS": int,
+    "SERIES_TTL_SECONDS": float,
+    "SCREENER_LIMIT": int,
+    "SCREENER_MAX_LIMIT": int,
+    "SCREENER_REFRESH_OVERLAP_SECONDS": int,
+    "QUEUE_CHUNK_SIZE": int,
+    "QUEUE_LEASE_SECONDS": int,
+    "QUEUE_MAX_ATTEMPTS": int,
+    "QUEUE_POLL_SECONDS": float,
+    "QUEUE_WAIT_TIMEOUT": int,
+    "REPORT_MAX_WORKERS": int,
+    "REGION_TOKEN_BUDGET": int,
+    "PROMPT_TOKEN_BUDGET": int,
+    "PROMPT_MAX_NEWS_PER_TICKER": int,
+    "GROK_TIMEOUT": float,
+    "GROK_MAX_CONCURRENCY": int,
+    "CHART_DPI": int,
+    "CHART_WORKERS": int,
+    "CHART_MAX_DPI": int,
+    "CHART_JPEG_QUALITY": int,
+    "CHART_ZLIB_LEVEL": int,
+    "CHART_CACHE_MAX_MB": float,
+    "MARKET_CLOSE_DELAY_MINUTES": int,
+    "CRYPTO_REFRESH_HOURS": float,
+    "PRICE_OVERLAP_DAYS": int,
+    "STARTUP_TARGET_MS": float,
+    "PROFILE_TOP": int,
+    "PROFILE_SAMPLE_MS": float,
+    "PROFILE_TRACEMALLOC_FRAMES": int,
+}
+
+CHOICE_SETTINGS = {
+    "REPORT_MODE": ("regional", "streaming", "single"),
+    "REPORT_MERGE": ("template", "llm"),
+    "PROMPT_FORMAT": ("compact", "verbose"),
+    "LLM_TELEMETRY_SINK": ("jsonl", "db"),
+    "PRICE_PROVIDER": ("yfinance", "synthetic", "recorded"),
+    "INTRADAY_INTERVAL": ("1m", "2m", "5m", "15m", "30m", "60m"),
+    "STREAM_FEED": ("synthetic", "replay", "websocket"),
+    "STREAM_STORE": ("none", "db"),
+}
+
+# Necesarias según el modo: la corrida diaria completa guarda en la DB y manda el mail; un worker
+# de la cola (main.py --worker) solo usa la DB con DB_HOST/DB_PORT/..., que tienen valores por defecto
+REQUIRED_SETTINGS = {
+    "daily": ["DB_URL", "SMTP_SERVER", "EMAIL_SENDER", "EMAIL_PASSWORD", "EMAIL_RECIPIENTS"],
+    "worker": [],
+}
+# Modos que llaman al LLM (los workers solo corren las etapas por ticker)
+LLM_MODES = ("daily",)
+GROK_COOKIE_SETTINGS = ["X_ANONUSERID", "X_CHALLENGE", "X_SIGNATURE", "SSO", "SSO_RW"]
+
+###############################################
+# VALIDACIÓN DE LA CONFIGURACIÓN
+###############################################
+def validate_config(env=None, mode="daily"):
+    """
+    Revisa las variables de entorno sin importar dependencias pesadas ni
+    conectarse a la DB, al SMTP o a los LLM. Devuelve la lista de problemas
+    (vacía si la configuración es utilizable) para `mode` ("daily" o "worker").
+    """
+    env = os.environ if env is None else env
+    problems = []
+    for name in REQUIRED_SETTINGS[mode]:
+        if not env.get(name):
+            problems.append(f"{name}: falta la variable")
+    if mode in LLM_MODES and not (env.get("DEEPSEEK_API_KEY") or env.get("GEMINI_KEY")
+                                  or all(env.get(name) for name in GROK_COOKIE_SETTINGS)):
+        problems.append("LLM: hace falta DEEPSEEK_API_KEY, GEMINI_KEY o las cookies de Grok")
+    for name, cast in NUMERIC_SETTINGS.items():
+        value = env.get(name)
+        if not value:
+            continue
+        try:
+            cast(value)
+        except ValueError:
+            problems.append(f"{name}: {value!r} no es un {cast.__name__} válido")
+    for name, choices in CHOICE_SETTINGS.items():
+        value = env.get(name)
+        if value and value not in choices:
+            problems.append(f"{name}: {value!r} no es una de {', '.join(choices)}")
+    if env.get("LLM_PRICING_JSON"):
+        try:
+            json.loads(env["LLM_PRICING_JSON"])
+        except ValueError as e:
+            problems.append(f"LLM_PRICING_JSON: JSON inválido ({e})")
+    holidays_file = env.get("MARKET_HOLIDAYS_FILE")
+    if holidays_file and not os.path.isfile(holidays_file):
+        problems.append(f"MARKET_HOLIDAYS_FILE: no existe {holidays_file}")
+    return problems
+
+def check_config(env=None, mode="daily"):
+    problems = validate_config(env, mode)
+    if problems:
+        print("⚠️ Configuración inválida:")
+        for problem in problems:
+            print(f"  - {problem}")
+    else:
+        print("✅ Configuración válida.")
+    return not problems
+
+###############################################
+# PERFIL DE IMPORTACIÓN
+###############################################
+ImportTiming = namedtuple("ImportTiming", ["module", "self_us", "cumulative_us", "depth"])
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def parse_importtime(stderr):
+    timings = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return timings
+
+def measure_imports(module="main"):
+    """Importa `module` en un intérprete nuevo con -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falló import {module}:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+def summarize_imports(timings, module="main"):
+    """
+    Tiempo acumulado de cada import directo de `module`. -X importtime
+    escribe los hijos antes que el padre, así que son las entradas de nivel 1
+    que aparecen entre la entrada de nivel 0 anterior y la del módulo.
+    """
+    total_us = sum(t.cumulative_us for t in timings if t.depth == 0)
+    module_us = 0
+    children = []
+    pending = []
+    for t in timings:
+        if t.depth == 1:
+            pending.append(t)
+        elif t.depth == 0:
+            if t.module == module:
+                module_us, children = t.cumulative_us, pending
+            pending = []
+    by_package = {}
+    for t in children:
+        package = t.module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + t.cumulative_us
+    return total_us, module_us, sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+
+def profile_startup(module="main", top=15, target_ms=STARTUP_TARGET_MS):
+    timings = measure_imports(module)
+    total_us, module_us, packages = summarize_imports(timings, module)
+    print(f"Tiempo de importación de {module} (python -X importtime):")
+    print(f"{'Paquete':<30}{'ms':>10}")
+    for package, cumulative_us in packages[:top]:
+        print(f"{package:<30}{cumulative_us / 1000:>10.1f}")
+    print(f"{'-' * 40}")
+    print(f"{'import ' + module:<30}{module_us / 1000:>10.1f}")
+    print(f"{'total del intérprete':<30}{total_us / 1000:>10.1f}")
+    ok = module_us / 1000 <= target_ms
+    print(f"{'✅' if ok else '❌'} Objetivo de arranque en frío: {target_ms:.0f} ms (STARTUP_TARGET_MS)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main", help="Módulo a importar (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="Paquetes a mostrar")
+    parser.add_argument("--check-config", action="store_true", help="Validar la configuración sin conectarse")
+    parser.add_argument("--mode", choices=sorted(REQUIRED_SETTINGS), default="daily",
+                        help="Con --check-config, modo a validar (default: daily)")
+    args = parser.parse_args()
+    if args.check_config:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        sys.exit(0 if check_config(mode=args.mode) else 1)
+    sys.exit(0 if profile_startup(args.module, args.top) else 1)
@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+Ingesta en streaming para los tickers que operan 24/7 (cripto): un feed
+entrega operaciones (tiempo, símbolo, precio, tamaño) en lotes, se agregan
+en velas OHLCV de STREAM_INTERVALS y cada vela cerrada se publica a los
+suscriptores (el motor de indicadores y alertas de intraday.py y, con
+STREAM_STORE=db, la tabla price_bars).
+
+Feeds (STREAM_FEED):
+- synthetic: paseo aleatorio generado localmente.
+- replay: un archivo .npz grabado con `python streaming.py record`.
+- websocket: mensajes JSON {"s": símbolo, "p": precio, "q": tamaño,
+  "t": epoch en ms} (o listas de ellos) desde STREAM_WS_URL; para pruebas,
+  FakeTickServer de fake_services.py.
+
+Las velas viven en buffers circulares de NumPy de tamaño fijo por símbolo e
+intervalo: cada lote se agrega con operaciones vectorizadas (sin objetos
+por operación) y las velas nuevas se escriben en su lugar del buffer. Una
+vela se cierra cuando llega una operación de la vela siguiente o cuando la
+marca de agua (última operación vista, o el reloj en feeds en vivo, menos
+STREAM_LATENESS_SECONDS) pasa su fin. Las operaciones de velas ya cerradas
+se descartan y se cuentan como tardías.
+
+Uso: python streaming.py run [--feed websocket --url ws://...]
+     python streaming.py record ticks.npz [--ticks 1000000]
+     python streaming.py bench [--ticks 5000000] [--batch 10000]
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from alerts import AlertEngine, dispatch_alerts, load_rules
+from metrics import span
+from providers import INTERVAL_SECONDS
+from tickers import get_universe
+
+###############################################
+# CONFIGURACIÓN DEL STREAMING
+###############################################
+STREAM_FEED = os.getenv("STREAM_FEED", "synthetic")
+STREAM_WS_URL = os.getenv("STREAM_WS_URL")
+STREAM_REPLAY_FILE = os.getenv("STREAM_REPLAY_FILE")
+STREAM_INTERVALS = [i.strip() for i in os.getenv("STREAM_INTERVALS", "1m,5m,1h,1d").split(",") if i.strip()]
+# Velas que guarda cada buffer circular por símbolo e intervalo
+STREAM_RING_BARS = int(os.getenv("STREAM_RING_BARS", "1440"))
+STREAM_LATENESS_SECONDS = float(os.getenv("STREAM_LATENESS_SECONDS", "2"))
+# Intervalo cuyas velas alimentan el motor de indicadores y alertas
+STREAM_ALERT_INTERVAL = os.getenv("STREAM_ALERT_INTERVAL", "1m")
+STREAM_STORE = os.getenv("STREAM_STORE", "none")
+STREAM_STORE_FLUSH_SECONDS = float(os.getenv("STREAM_STORE_FLUSH_SECONDS", "5"))
+# Velas pendientes que se guardan para reintentar si falla la escritura; pasado el tope se descartan las más viejas
+STREAM_STORE_MAX_PENDING = int(os.getenv("STREAM_STORE_MAX_PENDING", "200000"))
+
+BAR_SECONDS = dict(INTERVAL_SECONDS, **{"1h": 3600, "4h": 14400, "1d": 86400})
+
+# Un lote del feed: arrays del mismo largo; symbols son índices en la lista de símbolos del feed
+TickBatch = namedtuple("TickBatch", ["times", "symbols", "prices", "sizes"])
+# Velas cerradas de un intervalo, ordenadas por símbolo y tiempo de inicio (segundos epoch)
+ClosedBars = namedtuple("ClosedBars", ["symbols", "starts", "open", "high", "low", "close", "volume"])
+
+###############################################
+# FEEDS
+###############################################
+def synthetic_ticks(count, symbol_count, start, rate, rng, last_prices=None):
+    """`count` operaciones repartidas entre los símbolos a `rate` por segundo, con precios en paseo aleatorio."""
+    import numpy as np
+
+    times = start + np.cumsum(rng.exponential(1 / rate, count))
+    symbols = rng.integers(0, symbol_count, count).astype(np.int32)
+    if last_prices is None:
+        last_prices = 100 * np.exp(rng.normal(0, 1, symbol_count))
+    # Paseo por símbolo: suma acumulada de los pasos de cada símbolo en orden de llegada
+    order = np.argsort(symbols, kind="stable")
+    sorted_symbols = symbols[order]
+    starts = np.flatnonzero(np.r_[True, sorted_symbols[1:] != sorted_symbols[:-1]])
+    steps = rng.normal(0, 0.0005, count)
+    cumulative = np.cumsum(steps)
+    before = np.r_[0.0, cumulative][starts]
+    walked = np.empty(count)
+    walked[order] = cumulative - np.repeat(before, np.diff(np.r_[starts, count]))
+    prices = last_prices[symbols] * np.exp(walked)
+    last_prices = last_prices.copy()
+    last_prices[sorted_symbols[starts]] = prices[order][np.r_[starts[1:] - 1, count - 1]]
+    sizes = rng.exponential(0.5, count)
+    return TickBatch(times, symbols, prices, sizes), last_prices
+
+class SyntheticTickFeed:
+    """Operaciones sintéticas; con speed (1 = tiempo real) no se adelanta al reloj."""
+
+    live = False
+
+    def __init__(self, symbols, rate=100_000, batch_size=10_000, total=None, start=None, seed=0, speed=None):
+        self.symbols = list(symbols)
+        self.rate = rate
+        self.batch_size = batch_size
+        self.total = total
+        self.start = start or time.time()
+        self.seed = seed
+        self.speed = speed
+        self._stop = threading.Event()
+
+    def __iter__(self):
+        import numpy as np
+
+        rng = np.random.default_rng(self.seed)
+        clock, produced, last_prices = self.start, 0, None
+        started_at = time.monotonic()
+        while self.total is None or produced < self.total:
+            count = self.batch_size if self.total is None else min(self.batch_size, self.total - produced)
+            batch, last_prices = synthetic_ticks(count, len(self.symbols), clock, self.rate, rng, last_prices)
+            if self.speed:
+                ahead = (batch.times[-1] - self.start) / self.speed - (time.monotonic() - started_at)
+                if self._stop.wait(max(0.0, ahead)):
+                    return
+            clock = float(batch.times[-1])
+            produced += count
+            yield batch
+
+    def stop(self):
+        self._stop.set()
+
+class ReplayFeed:
+    """
+    Reproduce un .npz con times, symbols (índices), prices, sizes y la lista
+    de símbolos. speed=None va lo más rápido posible en lotes de batch_size;
+    con speed (1 = tiempo real) entrega lo ocurrido cada `window` segundos
+    de reloj.
+    """
+
+    live = False
+
+    def __init__(self, path, batch_size=10_000, speed=None, window=0.5):
+        import numpy as np
+
+        data = np.load(path, allow_pickle=False)
+        self.symbols = [str(s) for s in data["symbol_names"]]
+        self._data = TickBatch(data["times"], data["symbols"], data["prices"], data["sizes"])
+        self.batch_size = batch_size
+        self.speed = speed
+        self.window = window
+        self._stop = threading.Event()
+
+    def __iter__(self):
+        import numpy as np
+
+        times = self._data.times
+        if self.speed:
+            cuts = np.arange(times[0], times[-1] + self.window * self.speed, self.window * self.speed)
+            edges = np.r_[0, np.searchsorted(times, cuts[1:], side="left"), len(times)]
+        else:
+            edges = np.r_[np.arange(0, len(times), self.batch_size), len(times)]
+        started_at = time.monotonic()
+        for step, (i, j) in enumerate(zip(edges[:-1], edges[1:])):
+            if self.speed and self._stop.wait(max(0.0, step * self.window - (time.monotonic() - started_at))):
+                return
+            if j > i:
+                yield TickBatch(*(values[i:j] for values in self._data))
+
+    def stop(self):
+        self._stop.set()
+
+def record_ticks(path, feed):
+    import numpy as np
+
+    batches = list(feed)
+    fields = {name: np.concatenate([getattr(b, name) for b in batches]) for name in TickBatch._fields}
+    np.savez(path, symbol_names=np.array(feed.symbols), **fields)
+    return len(fields["times"])
+
+class WebSocketFeed:
+    """
+    Cliente websocket (aiohttp) en un hilo propio; los mensajes se juntan en
+    lotes de hasta batch_size operaciones o max_wait segundos. Se reconecta
+    si se corta la conexión.
+    """
+
+    live = True
+
+    def __init__(self, url, symbols, batch_size=5_000, max_wait=0.2):
+        self.url = url
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.skipped = 0
+        self._queue = queue.Queue(maxsize=1000)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ws-feed", daemon=True)
+
+    def _parse(self, message, rows):
+        # Los mensajes que no son operaciones (confirmaciones de suscripción, JSON roto) se cuentan y se saltean
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            self.skipped += 1
+            return
+        for item in payload if isinstance(payload, list) else [payload]:
+            try:
+                symbol = self.index.get(item.get("s"))
+                if symbol is None:
+                    self.skipped += 1
+                    continue
+                row = (item["t"] / 1000, symbol, float(item["p"]), float(item.get("q", 0)))
+            except (AttributeError, KeyError, TypeError, ValueError):
+                self.skipped += 1
+                continue
+            rows.append(row)
+
+    def _run(self):
+        import asyncio
+        import aiohttp
+
+        async def consume():
+            while not self._stop.is_set():
+                try:
+                    async with aiohttp.ClientSession() as session, session.ws_connect(self.url, heartbeat=30) as ws:
+                        print(f"🔌 Conectado a {self.url}")
+                        async for message in ws:
+                            if self._stop.is_set():
+                                break
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                self._queue.put(message.data)
+                            elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                except Exception as e:
+                    print(f"⚠️ Feed websocket desconectado ({e}); reintentando en 2s.")
+                if not self._stop.is_set():
+                    await asyncio.sleep(2)
+
+        asyncio.run(consume())
+
+    def __iter__(self):
+        import numpy as np
+
+        self._thread.start()
+        while not self._stop.is_set():
+            rows, deadline = [], time.monotonic() + self.max_wait
+            while len(rows) < self.batch_size:
+                try:
+                    message = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                self._parse(message, rows)
+            if rows:
+                times, symbols, prices, sizes = zip(*rows)
+                yield TickBatch(np.array(times), np.array(symbols, dtype=np.int32), np.array(prices), np.array(sizes))
+            else:
+                yield None
+
+    def stop(self):
+        self._stop.set()
+
+def get_feed(symbols, kind=STREAM_FEED, url=STREAM_WS_URL, replay_file=STREAM_REPLAY_FILE):
+    if kind == "websocket":
+        if not url:
+            raise ValueError("STREAM_FEED=websocket requiere STREAM_WS_URL")
+        return WebSocketFeed(url, symbols)
+    if kind == "replay":
+        if not replay_file:
+            raise ValueError("STREAM_FEED=replay requiere STREAM_REPLAY_FILE")
+        return ReplayFeed(replay_file, speed=1)
+    if kind == "synthetic":
+        return SyntheticTickFeed(symbols, rate=200, batch_size=100, speed=1)
+    raise ValueError(f"STREAM_FEED desconocido: {kind}")
+
+###############################################
+# VELAS EN BUFFERS CIRCULARES
+###############################################
+class BarRing:
+    """
+    Velas de un intervalo para todos los símbolos: la vela en curso de cada
+    uno y las últimas `capacity` cerradas en matrices (símbolos, capacity).
+    """
+
+    def __init__(self, interval, size, capacity=STREAM_RING_BARS):
+        import numpy as np
+
+        self.interval = interval
+        self.step = BAR_SECONDS[interval]
+        self.capacity = capacity
+        self.starts = np.full((size, capacity), -1, dtype=np.int64)
+        self.values = np.full((5, size, capacity), np.nan)
+        self.written = np.zeros(size, dtype=np.int64)
+        self.last_closed = np.full(size, -1, dtype=np.int64)
+        self.current_start = np.full(size, -1, dtype=np.int64)
+        self.current = np.zeros((5, size))
+
+    def _write(self, symbols, starts, values):
+        # symbols viene ordenado (por símbolo y tiempo): cada vela va al siguiente lugar libre de su símbolo
+        import numpy as np
+
+        count = len(symbols)
+        runs = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+        rank = np.arange(count) - np.repeat(runs, np.diff(np.r_[runs, count]))
+        slots = (self.written[symbols] + rank) % self.capacity
+        self.starts[symbols, slots] = starts
+        self.values[:, symbols, slots] = values
+        np.add.at(self.written, symbols, 1)
+        np.maximum.at(self.last_closed, symbols, starts)
+        return ClosedBars(symbols, starts, *values)
+
+    def ingest(self, symbols, buckets, prices, sizes):
+        """
+        Agrega operaciones ya ordenadas por símbolo (y por tiempo dentro de
+        cada símbolo). Devuelve (velas cerradas, operaciones tardías).
+        """
+        import numpy as np
+
+        # Tardías: de una vela ya cerrada, anterior a la vela en curso o a una operación previa del lote
+        key = symbols.astype(np.int64) * (1 << 40) + buckets // self.step
+        late = (buckets <= self.last_closed[symbols]) | (buckets < self.current_start[symbols]) \
+            | (key < np.maximum.accumulate(key))
+        if late.any():
+            keep = ~late
+            symbols, buckets, prices, sizes = symbols[keep], buckets[keep], prices[keep], sizes[keep]
+        late_count = int(late.sum())
+        if not len(symbols):
+            return None, late_count
+
+        count = len(symbols)
+        edges = np.flatnonzero(np.r_[True, (symbols[1:] != symbols[:-1]) | (buckets[1:] != buckets[:-1])])
+        group_symbols, group_starts = symbols[edges], buckets[edges]
+        group = np.vstack([
+            prices[edges],
+            np.maximum.reduceat(prices, edges),
+            np.minimum.reduceat(prices, edges),
+            prices[np.r_[edges[1:] - 1, count - 1]],
+            np.add.reduceat(sizes, edges),
+        ])
+        first = np.r_[True, group_symbols[1:] != group_symbols[:-1]]
+        last = np.r_[group_symbols[1:] != group_symbols[:-1], True]
+
+        # El primer grupo de cada símbolo continúa la vela en curso o la cierra
+        current_start = self.current_start[group_symbols]
+        cont = first & (group_starts == current_start)
+        if cont.any():
+            held = self.current[:, group_symbols[cont]]
+            group[0, cont] = held[0]
+            group[1, cont] = np.maximum(held[1], group[1, cont])
+            group[2, cont] = np.minimum(held[2], group[2, cont])
+            group[4, cont] += held[4]
+        replaced = first & (current_start >= 0) & (group_starts > current_start)
+        old_symbols = group_symbols[replaced]
+
+        # Cerradas: las velas en curso reemplazadas y todos los grupos salvo el último de cada símbolo
+        done = ~last
+        closed_symbols = np.concatenate([old_symbols, group_symbols[done]])
+        closed_starts = np.concatenate([self.current_start[old_symbols], group_starts[done]])
+        closed_values = np.concatenate([self.current[:, old_symbols], group[:, done]], axis=1)
+
+        self.current_start[group_symbols[last]] = group_starts[last]
+        self.current[:, group_symbols[last]] = group[:, last]
+        if not len(closed_symbols):
+            return None, late_count
+        order = np.lexsort((closed_starts, closed_symbols))
+        return self._write(closed_symbols[order], closed_starts[order], closed_values[:, order]), late_count
+
+    def close_due(self, watermark):
+        """Cierra las velas en curso que terminaron antes de `watermark`."""
+        import numpy as np
+
+        due = np.flatnonzero((self.current_start >= 0) & (self.current_start + self.step <= watermark))
+        if not len(due):
+            return None
+        starts = self.current_start[due]
+        values = self.current[:, due]
+        self.current_start[due] = -1
+        return self._write(due, starts, values)
+
+    def history(self, symbol, count=None):
+        """Últimas velas cerradas de un símbolo en orden cronológico: (starts, open, high, low, close, volume)."""
+        import numpy as np
+
+        available = int(min(self.written[symbol], self.capacity))
+        count = available if count is None else min(count, available)
+        slots = (self.written[symbol] - count + np.arange(count)) % self.capacity
+        return (self.starts[symbol, slots],) + tuple(self.values[:, symbol, slots])
+
+class BarAggregator:
+    def __init__(self, symbols, intervals=STREAM_INTERVALS, capacity=STREAM_RING_BARS):
+        unknown = [i for i in intervals if i not in BAR_SECONDS]
+        if unknown:
+            raise ValueError(f"Intervalos no soportados: {', '.join(unknown)}")
+        self.symbols = list(symbols)
+        self.rings = {interval: BarRing(interval, len(self.symbols), capacity) for interval in intervals}
+        self.ticks = 0
+        self.late = {interval: 0 for interval in intervals}
+
+    def ingest(self, batch):
+        """Agrega un lote y devuelve {intervalo: ClosedBars} con las velas que cerró."""
+        import numpy as np
+
+        order = np.argsort(batch.symbols, kind="stable")
+        symbols, prices, sizes = batch.symbols[order], batch.prices[order], batch.sizes[order]
+        seconds = batch.times[order].astype(np.int64)
+        self.ticks += len(symbols)
+        closed = {}
+        for interval, ring in self.rings.items():
+            bars, late = ring.ingest(symbols, seconds - seconds % ring.step, prices, sizes)
+            self.late[interval] += late
+            if bars is not None:
+                closed[interval] = bars
+        return closed
+
+    def close_due(self, watermark):
+        closed = {}
+        for interval, ring in self.rings.items():
+            bars = ring.close_due(watermark)
+            if bars is not None:
+                closed[interval] = bars
+        return closed
+
+###############################################
+# SUSCRIPTORES
+###############################################
+class IndicatorSubscriber:
+    """Pasa las velas cerradas de un intervalo por IndicatorState y AlertEngine (ver intraday.py)."""
+
+    def __init__(self, symbols, interval=STREAM_ALERT_INTERVAL, rules=None, sinks=None):
+        from intraday import IndicatorState
+
+        self.interval = interval
+        self.state = IndicatorState(len(symbols))
+        self.engine = AlertEngine(rules if rules is not None else load_rules(), symbols)
+        self.sinks = sinks
+        self.alerts = 0
+
+    def __call__(self, interval, bars):
+        import numpy as np
+
+        if interval != self.interval:
+            return
+        alerts = []
+        # Vela a vela en orden de tiempo, para que los cruces se evalúen en secuencia
+        for start in np.unique(bars.starts):
+            rows = np.flatnonzero(bars.starts == start)
+            positions = bars.symbols[rows]
+            self.state.update(positions, bars.open[rows], bars.high[rows], bars.low[rows],
+                              bars.close[rows], bars.volume[rows])
+            alerts.extend(self.engine.evaluate(self.state, positions, int(start)))
+        self.alerts += len(alerts)
+        dispatch_alerts(alerts, **({"sinks": self.sinks} if self.sinks is not None else {}))
+
+class DBBarStore:
+    """
+    Guarda las velas cerradas en price_bars (upsert por ticker, intervalo e
+    inicio en UTC). Las filas se juntan y se escriben cada
+    STREAM_STORE_FLUSH_SECONDS.
+    """
+
+    def __init__(self, symbols, flush_seconds=STREAM_STORE_FLUSH_SECONDS, max_pending=STREAM_STORE_MAX_PENDING):
+        from db import pooled_connection
+
+        self._connection = pooled_connection
+        self.symbols = list(symbols)
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self.rows = []
+        self.saved = 0
+        self.dropped = 0
+        self._last_flush = time.monotonic()
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS price_bars (
+                ticker VARCHAR(20) NOT NULL,
+                interval VARCHAR(4) NOT NULL,
+                start_at TIMESTAMP NOT NULL,
+                open NUMERIC, high NUMERIC, low NUMERIC, close NUMERIC, volume NUMERIC,
+                PRIMARY KEY (ticker, interval, start_at)
+            );
+            """)
+            conn.commit()
+            cur.close()
+
+    def __call__(self, interval, bars):
+        for i in range(len(bars.symbols)):
+            self.rows.append((self.symbols[bars.symbols[i]], interval, int(bars.starts[i]),
+                              float(bars.open[i]), float(bars.high[i]), float(bars.low[i]),
+                              float(bars.close[i]), float(bars.volume[i])))
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        from psycopg2.extras import execute_values
+
+        self._last_flush = time.monotonic()
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        try:
+            with self._connection() as conn:
+                cur = conn.cursor()
+                execute_values(cur, """
+                    INSERT INTO price_bars (ticker, interval, start_at, open, high, low, close, volume) VALUES %s
+                    ON CONFLICT (ticker, interval, start_at) DO UPDATE SET
+                        open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                        close = EXCLUDED.close, volume = EXCLUDED.volume
+                """, rows, template="(%s, %s, to_timestamp(%s) AT TIME ZONE 'UTC', %s, %s, %s, %s, %s)",
+                               page_size=1000)
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            # Las velas quedan para el próximo flush; la ingesta sigue aunque la DB no responda
+            self.rows = rows + self.rows
+            dropped = len(self.rows) - self.max_pending
+            if dropped > 0:
+                del self.rows[:dropped]
+                self.dropped += dropped
+            print(f"⚠️ No se pudieron guardar {len(rows)} velas ({e}); "
+                  f"{len(self.rows)} pendientes" + (f", {dropped} descartadas." if dropped > 0 else "."))
+            return 0
+        self.saved += len(rows)
+        return len(rows)
+
+###############################################
+# INGESTA
+###############################################
+class StreamIngestor:
+    def __init__(self, feed, intervals=STREAM_INTERVALS, subscribers=(), capacity=STREAM_RING_BARS):
+        self.feed = feed
+        self.aggregator = BarAggregator(feed.symbols, intervals, capacity)
+        self.subscribers = list(subscribers)
+        self.closed_bars = {interval: 0 for interval in intervals}
+        self._max_time = None
+        self._stop = threading.Event()
+
+    def _publish(self, closed):
+        for interval, bars in closed.items():
+            self.closed_bars[interval] += len(bars.symbols)
+            for subscriber in self.subscribers:
+                subscriber(interval, bars)
+
+    def run(self, report_seconds=10):
+        started_at = last_report = time.monotonic()
+        reported_ticks = 0
+        for batch in self.feed:
+            if self._stop.is_set():
+                break
+            if batch is not None and len(batch.times):
+                self._publish(self.aggregator.ingest(batch))
+                latest = float(batch.times.max())
+                self._max_time = latest if self._max_time is None else max(self._max_time, latest)
+            # Marca de agua: última operación vista o, en feeds en vivo, el reloj
+            watermark = time.time() if self.feed.live else self._max_time
+            if watermark is not None:
+                self._publish(self.aggregator.close_due(watermark - STREAM_LATENESS_SECONDS))
+            now = time.monotonic()
+            if report_seconds and now - last_report >= report_seconds:
+                rate = (self.aggregator.ticks - reported_ticks) / (now - last_report)
+                print(f"📈 {self.aggregator.ticks} operaciones ({rate:,.0f}/s), velas cerradas: "
+                      + ", ".join(f"{i}={n}" for i, n in self.closed_bars.items()))
+                last_report, reported_ticks = now, self.aggregator.ticks
+        if self._max_time is not None and not self.feed.live and not self._stop.is_set():
+            # Fin de un feed finito: se cierran las velas que quedaron en curso
+            self._publish(self.aggregator.close_due(float("inf")))
+        for subscriber in self.subscribers:
+            if hasattr(subscriber, "flush"):
+                subscriber.flush()
+        return time.monotonic() - started_at
+
+    def stop(self, *_):
+        print("Deteniendo la ingesta...")
+        self._stop.set()
+        if hasattr(self.feed, "stop"):
+            self.feed.stop()
+
+###############################################
+# CLI
+###############################################
+def _bench(ticks, batch_size, symbol_count, hours):
+    symbols = [f"C{i:04d}-USD" for i in range(symbol_count)]
+    # Las operaciones se generan antes para medir solo la agregación
+    feed = SyntheticTickFeed(symbols, rate=ticks / (hours * 3600), batch_size=batch_size, total=ticks,
+                             start=1_700_000_000)
+    batches = list(feed)
+    aggregator = BarAggregator(symbols)
+    closed = {interval: 0 for interval in aggregator.rings}
+    started_at = time.perf_counter()
+    for batch in batches:
+        for interval, bars in aggregator.ingest(batch).items():
+            closed[interval] += len(bars.symbols)
+    elapsed = time.perf_counter() - started_at
+    span_s = float(batches[-1].times[-1] - batches[0].times[0])
+    print(f"{ticks:,} operaciones de {symbol_count} símbolos ({span_s / 3600:.1f} h de mercado) en {elapsed:.2f}s: "
+          f"{ticks / elapsed:,.0f} operaciones/s con lotes de {batch_size}.")
+    print("Velas cerradas: " + ", ".join(f"{i}={n}" for i, n in closed.items())
+          + f"; tardías: {sum(aggregator.late.values())}.")
+
+def main():
+    import signal
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["run", "record", "bench"])
+    parser.add_argument("path", nargs="?", help="Archivo .npz (record)")
+    parser.add_argument("--feed", default=STREAM_FEED, choices=["synthetic", "replay", "websocket"])
+    parser.add_argument("--url", default=STREAM_WS_URL)
+    parser.add_argument("--replay-file", default=STREAM_REPLAY_FILE)
+    parser.add_argument("--ticks", type=int, default=5_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--symbols", type=int, default=10, help="Símbolos sintéticos (bench y record)")
+    parser.add_argument("--hours", type=float, default=24, help="Horas de mercado que cubren las operaciones (bench y record)")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.ticks, args.batch, args.symbols, args.hours)
+        return
+    if args.command == "record":
+        if not args.path:
+            parser.error("record requiere el archivo .npz")
+        symbols = get_universe().select(asset_class="crypto")[:args.symbols]
+        feed = SyntheticTickFeed(symbols, rate=args.ticks / (args.hours * 3600), batch_size=args.batch, total=args.ticks)
+        count = record_ticks(args.path, feed)
+        print(f"{count} operaciones de {len(symbols)} símbolos grabadas en {args.path}.")
+        return
+
+    feed = get_feed(get_universe().select(asset_class="crypto"), args.feed, args.url, args.replay_file)
+    subscribers = [IndicatorSubscriber(feed.symbols)]
+    if STREAM_STORE == "db":
+        subscribers.append(DBBarStore(feed.symbols))
+    ingestor = StreamIngestor(feed, subscribers=subscribers)
+    signal.signal(signal.SIGTERM, ingestor.stop)
+    signal.signal(signal.SIGINT, ingestor.stop)
+    print(f"📡 Ingesta {args.feed} de {len(feed.symbols)} símbolos en velas {', '.join(STREAM_INTERVALS)}.")
+    with span("streaming.run"):
+        ingestor.run()
+
+if __name__ == "__main__":
+    main()
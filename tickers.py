@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Registro del universo de tickers con metadatos por símbolo (región, bolsa,
+clase de activo, moneda, calendario de mercado y fuente de noticias).
+
+El universo sale de UNIVERSE_SOURCE:
+
+- builtin (por defecto): las listas de abajo, con metadatos deducidos del
+  símbolo.
+- una ruta a un CSV con las columnas de Symbol (las vacías se deducen).
+- db: la tabla universe_symbols (cargarla con `python tickers.py import`).
+
+Uso: python tickers.py stats
+     python tickers.py export universe.csv
+     python tickers.py import universe.csv
+"""
+import argparse
+import csv
+import os
+import threading
+from collections import namedtuple
+
+###############################################
+# UNIVERSO DE TICKERS POR REGIÓN
+###############################################
+usa_tickers = ["AAPL", "MSFT", "AMZN", "GOOGL", "META", "TSLA", "BRK-B", "JNJ", "V", "WMT", "BABA", "NVDA", "GOLD", "MELI", "NFLX", "PYPL", "GM", "AAL", "ABNB"]
+argentina_tickers = ["GGAL.BA", "YPFD.BA", "PAMP.BA", "TX", "CEPU.BA", "SUPV.BA", "ALUA.BA", "BMA.BA", "EDN.BA", "COME.BA", "LOMA.BA", "MIRG.BA", "TRAN.BA"]
+crypto_tickers = ["BTC-USD", "ETH-USD", "BNB-USD", "XRP-USD", "ADA-USD", "SOL-USD", "DOT-USD", "DOGE-USD", "LTC-USD", "MATIC-USD"]
+
+TICKER_GROUPS = {
+    "usa": usa_tickers,
+    "argentina": argentina_tickers,
+    "crypto": crypto_tickers,
+}
+
+UNIVERSE_SOURCE = os.getenv("UNIVERSE_SOURCE", "builtin")
+
+###############################################
+# METADATOS POR SÍMBOLO
+###############################################
+# calendar es el nombre del mercado en market_calendar.MARKETS; news_source
+# "yahoo" (la única fuente implementada) o "none" para no buscar noticias.
+Symbol = namedtuple("Symbol", ["ticker", "region", "exchange", "asset_class", "currency", "calendar", "news_source"])
+
+def infer_symbol(ticker, region=None):
+    """
+    Metadatos deducidos del símbolo. La región puede venir dada: TX está en
+    la lista de Argentina pero cotiza en NYSE, en dólares.
+    """
+    if ticker.endswith(".BA"):
+        return Symbol(ticker, region or "argentina", "BYMA", "equity", "ARS", "byma", "yahoo")
+    if ticker.endswith("-USD"):
+        return Symbol(ticker, region or "crypto", "CRYPTO", "crypto", "USD", "crypto", "yahoo")
+    return Symbol(ticker, region or "usa", "US", "equity", "USD", "us", "yahoo")
+
+def _symbol_from_row(row):
+    # Las columnas vacías o ausentes se completan con lo deducido del símbolo
+    ticker = row["ticker"].strip()
+    inferred = infer_symbol(ticker, (row.get("region") or "").strip() or None)
+    return Symbol(*((row.get(field) or "").strip() or default for field, default in zip(Symbol._fields, inferred)))
+
+###############################################
+# REGISTRO
+###############################################
+class Universe:
+    """
+    Símbolos en el orden de origen, con índices por ticker, región, clase
+    de activo y calendario para que seleccionar un subconjunto no recorra
+    todo el universo.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = []
+        self._by_ticker = {}
+        self._index = {"region": {}, "exchange": {}, "asset_class": {}, "calendar": {}, "news_source": {}}
+        for symbol in symbols:
+            if symbol.ticker in self._by_ticker:
+                continue
+            self.symbols.append(symbol)
+            self._by_ticker[symbol.ticker] = symbol
+            for field, index in self._index.items():
+                index.setdefault(getattr(symbol, field), []).append(symbol.ticker)
+        self.tickers = [symbol.ticker for symbol in self.symbols]
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, ticker):
+        return ticker in self._by_ticker
+
+    def get(self, ticker):
+        return self._by_ticker.get(ticker)
+
+    def lookup(self, ticker):
+        # Los tickers fuera del registro (p. ej. un universo sintético) se deducen del símbolo
+        return self._by_ticker.get(ticker) or infer_symbol(ticker)
+
+    def select(self, tickers=None, **filters):
+        """
+        Tickers que cumplen todos los filtros (campo=valor o campo=(v1, v2)).
+        Sin `tickers` se elige sobre todo el universo usando los índices;
+        con `tickers`, se filtra esa lista conservando su orden.
+        """
+        filters = {field: {value} if isinstance(value, str) else set(value) for field, value in filters.items()}
+        if tickers is not None:
+            return [ticker for ticker in tickers
+                    if all(getattr(self.lookup(ticker), field) in values for field, values in filters.items())]
+        if not filters:
+            return list(self.tickers)
+        chosen = None
+        for field, values in filters.items():
+            matches = set()
+            for value in values:
+                matches.update(self._index[field].get(value, ()))
+            chosen = matches if chosen is None else chosen & matches
+        return [ticker for ticker in self.tickers if ticker in chosen]
+
+    def group(self, tickers=None, field="region"):
+        """
+        {valor: [tickers]} según `field`, sin grupos vacíos. Los grupos siguen
+        el orden del registro (usa, argentina, crypto en el builtin).
+        """
+        if tickers is None:
+            return {value: list(group) for value, group in self._index[field].items()}
+        groups = {value: [] for value in self._index[field]}
+        for ticker in tickers:
+            groups.setdefault(getattr(self.lookup(ticker), field), []).append(ticker)
+        return {value: group for value, group in groups.items() if group}
+
+    def batches(self, tickers=None, size=50):
+        """
+        Bloques de hasta `size` tickers que no mezclan calendarios: cada
+        bloque se descarga de una vez y sus velas cierran a la misma hora.
+        """
+        chunks = []
+        for group in self.group(tickers, "calendar").values():
+            chunks.extend(group[i:i + size] for i in range(0, len(group), size))
+        return chunks
+
+###############################################
+# CARGA DEL UNIVERSO
+###############################################
+def builtin_symbols():
+    return [infer_symbol(ticker, region) for region, group in TICKER_GROUPS.items() for ticker in group]
+
+def load_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        complete = header == list(Symbol._fields)
+        symbols = []
+        for values in reader:
+            # Las filas completas se toman tal cual; el resto pasa por la deducción
+            if complete and len(values) == len(header) and all(values):
+                symbols.append(Symbol._make(values))
+            elif values:
+                row = dict(zip(header, values))
+                if (row.get("ticker") or "").strip():
+                    symbols.append(_symbol_from_row(row))
+        return symbols
+
+def write_csv(path, symbols):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(Symbol._fields)
+        writer.writerows(symbols)
+
+def _ensure_table(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS universe_symbols (
+        ticker VARCHAR(20) PRIMARY KEY,
+        region VARCHAR(20) NOT NULL,
+        exchange VARCHAR(20) NOT NULL,
+        asset_class VARCHAR(20) NOT NULL,
+        currency VARCHAR(10) NOT NULL,
+        calendar VARCHAR(20) NOT NULL,
+        news_source VARCHAR(20) NOT NULL,
+        position SERIAL,
+        active BOOLEAN NOT NULL DEFAULT TRUE
+    );
+    """)
+
+def load_db():
+    from db import pooled_connection
+
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        _ensure_table(cur)
+        conn.commit()
+        cur.execute(f"SELECT {', '.join(Symbol._fields)} FROM universe_symbols WHERE active ORDER BY position")
+        rows = cur.fetchall()
+        cur.close()
+    return [Symbol(*row) for row in rows]
+
+def save_db(symbols):
+    from db import pooled_connection
+    from psycopg2.extras import execute_values
+
+    fields = ", ".join(Symbol._fields)
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        _ensure_table(cur)
+        execute_values(cur, f"""
+            INSERT INTO universe_symbols ({fields}) VALUES %s
+            ON CONFLICT (ticker) DO UPDATE SET
+                region = EXCLUDED.region, exchange = EXCLUDED.exchange, asset_class = EXCLUDED.asset_class,
+                currency = EXCLUDED.currency, calendar = EXCLUDED.calendar,
+                news_source = EXCLUDED.news_source, active = TRUE
+        """, [tuple(symbol) for symbol in symbols], page_size=1000)
+        conn.commit()
+        cur.close()
+    return len(symbols)
+
+def load_universe(source=UNIVERSE_SOURCE):
+    if source == "builtin":
+        return Universe(builtin_symbols())
+    if source == "db":
+        return Universe(load_db())
+    return Universe(load_csv(source))
+
+_universe = None
+_universe_lock = threading.Lock()
+
+def get_universe():
+    # El universo se carga una sola vez por proceso
+    global _universe
+    with _universe_lock:
+        if _universe is None:
+            _universe = load_universe()
+        return _universe
+
+def group_tickers(tickers):
+    """
+    Agrupa `tickers` por región: los del registro quedan en su región y los
+    demás (p. ej. un universo sintético) se ubican por sufijo.
+    """
+    return get_universe().group(tickers, "region")
+
+###############################################
+# CLI
+###############################################
+def main():
+    import time
+
+    parser = argparse.ArgumentParser(description="Registro del universo de tickers")
+    parser.add_argument("command", choices=["stats", "export", "import"])
+    parser.add_argument("path", nargs="?", help="CSV a exportar o importar")
+    parser.add_argument("--source", default=UNIVERSE_SOURCE, help="builtin, db o ruta a un CSV")
+    args = parser.parse_args()
+    if args.command == "import":
+        if not args.path:
+            parser.error("import requiere el CSV")
+        print(f"{save_db(load_csv(args.path))} símbolos guardados en universe_symbols.")
+        return
+    started_at = time.perf_counter()
+    universe = load_universe(args.source)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    if args.command == "export":
+        if not args.path:
+            parser.error("export requiere el CSV")
+        write_csv(args.path, universe.symbols)
+        print(f"{len(universe)} símbolos exportados a {args.path}.")
+        return
+    print(f"Universo {args.source}: {len(universe)} símbolos cargados en {elapsed_ms:.1f} ms.")
+    for field in ("region", "asset_class", "calendar", "exchange", "news_source"):
+        counts = {value: len(group) for value, group in universe.group(field=field).items()}
+        print(f"  {field:<12} " + ", ".join(f"{value}={count}" for value, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
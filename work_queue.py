@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajo en PostgreSQL para repartir el universo de tickers entre
+varios procesos (en la misma máquina o en servicios separados de Railway).
+
+El coordinador encola la corrida en la tabla pipeline_jobs, un trabajo por
+bloque de QUEUE_CHUNK_SIZE tickers. Cada worker reclama el próximo trabajo
+libre con SELECT ... FOR UPDATE SKIP LOCKED, así dos workers nunca toman el
+mismo bloque ni se bloquean entre sí, procesa las etapas por ticker del
+bloque y deja los resultados en pipeline_checkpoints. Mientras trabaja
+renueva su lease; si un worker muere, su bloque se vuelve a ofrecer cuando
+el lease vence (hasta QUEUE_MAX_ATTEMPTS intentos).
+
+Uso: python work_queue.py status [--run-id AAAA-MM-DD]
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import date
+
+###############################################
+# CONFIGURACIÓN DE LA COLA
+###############################################
+QUEUE_CHUNK_SIZE = int(os.getenv("QUEUE_CHUNK_SIZE", "50"))
+# Segundos sin renovar el lease tras los que un trabajo se considera abandonado
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "300"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "5"))
+# Tiempo máximo que el coordinador espera a los workers antes de seguir por su cuenta
+QUEUE_WAIT_TIMEOUT = int(os.getenv("QUEUE_WAIT_TIMEOUT", "3600"))
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def chunked(tickers, size):
+    return [list(tickers[i:i + size]) for i in range(0, len(tickers), size)]
+
+###############################################
+# TABLA DE TRABAJOS
+###############################################
+class WorkQueue:
+    def __init__(self, lease_seconds=QUEUE_LEASE_SECONDS, max_attempts=QUEUE_MAX_ATTEMPTS):
+        from db import pooled_connection
+
+        self._connection = pooled_connection
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS pipeline_jobs (
+                run_id VARCHAR(40) NOT NULL,
+                chunk INTEGER NOT NULL,
+                tickers TEXT[] NOT NULL,
+                status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                worker VARCHAR(80),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT now(),
+                claimed_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                PRIMARY KEY (run_id, chunk)
+            );
+            CREATE INDEX IF NOT EXISTS pipeline_jobs_open
+                ON pipeline_jobs (created_at, chunk) WHERE status IN ('pending', 'running');
+            """)
+            conn.commit()
+            cur.close()
+
+    def enqueue(self, run_id, tickers, chunk_size=QUEUE_CHUNK_SIZE):
+        """
+        Encola la corrida en bloques. Es idempotente: si el coordinador se
+        reinicia con el mismo run_id los bloques existentes no se duplican.
+        """
+        return self.enqueue_chunks(run_id, chunked(list(tickers), chunk_size))
+
+    def enqueue_chunks(self, run_id, chunks):
+        # Como enqueue, con los bloques ya armados (p. ej. Universe.batches)
+        from psycopg2.extras import execute_values
+
+        with self._connection() as conn:
+            cur = conn.cursor()
+            execute_values(cur, """
+                INSERT INTO pipeline_jobs (run_id, chunk, tickers) VALUES %s
+                ON CONFLICT (run_id, chunk) DO NOTHING
+            """, [(run_id, i, chunk) for i, chunk in enumerate(chunks)])
+            conn.commit()
+            cur.close()
+        return len(chunks)
+
+    def claim(self, worker, run_id=None):
+        """
+        Reclama el trabajo libre más antiguo (de run_id, o de cualquier
+        corrida) y devuelve (run_id, chunk, tickers), o None si no hay.
+        SKIP LOCKED saltea las filas que otro worker está reclamando.
+        """
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE pipeline_jobs AS j
+                SET status = 'running', worker = %(worker)s, attempts = j.attempts + 1, claimed_at = now()
+                FROM (
+                    SELECT run_id, chunk FROM pipeline_jobs
+                    WHERE (%(run_id)s IS NULL OR run_id = %(run_id)s)
+                      AND (status = 'pending'
+                           OR (status = 'running' AND claimed_at < now() - make_interval(secs => %(lease)s)
+                               AND attempts < %(max_attempts)s))
+                    ORDER BY created_at, chunk
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                ) AS free
+                WHERE j.run_id = free.run_id AND j.chunk = free.chunk
+                RETURNING j.run_id, j.chunk, j.tickers
+            """, {"worker": worker, "run_id": run_id, "lease": self.lease_seconds,
+                  "max_attempts": self.max_attempts})
+            row = cur.fetchone()
+            conn.commit()
+            cur.close()
+        return row
+
+    def heartbeat(self, run_id, chunk, worker):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("UPDATE pipeline_jobs SET claimed_at = now() "
+                        "WHERE run_id = %s AND chunk = %s AND worker = %s AND status = 'running'",
+                        (run_id, chunk, worker))
+            alive = cur.rowcount == 1
+            conn.commit()
+            cur.close()
+        return alive
+
+    def finish(self, run_id, chunk, worker, error=None):
+        """
+        Marca el trabajo como terminado, o lo devuelve a la cola si falló y le
+        quedan intentos. Solo cuenta si el trabajo sigue siendo de este worker
+        (si el lease venció y otro lo reclamó, gana el otro).
+        """
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE pipeline_jobs SET
+                    status = CASE WHEN %(error)s IS NULL THEN 'done'
+                                  WHEN attempts < %(max_attempts)s THEN 'pending' ELSE 'error' END,
+                    error = %(error)s, finished_at = now()
+                WHERE run_id = %(run_id)s AND chunk = %(chunk)s AND worker = %(worker)s AND status = 'running'
+            """, {"error": error, "max_attempts": self.max_attempts, "run_id": run_id,
+                  "chunk": chunk, "worker": worker})
+            owned = cur.rowcount == 1
+            conn.commit()
+            cur.close()
+        return owned
+
+    def progress(self, run_id):
+        """{status: (trabajos, tickers)} de la corrida. Los leases vencidos sin intentos pasan a error."""
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE pipeline_jobs SET status = 'error', error = 'lease vencido', finished_at = now()
+                WHERE run_id = %s AND status = 'running' AND attempts >= %s
+                  AND claimed_at < now() - make_interval(secs => %s)
+            """, (run_id, self.max_attempts, self.lease_seconds))
+            cur.execute("SELECT status, COUNT(*), SUM(cardinality(tickers)) FROM pipeline_jobs "
+                        "WHERE run_id = %s GROUP BY status", (run_id,))
+            rows = cur.fetchall()
+            conn.commit()
+            cur.close()
+        return {status: (jobs, int(tickers)) for status, jobs, tickers in rows}
+
+    def summary(self, run_id):
+        with self._connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT worker, status, COUNT(*), SUM(cardinality(tickers)),
+                       SUM(EXTRACT(EPOCH FROM finished_at - claimed_at)), MAX(error)
+                FROM pipeline_jobs WHERE run_id = %s
+                GROUP BY worker, status ORDER BY worker NULLS FIRST, status
+            """, (run_id,))
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+###############################################
+# WORKER Y COORDINADOR
+###############################################
+class _Heartbeat:
+    # Renueva el lease del trabajo en curso cada tercio de QUEUE_LEASE_SECONDS
+    def __init__(self, queue, run_id, chunk, worker):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(queue, run_id, chunk, worker),
+                                        name="queue-heartbeat", daemon=True)
+
+    def _run(self, queue, run_id, chunk, worker):
+        while not self._stop.wait(queue.lease_seconds / 3):
+            try:
+                if not queue.heartbeat(run_id, chunk, worker):
+                    print(f"⚠️ El trabajo {run_id}#{chunk} ya no es de {worker}.")
+                    return
+            except Exception as e:
+                print(f"⚠️ No se pudo renovar el lease de {run_id}#{chunk}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(process_chunk, run_id=None, drain=False, queue=None, worker=None):
+    """
+    Reclama y procesa trabajos hasta que no queden (drain) o para siempre,
+    esperando QUEUE_POLL_SECONDS cuando la cola está vacía.
+    process_chunk(run_id, tickers) puede lanzar una excepción para que el
+    bloque se reintente. Devuelve la cantidad de trabajos procesados.
+    """
+    queue = queue or WorkQueue()
+    worker = worker or worker_name()
+    processed = 0
+    print(f"👷 Worker {worker} esperando trabajos{f' de la corrida {run_id}' if run_id else ''}.")
+    while True:
+        job = queue.claim(worker, run_id)
+        if job is None:
+            if drain:
+                break
+            time.sleep(QUEUE_POLL_SECONDS)
+            continue
+        job_run_id, chunk, tickers = job
+        print(f"📦 {worker}: trabajo {job_run_id}#{chunk} ({len(tickers)} tickers).")
+        error = None
+        with _Heartbeat(queue, job_run_id, chunk, worker):
+            try:
+                process_chunk(job_run_id, tickers)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:500]
+                print(f"❌ {worker}: trabajo {job_run_id}#{chunk} falló: {error}")
+        if not queue.finish(job_run_id, chunk, worker, error):
+            print(f"⚠️ {worker}: el trabajo {job_run_id}#{chunk} fue reasignado; se descarta el cierre.")
+        processed += 1
+    print(f"👷 Worker {worker}: {processed} trabajos procesados.")
+    return processed
+
+
+def wait_for_run(run_id, queue=None, timeout=QUEUE_WAIT_TIMEOUT, should_stop=None):
+    """
+    Espera a que no queden trabajos pendientes ni en curso. Devuelve el
+    progreso final; corta antes si vence timeout o should_stop() es verdadero
+    (p. ej. porque terminaron todos los workers locales).
+    """
+    queue = queue or WorkQueue()
+    deadline = time.monotonic() + timeout
+    last = None
+    while True:
+        progress = queue.progress(run_id)
+        open_jobs = sum(progress.get(status, (0, 0))[0] for status in ("pending", "running"))
+        done = progress.get("done", (0, 0))[1]
+        total = sum(tickers for _, tickers in progress.values())
+        if (done, open_jobs) != last:
+            print(f"⏳ Corrida {run_id}: {done}/{total} tickers procesados, {open_jobs} trabajos abiertos.")
+            last = (done, open_jobs)
+        if not open_jobs:
+            return progress
+        if time.monotonic() > deadline or (should_stop is not None and should_stop()):
+            print(f"⚠️ Se deja de esperar a los workers con {open_jobs} trabajos abiertos; "
+                  f"el coordinador completa lo que falte.")
+            return progress
+        time.sleep(QUEUE_POLL_SECONDS)
+
+###############################################
+# CLI
+###############################################
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["status"])
+    parser.add_argument("--run-id", default=date.today().isoformat())
+    args = parser.parse_args()
+
+    queue = WorkQueue()
+    print(f"Corrida {args.run_id}")
+    print(f"{'worker':<28} {'estado':<8} {'trabajos':>9} {'tickers':>8} {'segundos':>9}  último error")
+    for worker, status, jobs, tickers, seconds, error in queue.summary(args.run_id):
+        print(f"{worker or '-':<28} {status:<8} {jobs:>9} {int(tickers):>8} {float(seconds or 0):>9.1f}  {error or ''}")
+
+if __name__ == "__main__":
+    main()